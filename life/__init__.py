@@ -1,7 +1,12 @@
 """Package life."""
 __author__ = 'Joan A. Pinol  (japinol)'
-__all__ = ['cell_selectors', 'cells', 'colors', 'constants', 'debug_info',
-           'help_info', 'lib_graphics_jp', 'lib_jp',
-           'life_game', 'output_file', 'output_info', 'resources',
-           'screens', 'seeds', 'settings', 'universes',
+__all__ = ['adaptive', 'bands', 'bit_packed', 'bit_sliced', 'blocking',
+           'cell_selectors', 'cells', 'changes', 'chunks', 'cluster',
+           'colors', 'constants', 'cycles', 'debug_info', 'dimensions',
+           'engines', 'ensembles', 'fast', 'generations', 'graphs',
+           'halos', 'hashlife', 'help_info', 'larger', 'lenia',
+           'lib_graphics_jp', 'lib_jp', 'life_game', 'out_of_core',
+           'output_file', 'output_info', 'resources', 'rule_table',
+           'rules', 'screens', 'seeds', 'settings', 'slices', 'symmetry',
+           'tiles', 'universes',
            ]
@@ -18,7 +18,17 @@ from life.settings import (
     SCREEN_MAX_HEIGHT,
     CELL_MIN_SIZE,
     CELL_MAX_SIZE,
+    HASHLIFE_JUMP_MAX,
+    HASHLIFE_CACHE_SIZE_MIN,
+    WORKERS_MAX,
+    BLOCK_TILE_SIZE_MIN,
+    BLOCK_TILE_SIZE_MAX,
+    BLOCK_GENERATIONS_MAX,
+    RENDER_EVERY_MAX,
+    FRAME_BUDGET_MAX,
+    UniverseCalculationType,
     )
+from life.rules import GENERATIONS_RULES, LARGER_THAN_LIFE_RULES, LENIA_RULES, RULES
 from life.seeds import seeds
 from tests.test_life import TestLife
 
@@ -36,7 +46,11 @@ def main():
                             usage="%(prog)s [-h] [-c CELLSIZE] [-m] [-o] [-u] [-w WIDTHSCREEN]\n"
                             f"{' '*12}[-e HEIGHTSCREEN] [-f] [-s SPEED] [-n] [-i] [-k SEEDS]\n"
                             f"{' '*12}[-v OUTFILE] [-x] [-l LOGFILE] [-a] [-j] [-p STOPAFTER]\n"
-                            f"{' '*12}[-y] [-z] [-zz] [-uu] [-t] [-ts]\n")
+                            f"{' '*12}[-y] [-z] [-zz] [-uu] [-g ENGINE] [-r RULE]\n"
+                            f"{' '*12}[-hj HASHLIFEJUMP] [-hc HASHLIFECACHE] [-wk WORKERS]\n"
+                            f"{' '*12}[-bt BLOCKTILE] [-bg BLOCKGENERATIONS]\n"
+                            f"{' '*12}[-re RENDEREVERY] [-cy]\n"
+                            f"{' '*12}[-fb FRAMEBUDGET] [-t] [-ts]\n")
     parser.add_argument('-c', '--cellsize', default=None,
                         help='the size of each cell. '
                              f'Must be between {CELL_MIN_SIZE} and {CELL_MAX_SIZE}.')
@@ -99,6 +113,71 @@ def main():
                              'Resolution depends on desktop size and scale graphics. '
                              'Note that Pygame scaled is considered an experimental API '
                              'and is subject to change.')
+    parser.add_argument('-g', '--engine', default=None,
+                        help='the type of calculation used for the generations. \n'
+                             'It overrides the toroidal universe option for the types '
+                             'that define their own topology. \n'
+                             f"You can use these types: \n"
+                             f"{', '.join([x.name.lower() for x in UniverseCalculationType])}.")
+    parser.add_argument('-r', '--rule', default=None,
+                        help='the rule of the cellular automaton in B/S notation, \n'
+                             'such as B36/S23. By default, B3/S23. \n'
+                             'The bit_packed, hashlife, chunk_map, tiled, multi_process, \n'
+                             'thread_pool and cluster engines only calculate B3/S23. \n'
+                             f"You can also use these rules by name: \n"
+                             f"{', '.join(RULES)}. \n"
+                             'The larger_than_life engine also calculates Larger than Life \n'
+                             'rules, such as R5,C0,M1,S34..58,B34..45,NM, and it is used \n'
+                             'by default for them. You can also use these ones by name: \n'
+                             f"{', '.join(LARGER_THAN_LIFE_RULES)}. \n"
+                             'The generations engine also calculates Generations rules \n'
+                             'in S/B/C notation, such as 345/2/4, and it is used \n'
+                             'by default for them. You can also use these ones by name: \n'
+                             f"{', '.join(GENERATIONS_RULES)}. \n"
+                             'The lenia engine calculates Lenia rules, such as \n'
+                             'LENIA,R13,M0.15,S0.015,T0.1,Ggaussian, and it is used \n'
+                             'by default for them. You can also use these ones by name: \n'
+                             f"{', '.join(LENIA_RULES)}.")
+    parser.add_argument('-hj', '--hashlifejump', default=None,
+                        help='with the hashlife engine, each step of the universe jumps '
+                             '2 to the power of N generations. \n'
+                             f'Must be between 0 and {HASHLIFE_JUMP_MAX}.')
+    parser.add_argument('-hc', '--hashlifecache', default=None,
+                        help='the maximum number of results cached by the hashlife engine. \n'
+                             f'Must be at least {HASHLIFE_CACHE_SIZE_MIN}.')
+    parser.add_argument('-wk', '--workers', default=None,
+                        help='the number of workers used by the engines that calculate '
+                             'the universe in parallel. \n'
+                             f'Must be between 1 and {WORKERS_MAX}. '
+                             'By default, the number of CPUs.')
+    parser.add_argument('-bt', '--blocktile', default=None,
+                        help='with the temporal_blocking engine, the size of the tiles \n'
+                             'calculated several generations at once. \n'
+                             f'Must be between {BLOCK_TILE_SIZE_MIN} and {BLOCK_TILE_SIZE_MAX}. '
+                             'By default, it is calibrated.')
+    parser.add_argument('-bg', '--blockgenerations', default=None,
+                        help='with the temporal_blocking engine, the number of generations \n'
+                             'calculated on each tile at once. \n'
+                             f'Must be between 1 and {BLOCK_GENERATIONS_MAX}. '
+                             'By default, it is calibrated.')
+    parser.add_argument('-re', '--renderevery', default=None,
+                        help='when the generations are calculated one after another, \n'
+                             'as in auto mode, render only every N-th generation. \n'
+                             'The generations in between are calculated but not shown, \n'
+                             'saved to the output file or counted in the age statistics. \n'
+                             f'Must be between 1 and {RENDER_EVERY_MAX}.')
+    parser.add_argument('-fb', '--framebudget', default=None,
+                        help='with the time_sliced engine, the milliseconds of each frame \n'
+                             'spent calculating the next generation, which is calculated \n'
+                             'in bands of rows over several frames on big universes. \n'
+                             f'Must be between 1 and {FRAME_BUDGET_MAX}. By default, 10.')
+    parser.add_argument('-cy', '--cycles', default=False, action='store_true',
+                        help='detect when the universe dies out, becomes a still life \n'
+                             'or repeats a cycle of generations, and report its period \n'
+                             'in the output file. With --stopafter, the generations that \n'
+                             'repeat the cycle are skipped once the ages of the cells \n'
+                             'repeat too, and the statistics are advanced for them. \n'
+                             'It does not work with the hashlife and chunk_map engines.')
     parser.add_argument('-t', '--debugtraces', default=False, action='store_true',
                         help='show debug back traces information when something goes wrong.')
     parser.add_argument('-ts', '--testsuite', default=False, action='store_true',
@@ -128,6 +207,16 @@ def main():
                         full_screen=args.fullscreen,
                         cell_size=args.cellsize,
                         toroidal_universe=args.toroidaluniverse,
+                        universe_calculation=args.engine,
+                        rule=args.rule,
+                        hashlife_jump=args.hashlifejump,
+                        hashlife_cache_size=args.hashlifecache,
+                        workers=args.workers,
+                        block_tile_size=args.blocktile,
+                        block_generations=args.blockgenerations,
+                        render_every=args.renderevery,
+                        frame_budget=args.framebudget,
+                        cycle_detection=args.cycles,
                         empty_universe=args.emptyuniverse,
                         cell_one_color=args.onecolor,
                         edit_not_allowed=args.editnotallowed,
@@ -0,0 +1,212 @@
+"""Module adaptive."""
+__author__ = 'Joan A. Pinol  (japinol)'
+
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from life.engines import EngineBase
+from life import lib_jp
+from life.settings import Settings, UniverseCalculationType
+
+# Generations calculated by each engine in a benchmark, after one to warm it up
+BENCHMARK_GENERATIONS = 3
+# An engine stops being benchmarked when a generation takes this ratio of the time of the fastest one so far
+BENCHMARK_SLOW_RATIO = 10
+# Generations between two checks of the density and the time per generation
+CHECK_GENERATIONS = 50
+# The engines are benchmarked again when the density or the time per generation
+# change by this ratio since the last benchmark
+DENSITY_CHANGE_RATIO = 2
+STEP_TIME_CHANGE_RATIO = 2
+# Density below which the changes of density are not taken into account, since they are tiny
+DENSITY_MIN = 0.001
+# Time per generation below which the changes of time are not taken into account, in seconds
+STEP_TIME_MIN = 0.0001
+# Another engine is only chosen if it takes less than this ratio of the time of the current one,
+# so the engines are not switched back and forth for small differences
+SWITCH_TIME_RATIO = 0.8
+
+
+def candidate_calculations():
+    """Returns the generation calculation types that the adaptive engine can choose for the settings.
+    They use the same topology and they calculate the same generations, so they can be switched.
+    """
+    res = [UniverseCalculationType.TOROIDAL_FAST if Settings.toroidal_universe
+           else UniverseCalculationType.NON_TOROIDAL_FAST,
+           UniverseCalculationType.RULE_TABLE]
+    Settings.rule.dead[0] or res.append(UniverseCalculationType.CHANGE_LIST)
+    if Settings.rule.is_life:
+        res += [UniverseCalculationType.BIT_PACKED,
+                UniverseCalculationType.TILED,
+                UniverseCalculationType.THREAD_POOL]
+    return res
+
+
+class AdaptiveEngine(EngineBase):
+    """Calculates generations with the engine that is fastest for the universe,
+    which depends on its size and on its density: the dense engines suit busy
+    universes, and the change list engine suits the quiet ones.
+    The engines are benchmarked on a copy of the universe before the first
+    generation. Then the density and the time per generation are tracked,
+    and when they change too much, the engines are benchmarked again.
+    The engines are switched between two steps, loading the new one with
+    the current generation, so the ages and the statistics of the universe
+    are kept. The engine chosen and each switch are written to the log file.
+    It uses the toroidal or the flat topology according to settings.
+    In a flat universe, the cells on the border do not change, the same way
+    as the non toroidal fast calculation does.
+    """
+    name = 'adaptive'
+
+    def __init__(self, universe, create_engine):
+        super().__init__(universe)
+        self._create_engine = create_engine
+        self.calculations = candidate_calculations()
+        self.engine = create_engine(universe, self.calculations[0])
+        # Seconds per generation of each engine in the last benchmark, by name
+        self.benchmark = OrderedDict()
+        self._benchmark_density = None
+        self._calculation_next = None
+        self.switches = 0
+        self._generations = 0
+        self._step_time = 0
+        self._step_time_generations = 0
+        self.step_time = None
+        # Time per generation of the engine on the universe in the first check after a benchmark,
+        # which includes the costs that the benchmark does not have, such as the caches shared with the graphics
+        self._step_time_reference = None
+
+    @property
+    def swaps_cells(self):
+        return self.engine.swaps_cells
+
+    def load(self, cells):
+        self.engine.load(cells)
+
+    def close(self):
+        self.engine.close()
+
+    def population(self):
+        return self.engine.population()
+
+    def changed_cells(self):
+        return self.engine.changed_cells()
+
+    def density(self):
+        """Returns the ratio of cells alive."""
+        return self.engine.population() / (self.universe.size_u.w * self.universe.size_u.h)
+
+    def stats(self):
+        res = super().stats()
+        res['engine'] = self.engine.name
+        res['density'] = round(self.density(), 4)
+        res['time per generation'] = f'{self.step_time * 1000:.3f} ms' if self.step_time else '-'
+        res['switches'] = self.switches
+        return res
+
+    def info(self):
+        res = super().info()
+        res['benchmark'] = ', '.join(f'{name} {seconds * 1000:.3f} ms' for name, seconds in self.benchmark.items())
+        res[self.engine.name] = self.engine.info()
+        return res
+
+    def _write_log(self, line):
+        debug_info = self.universe.game.debug_info
+        debug_info and debug_info.write_line(f"-**- Adaptive engine at generation {self.universe.generation}: "
+                                             f"{line} -**-")
+
+    def _benchmark(self):
+        """Benchmarks the engines on a copy of the current generation and returns the fastest one."""
+        self.benchmark.clear()
+        cells = self.universe.cells
+        calculations = {}
+        for calculation in self.calculations:
+            universe = _BenchmarkUniverse(cells)
+            engine = self._create_engine(universe, calculation)
+            try:
+                engine.load(universe.cells)
+                cells_old = universe.cells.copy()
+                engine.calculate_generation(cells_old)
+                seconds, generations = 0, 0
+                fastest_seconds = min(self.benchmark.values(), default=None)
+                while generations < BENCHMARK_GENERATIONS:
+                    np.copyto(cells_old, universe.cells)
+                    start = time.perf_counter()
+                    engine.calculate_generation(cells_old)
+                    seconds += time.perf_counter() - start
+                    generations += 1
+                    if fastest_seconds and seconds / generations > fastest_seconds * BENCHMARK_SLOW_RATIO:
+                        break
+                self.benchmark[engine.name] = seconds / generations
+            finally:
+                engine.close()
+            calculations[engine.name] = calculation
+        self._benchmark_density = self.density()
+        self._step_time, self._step_time_generations = 0, 0
+        self._step_time_reference = None
+        fastest = min(self.benchmark, key=self.benchmark.get)
+        benchmark = ', '.join(f'{name} {seconds * 1000:.3f} ms' for name, seconds in self.benchmark.items())
+        self._write_log(f"benchmark at density {self._benchmark_density:.4f}: {benchmark}")
+        return fastest, calculations[fastest]
+
+    def _check(self):
+        """Benchmarks the engines again if the density or the time per generation have changed
+        too much since the last benchmark, and chooses another engine if it is clearly faster.
+        """
+        self.step_time = self._step_time / self._step_time_generations
+        density_old, density = max(self._benchmark_density, DENSITY_MIN), max(self.density(), DENSITY_MIN)
+        self._step_time_reference = self._step_time_reference or self.step_time
+        step_time_old, step_time = max(self._step_time_reference, STEP_TIME_MIN), max(self.step_time, STEP_TIME_MIN)
+        if (max(density, density_old) / min(density, density_old) < DENSITY_CHANGE_RATIO
+                and max(step_time, step_time_old) / min(step_time, step_time_old) < STEP_TIME_CHANGE_RATIO):
+            self._step_time, self._step_time_generations = 0, 0
+            return
+        fastest, calculation = self._benchmark()
+        if fastest != self.engine.name and self.benchmark[fastest] < self.benchmark[self.engine.name] * SWITCH_TIME_RATIO:
+            self._calculation_next = calculation
+
+    def _replace_engine(self, calculation):
+        """Replaces the engine by the one of a calculation type, which is loaded with the current generation."""
+        # The matrix of cells may be a buffer of the old engine
+        self.universe.cells = self.universe.cells.copy()
+        self.engine.close()
+        self.engine = self._create_engine(self.universe, calculation)
+        self.engine.load(self.universe.cells)
+
+    def calculate_generation(self, cells_old):
+        self.calculate_generations(cells_old, 1)
+
+    def calculate_generations(self, cells_old, n):
+        if not self.benchmark:
+            fastest, calculation = self._benchmark()
+            fastest != self.engine.name and self._replace_engine(calculation)
+            self._write_log(f"engine chosen: {fastest}")
+        elif self._calculation_next:
+            name_old = self.engine.name
+            self._replace_engine(self._calculation_next)
+            self._calculation_next = None
+            self.switches += 1
+            self._write_log(f"switched from {name_old} to {self.engine.name}")
+
+        start = time.perf_counter()
+        if n == 1:
+            self.engine.calculate_generation(cells_old)
+        else:
+            self.engine.calculate_generations(cells_old, n)
+        self._step_time += time.perf_counter() - start
+        self._step_time_generations += n
+
+        self._generations += n
+        if self._generations >= CHECK_GENERATIONS:
+            self._generations = 0
+            self._check()
+
+
+class _BenchmarkUniverse:
+    """A universe without graphics, for the benchmarks of the engines."""
+
+    def __init__(self, cells):
+        self.cells = cells.copy()
+        self.size_u = lib_jp.Size(w=cells.shape[1], h=cells.shape[0])
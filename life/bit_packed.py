@@ -0,0 +1,139 @@
+"""Module bit_packed."""
+__author__ = 'Joan A. Pinol  (japinol)'
+
+import numpy as np
+
+from life.engines import EngineBase
+from life.settings import Settings
+
+WORD_BITS = 64
+WORD_DTYPE = np.dtype('<u8')
+
+
+def words_per_row(width):
+    return (width + WORD_BITS - 1) // WORD_BITS
+
+
+def pack(cells):
+    """Packs a matrix of cells of uint8 into rows of uint64 words.
+    The bit j of the word k of a row is the cell in the column 64 * k + j.
+    The bits after the last column of each row are always zero.
+    """
+    h, w = cells.shape
+    bytes_per_row = words_per_row(w) * WORD_DTYPE.itemsize
+    res = np.zeros((h, bytes_per_row), dtype=np.uint8)
+    packed = np.packbits(cells, axis=1, bitorder='little')
+    res[:, :packed.shape[1]] = packed
+    return res.view(WORD_DTYPE)
+
+
+def unpack(words, width, out=None):
+    """Unpacks rows of uint64 words into a matrix of cells of uint8."""
+    res = np.unpackbits(words.view(np.uint8), axis=1, count=width, bitorder='little')
+    if out is None:
+        return res
+    out[:] = res
+    return out
+
+
+def population(words):
+    """Counts the cells alive in an array of packed words."""
+    return int(np.bitwise_count(words).sum())
+
+
+def _majority(a, b, c):
+    """Carry bit of a full adder."""
+    return (a & b) | (c & (a ^ b))
+
+
+def last_word_mask(width):
+    """Returns the mask of the bits that represent cells in the last word of each row."""
+    return WORD_DTYPE.type((1 << ((width - 1) % WORD_BITS + 1)) - 1)
+
+
+def _shift_west_east(rows, width, toroidal):
+    """Returns the words of the left and right neighbors of each cell."""
+    west = rows << 1
+    west[:, 1:] |= rows[:, :-1] >> (WORD_BITS - 1)
+    east = rows >> 1
+    east[:, :-1] |= rows[:, 1:] << (WORD_BITS - 1)
+    if toroidal:
+        last_bit = (width - 1) % WORD_BITS
+        west[:, 0] |= (rows[:, -1] >> last_bit) & 1
+        east[:, -1] |= (rows[:, 0] & 1) << last_bit
+    return west, east
+
+
+def next_generation_words(rows, width, toroidal):
+    """Returns the next generation of the packed rows between the first and the last one,
+    which are the halo rows. The neighbors are counted with the logic of full adders on bit planes.
+    The rows wrap around horizontally in a toroidal universe.
+    """
+    west, east = _shift_west_east(rows, width, toroidal)
+
+    # Sum of each cell with its left and right neighbors as two bit planes
+    rows_sum0 = west ^ rows ^ east
+    rows_sum1 = _majority(west, rows, east)
+    # Sum of the left and right neighbors of the cells in the middle row
+    mid_sum0 = west[1:-1] ^ east[1:-1]
+    mid_sum1 = west[1:-1] & east[1:-1]
+
+    # Add the three sums to get the 8 neighbors as weighted bit planes
+    up0, up1 = rows_sum0[:-2], rows_sum1[:-2]
+    down0, down1 = rows_sum0[2:], rows_sum1[2:]
+    ones = up0 ^ down0 ^ mid_sum0
+    carry = _majority(up0, down0, mid_sum0)
+    # The number of neighbors is 2 or 3 if exactly one of the twos planes is set
+    ab, cd = up1 ^ down1, mid_sum1 ^ carry
+    twos_only_one = (ab ^ cd) & ~((up1 & down1) | (mid_sum1 & carry) | (ab & cd))
+
+    new_cells = twos_only_one & (ones | rows[1:-1])
+    new_cells[:, -1] &= last_word_mask(width)
+    return new_cells
+
+
+class BitPackedEngine(EngineBase):
+    """Calculates generations on rows packed into uint64 words,
+    so each bitwise operation moves 64 cells at once.
+    The neighbors are counted with the logic of full adders on bit planes.
+    It uses the toroidal or the flat topology according to settings.
+    In a flat universe, the cells on the border do not change, the same way
+    as the non toroidal fast calculation does.
+    """
+    name = 'bit_packed'
+
+    def __init__(self, universe):
+        super().__init__(universe)
+        self.toroidal = Settings.toroidal_universe
+        self.width = universe.size_u.w
+        h = universe.size_u.h
+        n_words = words_per_row(self.width)
+        # Packed rows with a halo row above and below
+        self._padded = np.zeros((h + 2, n_words), dtype=WORD_DTYPE)
+        self.words = self._padded[1:-1]
+        self._border_mask = None
+        if not self.toroidal:
+            border = np.zeros((h, self.width), dtype=np.uint8)
+            border[[0, -1], :] = 1
+            border[:, [0, -1]] = 1
+            self._border_mask = pack(border)
+
+    def load(self, cells):
+        self.words[:] = pack(cells)
+
+    def population(self):
+        return population(self.words)
+
+    def _refresh_halo(self):
+        if self.toroidal:
+            self._padded[0] = self._padded[-2]
+            self._padded[-1] = self._padded[1]
+
+    def calculate_generation(self, _):
+        self._refresh_halo()
+        cells = self.words
+        new_cells = next_generation_words(self._padded, self.width, self.toroidal)
+        if self._border_mask is not None:
+            new_cells = (new_cells & ~self._border_mask) | (cells & self._border_mask)
+        cells[:] = new_cells
+        unpack(cells, self.width, out=self.universe.cells)
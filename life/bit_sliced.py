@@ -0,0 +1,150 @@
+"""Module bit_sliced."""
+__author__ = 'Joan A. Pinol  (japinol)'
+
+import numpy as np
+
+from life.bit_packed import WORD_BITS, WORD_DTYPE
+from life.halos import refresh_halo_toroidal
+from life.settings import UNIVERSE_SIZE_DEFAULT
+
+SOUPS_MAX = WORD_BITS
+# Periods of the oscillators detected as stabilized, including the still lifes
+STABILIZATION_PERIOD_MAX = 2
+
+
+def pack_soups(cells):
+    """Packs up to 64 matrices of cells of uint8 with shape (N, H, W)
+    into a matrix of uint64 words, where the bit k of each word is
+    the cell of the soup k.
+    """
+    n, h, w = cells.shape
+    res = np.zeros((SOUPS_MAX, h, w), dtype=np.uint8)
+    res[:n] = cells
+    packed = np.packbits(res, axis=0, bitorder='little')
+    return np.ascontiguousarray(packed.transpose(1, 2, 0)).view(WORD_DTYPE)[:, :, 0]
+
+
+def soups_from_mask(mask):
+    """Returns an array of bools with the soups whose bit is set in a word."""
+    return np.unpackbits(np.array([mask], dtype=WORD_DTYPE).view(np.uint8), bitorder='little').astype(bool)
+
+
+class BitSlicedEngine:
+    """Calculates generations of 64 independent soups at once.
+    Each cell is a uint64 word and the bit k of it is the cell of the soup k,
+    so each bitwise operation of the full adders that count the neighbors
+    calculates the same cell of the 64 soups.
+    It keeps the last generations, so it can tell which soups have
+    stabilized into still lifes or oscillators of period 2.
+    It uses the toroidal or the flat topology. In a flat universe, the cells
+    on the border do not change, the same way as the non toroidal fast calculation does.
+    It only calculates the rule of Conway's Game of Life.
+    """
+
+    def __init__(self, words, toroidal=False):
+        self.toroidal = toroidal
+        self.generation = 1
+        h, w = words.shape
+        # The current generation and the previous ones, with a halo
+        self._buffers = np.zeros((STABILIZATION_PERIOD_MAX + 1, h + 2, w + 2), dtype=WORD_DTYPE)
+        self._current = 0
+        self.generations_kept = 1
+        if not toroidal:
+            h, w = h - 2, w - 2
+        # Bit planes of the number of neighbors modulo 8 and their carries
+        self._planes = np.zeros((3, h, w), dtype=WORD_DTYPE)
+        self._carries = np.zeros((2, h, w), dtype=WORD_DTYPE)
+        self._changed = np.zeros(words.shape, dtype=WORD_DTYPE)
+        self.load(words)
+
+    @classmethod
+    def from_random_soups(cls, universe_size=None, soup_size=None, density=0.5, seed=None, toroidal=False):
+        """Creates 64 random soups in the center of universes of a given size.
+        Each cell of a soup is alive with the given probability.
+        """
+        universe_size = universe_size or UNIVERSE_SIZE_DEFAULT
+        soup_size = soup_size or universe_size
+        rng = np.random.default_rng(seed)
+        cells = np.zeros((SOUPS_MAX, universe_size.h, universe_size.w), dtype=np.uint8)
+        y = (universe_size.h - soup_size.h) // 2
+        x = (universe_size.w - soup_size.w) // 2
+        cells[:, y:y + soup_size.h, x:x + soup_size.w] = rng.random((SOUPS_MAX, soup_size.h, soup_size.w)) < density
+        return cls(pack_soups(cells), toroidal=toroidal)
+
+    def load(self, words):
+        """Loads the soups from a matrix of uint64 words."""
+        # The cells on the border of a flat universe never change, so they are copied to all the buffers
+        self._buffers[:, 1:-1, 1:-1] = words
+        self.generations_kept = 1
+
+    @property
+    def words(self):
+        """The cells of all the soups as a matrix of uint64 words."""
+        return self._buffers[self._current, 1:-1, 1:-1]
+
+    def soup_cells(self, soup):
+        """Returns the matrix of cells of a soup, as the one of Universe.cells."""
+        return ((self.words >> np.uint64(soup)) & np.uint64(1)).astype(np.uint8)
+
+    def population(self):
+        """Returns the number of cells alive of each soup."""
+        bits = np.unpackbits(self.words.view(np.uint8).reshape(-1, WORD_DTYPE.itemsize), axis=1, bitorder='little')
+        return bits.sum(axis=0, dtype=np.int64)
+
+    def extinct(self):
+        """Returns which soups have no cells alive."""
+        return ~soups_from_mask(np.bitwise_or.reduce(self.words, axis=None))
+
+    def stabilized(self):
+        """Returns which soups are the same as one or two generations before,
+        that is, the soups that have become still lifes or oscillators of period 2.
+        The soups that died out are also stabilized.
+        """
+        if self.generations_kept == 1:
+            return np.zeros(SOUPS_MAX, dtype=bool)
+        # The bit of a soup is set if it changed from all the previous generations kept
+        changed_mask = ~np.uint64(0)
+        for period in range(1, self.generations_kept):
+            previous = self._buffers[(self._current - period) % len(self._buffers), 1:-1, 1:-1]
+            np.bitwise_xor(self.words, previous, out=self._changed)
+            changed_mask &= np.bitwise_or.reduce(self._changed, axis=None)
+        return ~soups_from_mask(changed_mask)
+
+    def calculate_generation(self):
+        padded = self._buffers[self._current]
+        self._current = (self._current + 1) % len(self._buffers)
+        padded_new = self._buffers[self._current]
+        if self.toroidal:
+            refresh_halo_toroidal(padded)
+            cells, cells_new = padded, padded_new[1:-1, 1:-1]
+        else:
+            cells, cells_new = padded[1:-1, 1:-1], padded_new[2:-2, 2:-2]
+
+        # Add the 8 neighbors to the bit planes of their count with half adders.
+        # A count of 8 becomes 0, which is also a dead cell in the next generation
+        b0, b1, b2 = self._planes
+        c0, c1 = self._carries
+        h, w = cells.shape
+        neighbors = [cells[y:h - 2 + y, x:w - 2 + x] for y in range(3) for x in range(3) if (y, x) != (1, 1)]
+        np.copyto(b0, neighbors[0])
+        b1.fill(0)
+        b2.fill(0)
+        for neighbor in neighbors[1:]:
+            np.bitwise_and(b0, neighbor, out=c0)
+            np.bitwise_xor(b0, neighbor, out=b0)
+            np.bitwise_and(b1, c0, out=c1)
+            np.bitwise_xor(b1, c0, out=b1)
+            np.bitwise_xor(b2, c1, out=b2)
+
+        # A cell is alive with 3 neighbors, or with 2 if it was alive: count 01x and bit 0 or alive
+        np.bitwise_or(b0, cells[1:-1, 1:-1], out=b0)
+        np.bitwise_and(b1, b0, out=b1)
+        np.invert(b2, out=b2)
+        np.bitwise_and(b1, b2, out=cells_new)
+
+        self.generation += 1
+        self.generations_kept = min(self.generations_kept + 1, len(self._buffers))
+
+    def calculate_generations(self, n):
+        for _ in range(n):
+            self.calculate_generation()
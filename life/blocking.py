@@ -0,0 +1,167 @@
+"""Module blocking."""
+__author__ = 'Joan A. Pinol  (japinol)'
+
+import time
+
+import numpy as np
+
+from life.engines import EngineBase
+from life.halos import refresh_wide_halo_toroidal
+from life import lib_jp
+from life.settings import Settings
+
+# Candidates tried by the calibration for the size of the tiles and the generations per tile
+CALIBRATION_TILE_SIZES = (64, 128, 256)
+CALIBRATION_GENERATIONS = (1, 2, 4, 8, 16)
+# Size of the random universe calculated by the calibration
+CALIBRATION_UNIVERSE_SIZE = 512
+
+
+class TemporalBlockingEngine(EngineBase):
+    """Calculates several generations of each tile of the universe at once.
+    Each tile is copied with a halo as wide as the number of generations,
+    which is calculated while it stays in the cache. The halo is one cell
+    narrower after each generation, so after all of them the tile itself
+    is exact and it is written back to the universe.
+    The universe is only streamed through memory once for all these generations,
+    which pays off on universes larger than the cache of the processor.
+    The size of the tiles and the generations per tile are calibrated
+    when they are not given.
+    It uses the toroidal or the flat topology according to settings.
+    In a flat universe, the cells on the border do not change, the same way
+    as the non toroidal fast calculation does.
+    """
+    name = 'temporal_blocking'
+    # Results of the calibration, which is only done once
+    calibration = None
+
+    def __init__(self, universe, tile_size=None, generations=None):
+        super().__init__(universe)
+        self.rule = Settings.rule
+        self.toroidal = Settings.toroidal_universe
+        self.h, self.w = universe.size_u.h, universe.size_u.w
+        tile_size = tile_size or Settings.block_tile_size
+        generations = generations or Settings.block_generations
+        if not tile_size or not generations:
+            tile_size_calibrated, generations_calibrated = self.calibrate()
+            tile_size = tile_size or tile_size_calibrated
+            generations = generations or generations_calibrated
+        self.tile_size = tile_size
+        # The halo of a toroidal universe is copied from the other side, so it cannot be wider than it
+        self.generations = max(1, min(generations, self.h, self.w))
+        k = self.generations
+
+        # The current and the next generation with a halo as wide as the generations per tile
+        self._buffers = np.zeros((2, self.h + 2 * k, self.w + 2 * k), dtype=np.uint8)
+        self._current = 0
+        # Cells that never change: the ones out of the universe and the ones on the border of a flat one
+        frozen = np.ones((self.h + 2 * k, self.w + 2 * k), dtype=bool)
+        if self.toroidal:
+            frozen[:] = False
+        else:
+            frozen[k + 1:k + self.h - 1, k + 1:k + self.w - 1] = False
+        # Limits of the tiles in the coordinates of the universe and their frozen cells, if any
+        self._tiles = []
+        for y0 in range(0, self.h, tile_size):
+            for x0 in range(0, self.w, tile_size):
+                y1, x1 = min(y0 + tile_size, self.h), min(x0 + tile_size, self.w)
+                tile_frozen = frozen[y0:y1 + 2 * k, x0:x1 + 2 * k]
+                self._tiles.append((y0, y1, x0, x1, tile_frozen if tile_frozen.any() else None))
+
+        # Buffers of a tile with its halo, which are reused for all the tiles
+        size = min(tile_size, max(self.h, self.w)) + 2 * k
+        self._tile_buffers = np.zeros((2, size, size), dtype=np.uint8)
+        # Sums of each cell with its left and right neighbors, including the halo rows
+        self._row_sums = np.zeros((size, size - 2), dtype=np.uint8)
+        # Sums of the 3x3 neighborhood of each cell, including the cell itself
+        self._neighborhood_sums = np.zeros((size - 2, size - 2), dtype=np.uint8)
+        self._rule_indexes = np.zeros((size - 2, size - 2), dtype=np.uint8)
+        self._rule_shifted = np.zeros((size - 2, size - 2), dtype=np.uint32)
+
+    @classmethod
+    def calibrate(cls):
+        """Returns the size of the tiles and the generations per tile that calculate
+        a random universe in less time. The results are kept, so it is only done once.
+        """
+        if cls.calibration:
+            return cls.calibration
+        cells = (np.random.default_rng(0).random((CALIBRATION_UNIVERSE_SIZE,) * 2) < 0.5).astype(np.uint8)
+        times = {}
+        for tile_size in CALIBRATION_TILE_SIZES:
+            for generations in CALIBRATION_GENERATIONS:
+                engine = cls(_CalibrationUniverse(cells), tile_size=tile_size, generations=generations)
+                engine.load(cells)
+                start = time.perf_counter()
+                engine.calculate_generations(None, generations)
+                times[tile_size, generations] = (time.perf_counter() - start) / generations
+        cls.calibration = min(times, key=times.get)
+        return cls.calibration
+
+    def load(self, cells):
+        k = self.generations
+        self._buffers[:] = 0
+        self._buffers[:, k:k + self.h, k:k + self.w] = cells
+
+    def stats(self):
+        res = super().stats()
+        res['tile size'] = self.tile_size
+        res['generations per tile'] = self.generations
+        return res
+
+    def _calculate_tile_generation(self, cells, cells_new, frozen):
+        """Calculates the next generation of a tile with its halo.
+        The cells on the edges of the halo are not calculated.
+        """
+        h, w = cells.shape
+        # The 3x3 sums are separable: first sum each row, then each column
+        row_sums = self._row_sums[:h, :w - 2]
+        np.add(cells[:, :-2], cells[:, 1:-1], out=row_sums)
+        np.add(row_sums, cells[:, 2:], out=row_sums)
+        sums = self._neighborhood_sums[:h - 2, :w - 2]
+        np.add(row_sums[:-2], row_sums[1:-1], out=sums)
+        np.add(sums, row_sums[2:], out=sums)
+
+        # The table of the rule is indexed by the sum of the neighborhood plus 8 if the cell is alive
+        rule_indexes = self._rule_indexes[:h - 2, :w - 2]
+        np.multiply(cells[1:-1, 1:-1], 8, out=rule_indexes)
+        np.add(rule_indexes, sums, out=rule_indexes)
+        self.rule.apply_sums(rule_indexes, self._rule_shifted[:h - 2, :w - 2], out=cells_new[1:-1, 1:-1])
+        frozen is not None and np.copyto(cells_new, cells, where=frozen)
+
+    def _calculate_block(self, generations):
+        """Calculates some generations, up to the generations per tile, tile by tile."""
+        k = self.generations
+        padded, padded_new = self._buffers[self._current], self._buffers[1 - self._current]
+        self.toroidal and refresh_wide_halo_toroidal(padded, k)
+        # The halo needed by the generations to calculate is narrower than the one kept
+        margin = k - generations
+        for y0, y1, x0, x1, frozen in self._tiles:
+            h, w = y1 - y0 + 2 * generations, x1 - x0 + 2 * generations
+            cells, cells_new = self._tile_buffers[0, :h, :w], self._tile_buffers[1, :h, :w]
+            np.copyto(cells, padded[y0 + margin:y1 + 2 * k - margin, x0 + margin:x1 + 2 * k - margin])
+            if frozen is not None:
+                frozen = frozen[margin:frozen.shape[0] - margin, margin:frozen.shape[1] - margin]
+            for _ in range(generations):
+                self._calculate_tile_generation(cells, cells_new, frozen)
+                cells, cells_new = cells_new, cells
+            padded_new[k + y0:k + y1, k + x0:k + x1] = cells[generations:-generations, generations:-generations]
+        self._current = 1 - self._current
+
+    def calculate_generation(self, cells_old):
+        self.calculate_generations(cells_old, 1)
+
+    def calculate_generations(self, cells_old, n):
+        while n > 0:
+            generations = min(n, self.generations)
+            self._calculate_block(generations)
+            n -= generations
+        k = self.generations
+        np.copyto(self.universe.cells, self._buffers[self._current, k:k + self.h, k:k + self.w])
+
+
+class _CalibrationUniverse:
+    """A universe without graphics, for the calibration of the engine."""
+
+    def __init__(self, cells):
+        self.cells = cells.copy()
+        self.size_u = lib_jp.Size(w=cells.shape[1], h=cells.shape[0])
@@ -0,0 +1,115 @@
+"""Module changes."""
+__author__ = 'Joan A. Pinol  (japinol)'
+
+import numpy as np
+
+from life.engines import EngineBase
+from life.settings import Settings
+
+# Offsets of the rows and columns of the neighbors of a cell
+NEIGHBOR_OFFSETS = np.array([(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)])
+# Offsets of the 3x3 neighborhood of a cell, including the cell itself
+NEIGHBORHOOD_OFFSETS = np.concatenate((NEIGHBOR_OFFSETS, [(0, 0)]))
+
+
+class ChangeListEngine(EngineBase):
+    """Calculates generations from the list of cells that changed in the last one.
+    A cell can only change if itself or one of its neighbors changed,
+    so each generation only evaluates the cells that changed and their neighbors.
+    It keeps the number of neighbors of every cell, which is updated by one
+    around each cell born or dead, so the cost of a generation depends on
+    the activity of the universe, not on its size.
+    The cells that changed are also given to the universe, so it only
+    updates those cells and the ones alive on the board.
+    It uses the toroidal or the flat topology according to settings.
+    In a flat universe, the cells on the border do not change, the same way
+    as the non toroidal fast calculation does.
+    It does not calculate rules where dead cells without neighbors are born.
+    """
+    name = 'change_list'
+
+    def __init__(self, universe):
+        super().__init__(universe)
+        self.rule = Settings.rule
+        self.toroidal = Settings.toroidal_universe
+        self.size = universe.size_u
+        self._counts = np.zeros((self.size.h, self.size.w), dtype=np.uint8)
+        self._counts_flat = self._counts.reshape(-1)
+        self._population = 0
+        # Flat indexes of the cells that changed in the last generation and in the last step of the universe
+        self._changed = np.zeros(0, dtype=np.intp)
+        self._step_changed = np.zeros(0, dtype=np.intp)
+
+    def load(self, cells):
+        if self.toroidal:
+            padded = np.pad(cells, 1, mode='wrap')
+        else:
+            padded = np.pad(cells, 1)
+        h, w = cells.shape
+        self._counts.fill(0)
+        for y, x in NEIGHBOR_OFFSETS:
+            self._counts += padded[1 + y:1 + y + h, 1 + x:1 + x + w]
+        self._population = int(np.count_nonzero(cells))
+        # Every cell alive may change, as well as its neighbors
+        self._changed = np.flatnonzero(cells)
+        self._step_changed = np.zeros(0, dtype=np.intp)
+
+    def population(self):
+        return self._population
+
+    def changed_cells(self):
+        return np.divmod(self._step_changed, self.size.w)
+
+    def stats(self):
+        res = super().stats()
+        res['cells changed'] = len(self._changed)
+        return res
+
+    def _neighborhood_coords(self, indexes, offsets):
+        """Returns the rows and columns of the cells at some offsets of the cells
+        with the given flat indexes, with one row for each offset.
+        """
+        ys, xs = np.divmod(indexes, self.size.w)
+        ys = ys + offsets[:, 0, np.newaxis]
+        xs = xs + offsets[:, 1, np.newaxis]
+        if self.toroidal:
+            ys %= self.size.h
+            xs %= self.size.w
+        return ys, xs
+
+    def calculate_generation(self, _):
+        cells = self.universe.cells
+        h, w = self.size.h, self.size.w
+        ys, xs = self._neighborhood_coords(self._changed, NEIGHBORHOOD_OFFSETS)
+        if not self.toroidal:
+            # The cells on the border of a flat universe do not change
+            inner = (ys >= 1) & (ys < h - 1) & (xs >= 1) & (xs < w - 1)
+            ys, xs = ys[inner], xs[inner]
+        candidates = np.unique(ys * w + xs)
+
+        # The table of the rule is indexed by the sum of the neighborhood plus 8 if the cell is alive
+        alive = cells.flat[candidates]
+        states = self.rule.sums_table[self._counts_flat[candidates] + alive * 9]
+        changed = states != alive
+        self._changed = candidates[changed]
+        born = states[changed].astype(bool)
+        cells.flat[self._changed] = states[changed]
+        self._step_changed = self._changed
+        born_no = int(np.count_nonzero(born))
+        self._population += born_no - (len(born) - born_no)
+
+        # The cells of a flat universe that change are not on the border, so all their neighbors are in it
+        ys, xs = self._neighborhood_coords(self._changed, NEIGHBOR_OFFSETS)
+        for neighbors_offset in ys * w + xs:
+            # The neighbors at the same offset of different cells are different cells too
+            self._counts_flat[neighbors_offset[born]] += 1
+            self._counts_flat[neighbors_offset[~born]] -= 1
+
+    def calculate_generations(self, cells_old, n):
+        step_changed = []
+        for _ in range(n):
+            self.calculate_generation(cells_old)
+            step_changed.append(self._changed)
+        # Only keep the cells that are not the same as in the old generation
+        step_changed = np.unique(np.concatenate(step_changed))
+        self._step_changed = step_changed[self.universe.cells.flat[step_changed] != cells_old.flat[step_changed]]
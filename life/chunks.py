@@ -0,0 +1,118 @@
+"""Module chunks."""
+__author__ = 'Joan A. Pinol  (japinol)'
+
+import numpy as np
+
+from life.engines import EngineBase
+
+CHUNK_SIZE = 32
+
+# Neighbor chunks: (row offset, column offset), halo slice to fill, slice of the neighbor to copy
+CHUNK_NEIGHBORS = (
+    ((-1, -1), (0, 0), (-1, -1)),
+    ((-1, 0), (0, slice(1, -1)), (-1, slice(None))),
+    ((-1, 1), (0, -1), (-1, 0)),
+    ((0, -1), (slice(1, -1), 0), (slice(None), -1)),
+    ((0, 1), (slice(1, -1), -1), (slice(None), 0)),
+    ((1, -1), (-1, 0), (0, -1)),
+    ((1, 0), (-1, slice(1, -1)), (0, slice(None))),
+    ((1, 1), (-1, -1), (0, 0)),
+)
+
+
+class ChunkMapEngine(EngineBase):
+    """Calculates generations of an unbounded universe stored as
+    a dictionary of dense chunks of cells, indexed by their row and column.
+    The chunks are allocated when a cell is born in them and freed when
+    all their cells die, so the memory and the time of each generation
+    depend on the area with cells alive, not on its bounding box.
+    The matrix of cells of the universe is a window on it with its
+    top left corner at the origin.
+    """
+    name = 'chunk_map'
+    unbounded = True
+
+    def __init__(self, universe, chunk_size=CHUNK_SIZE):
+        super().__init__(universe)
+        self.chunk_size = chunk_size
+        self.chunks = {}
+
+    def load(self, cells):
+        size = self.chunk_size
+        self.chunks = {}
+        for y in range(0, cells.shape[0], size):
+            for x in range(0, cells.shape[1], size):
+                block = cells[y:y + size, x:x + size]
+                if block.any():
+                    chunk = np.zeros((size, size), dtype=np.uint8)
+                    chunk[:block.shape[0], :block.shape[1]] = block
+                    self.chunks[y // size, x // size] = chunk
+
+    def set_cell(self, y, x, alive):
+        # Only the chunk of the cell changes, so the chunks out of the window are kept
+        size = self.chunk_size
+        key = y // size, x // size
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            if not alive:
+                return
+            chunk = self.chunks[key] = np.zeros((size, size), dtype=np.uint8)
+        chunk[y % size, x % size] = 1 if alive else 0
+        chunk.any() or self.chunks.pop(key)
+
+    def info(self):
+        res = super().info()
+        res['chunks'] = len(self.chunks)
+        res['chunk size'] = self.chunk_size
+        res['population'] = sum(int(np.count_nonzero(chunk)) for chunk in self.chunks.values())
+        res['memory bytes'] = sum(chunk.nbytes for chunk in self.chunks.values())
+        return res
+
+    def _chunks_to_calculate(self):
+        """Returns the chunks alive and the neighbor chunks
+        where a cell can be born, because a cell alive touches them.
+        """
+        res = set(self.chunks)
+        for (row, col), chunk in self.chunks.items():
+            # The edge copied to a neighbor is the one facing the opposite direction
+            for (d_row, d_col), _, edge in CHUNK_NEIGHBORS:
+                if (row - d_row, col - d_col) not in res and chunk[edge].any():
+                    res.add((row - d_row, col - d_col))
+        return res
+
+    def calculate_generation(self, _):
+        keys = list(self._chunks_to_calculate())
+        size = self.chunk_size
+        get_chunk = self.chunks.get
+        # Copy each chunk with a halo taken from the borders of its neighbors
+        padded = np.zeros((len(keys), size + 2, size + 2), dtype=np.uint8)
+        for n, (row, col) in enumerate(keys):
+            chunk = get_chunk((row, col))
+            if chunk is not None:
+                padded[n, 1:-1, 1:-1] = chunk
+            for (d_row, d_col), halo, edge in CHUNK_NEIGHBORS:
+                neighbor = get_chunk((row + d_row, col + d_col))
+                if neighbor is not None:
+                    padded[n][halo] = neighbor[edge]
+
+        # Calculate all the chunks at once with separable sums of the 3x3 neighborhoods
+        row_sums = padded[:, :, :-2] + padded[:, :, 1:-1] + padded[:, :, 2:]
+        sums = row_sums[:, :-2] + row_sums[:, 1:-1] + row_sums[:, 2:]
+        new_chunks = ((sums == 3) | ((sums == 4) & (padded[:, 1:-1, 1:-1] == 1))).astype(np.uint8)
+        alive = new_chunks.any(axis=(1, 2))
+        self.chunks = {key: new_chunks[n].copy() for n, key in enumerate(keys) if alive[n]}
+
+        self.project(self.universe.cells)
+
+    def project(self, out):
+        """Writes the window of the universe to a matrix of cells."""
+        out[:] = 0
+        size = self.chunk_size
+        h, w = out.shape
+        for (row, col), chunk in self.chunks.items():
+            y, x = row * size, col * size
+            if y >= h or x >= w or y + size <= 0 or x + size <= 0:
+                continue
+            y0, x0 = max(y, 0), max(x, 0)
+            y1, x1 = min(y + size, h), min(x + size, w)
+            out[y0:y1, x0:x1] = chunk[y0 - y:y1 - y, x0 - x:x1 - x]
@@ -0,0 +1,443 @@
+"""Module cluster."""
+__author__ = 'Joan A. Pinol  (japinol)'
+
+import math
+from collections import OrderedDict
+import multiprocessing as mp
+from multiprocessing.connection import Client, Listener, wait
+import os
+import selectors
+import socket
+import time
+
+import numpy as np
+
+from life.bit_packed import WORD_BITS, next_generation_words, pack, population, unpack, words_per_row
+from life.engines import EngineBase
+from life.settings import Settings
+
+HOST = '127.0.0.1'
+# Tiles with fewer rows or columns than this are not split between more workers
+TILE_SIZE_MIN = 16
+# Cells unpacked at once by a worker to calculate its part of a view of the universe
+VIEW_CELLS = 2 ** 24
+# Seconds to wait for a worker to stop before it is terminated
+JOIN_TIMEOUT = 5
+# Seconds to wait for the workers to connect and to get their tiles before the cluster gives up
+CONNECT_TIMEOUT = 120
+# Seconds between the checks that the workers are alive while waiting for them
+POLL_TIMEOUT = 0.5
+# Bytes that each worker sends to the socket of a neighbor to say which side of it is connected
+SIDE_WEST, SIDE_NORTH = b'W', b'N'
+
+
+class ClusterException(Exception):
+    pass
+
+
+def tile_grid(size, workers):
+    """Returns the number of rows and columns of tiles that a universe is split into
+    for a number of workers, as close to square tiles as the number of workers allows.
+    """
+    workers = max(1, min(workers, (size.h // TILE_SIZE_MIN) * (size.w // TILE_SIZE_MIN)))
+    best = None
+    for tiles_y in range(1, workers + 1):
+        if workers % tiles_y:
+            continue
+        tiles_x = workers // tiles_y
+        if tiles_y > max(size.h // TILE_SIZE_MIN, 1) or tiles_x > max(size.w // TILE_SIZE_MIN, 1):
+            continue
+        # How far the tiles are from being square
+        ratio = abs(math.log((size.h / tiles_y) / (size.w / tiles_x)))
+        if best is None or ratio < best[0]:
+            best = (ratio, tiles_y, tiles_x)
+    return (best[1], best[2]) if best else (1, 1)
+
+
+def tile_limits(length, tiles):
+    """Splits a length in tiles and returns the first and the last position (not included) of each one."""
+    limits = np.linspace(0, length, tiles + 1).astype(int)
+    return [(int(start), int(end)) for start, end in zip(limits[:-1], limits[1:])]
+
+
+def _receive_exactly(sock, n):
+    data = bytearray()
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("A neighbor closed its connection")
+        data += chunk
+    return bytes(data)
+
+
+def _exchange(links, sends, sizes):
+    """Sends some bytes to each socket of a list of links and receives a given number of bytes from each one.
+    The sockets are non-blocking while the halos are exchanged, so two neighbors that send to each other
+    at the same time do not block each other, whatever the size of the buffers of the sockets.
+    """
+    received = [bytearray() for _ in links]
+    pending = [memoryview(data) for data in sends]
+    with selectors.DefaultSelector() as selector:
+        for i, sock in enumerate(links):
+            selector.register(sock, selectors.EVENT_READ | selectors.EVENT_WRITE, i)
+        remaining = len(links)
+        while remaining:
+            for key, events in selector.select():
+                i = key.data
+                sock = links[i]
+                if events & selectors.EVENT_WRITE and pending[i]:
+                    pending[i] = pending[i][sock.send(pending[i]):]
+                if events & selectors.EVENT_READ and len(received[i]) < sizes[i]:
+                    chunk = sock.recv(sizes[i] - len(received[i]))
+                    if not chunk:
+                        raise ConnectionError("A neighbor closed its connection")
+                    received[i] += chunk
+                if not pending[i] and len(received[i]) == sizes[i]:
+                    selector.unregister(sock)
+                    remaining -= 1
+                elif not pending[i]:
+                    selector.modify(sock, selectors.EVENT_READ, i)
+    return received
+
+
+class _Tile:
+    """The rectangle of a universe owned by a worker, as packed rows with a halo row above and below.
+    Each row also has a halo column on each side, which are the first and the last bit of the row.
+    """
+
+    def __init__(self, y0, y1, x0, x1, size, toroidal):
+        self.y0, self.y1, self.x0, self.x1 = y0, y1, x0, x1
+        self.h, self.w = y1 - y0, x1 - x0
+        self.width = self.w + 2
+        self.words = np.zeros((self.h + 2, words_per_row(self.width)), dtype=np.uint64)
+        inner = np.zeros((1, self.width), dtype=np.uint8)
+        inner[0, 1:-1] = 1
+        self._inner_mask = pack(inner)
+        self._frozen_mask = None
+        if not toroidal:
+            # The cells on the border of a flat universe do not change
+            frozen = np.zeros((self.h, self.width), dtype=np.uint8)
+            y0 == 0 and frozen[0, 1:-1].fill(1)
+            y1 == size.h and frozen[-1, 1:-1].fill(1)
+            x0 == 0 and frozen[:, 1].fill(1)
+            x1 == size.w and frozen[:, -2].fill(1)
+            self._frozen_mask = pack(frozen) if frozen.any() else None
+        self.links = {}
+        # Whether the cells have changed since they were last sent to the coordinator
+        self.changed = True
+
+    def load(self, cells):
+        padded = np.zeros((self.h, self.width), dtype=np.uint8)
+        padded[:, 1:-1] = cells
+        self.words[1:-1] = pack(padded)
+        self.changed = True
+
+    def population(self):
+        return population(self.words[1:-1])
+
+    def _column(self, x):
+        word, bit = divmod(x, WORD_BITS)
+        return ((self.words[1:-1, word] >> np.uint64(bit)) & np.uint64(1)).astype(np.uint8)
+
+    def _set_column(self, x, column):
+        word, bit = divmod(x, WORD_BITS)
+        words = self.words[1:-1, word]
+        words &= ~np.uint64(1 << bit)
+        words |= column.astype(np.uint64) << np.uint64(bit)
+
+    def exchange_halos(self):
+        """Exchanges the edges of the tile with its neighbors in two phases: first the columns
+        with the west and east neighbors, and then the rows, halo columns included,
+        with the north and south ones, so the cells of the corners also reach the diagonal neighbors.
+        The sides without a neighbor, which are the borders of a flat universe, get dead cells.
+        """
+        for sides, edges in ((('west', 'east'), (1, self.w)), (('north', 'south'), (1, self.h))):
+            links = [side for side in sides if side in self.links]
+            if sides[0] == 'west':
+                sends = [np.packbits(self._column(edges[sides.index(side)])).tobytes() for side in links]
+                size = len(sends[0]) if sends else 0
+            else:
+                sends = [self.words[edges[sides.index(side)]].tobytes() for side in links]
+                size = self.words.shape[1] * self.words.itemsize
+            received = dict(zip(links, _exchange([self.links[side] for side in links], sends, [size] * len(links))))
+            for side, halo in zip(sides, (0, edges[1] + 1)):
+                data = received.get(side)
+                if sides[0] == 'west':
+                    column = (np.unpackbits(np.frombuffer(data, dtype=np.uint8), count=self.h)
+                              if data is not None else np.zeros(self.h, dtype=np.uint8))
+                    self._set_column(halo, column)
+                else:
+                    self.words[halo] = np.frombuffer(data, dtype=np.uint64) if data is not None else 0
+
+    def calculate_generation(self):
+        self.exchange_halos()
+        words_new = next_generation_words(self.words, self.width, False)
+        words_new &= self._inner_mask
+        if self._frozen_mask is not None:
+            cells = self.words[1:-1]
+            words_new = (words_new & ~self._frozen_mask) | (cells & self._frozen_mask)
+        self.changed = self.changed or not np.array_equal(words_new, self.words[1:-1])
+        self.words[1:-1] = words_new
+
+    def cells(self):
+        """Returns the packed rows of the tile, halo columns included,
+        or None if they have not changed since they were last asked for.
+        """
+        if not self.changed:
+            return None
+        self.changed = False
+        return self.words[1:-1].copy()
+
+    def view(self, factor):
+        """Returns the first block of a view of the universe downsampled by a factor that this tile
+        has cells of, and the blocks of the tile, packed in bits. A block is alive if any of its cells is.
+        The tile can have part of the blocks of its edges, so the views of the tiles are joined with an or.
+        """
+        block_y0, block_y1 = self.y0 // factor, (self.y1 - 1) // factor + 1
+        block_x0, block_x1 = self.x0 // factor, (self.x1 - 1) // factor + 1
+        col_starts = [max(x * factor, self.x0) - self.x0 for x in range(block_x0, block_x1)]
+        blocks = np.zeros((block_y1 - block_y0, block_x1 - block_x0), dtype=np.uint8)
+        # The packed rows of each row of blocks are joined with an or before they are unpacked,
+        # which is done by groups of rows of blocks, so they take a bounded memory
+        row_starts = [max(y * factor, self.y0) - self.y0 for y in range(block_y0, block_y1)]
+        rows = np.bitwise_or.reduceat(self.words[1:-1], row_starts, axis=0)
+        block_rows = max(1, VIEW_CELLS // self.width)
+        for block_from in range(0, len(rows), block_rows):
+            cells = unpack(rows[block_from:block_from + block_rows], self.width)[:, 1:-1]
+            blocks[block_from:block_from + block_rows] = np.logical_or.reduceat(cells, col_starts, axis=1)
+        return block_y0, block_x0, blocks.shape, np.packbits(blocks, axis=1)
+
+
+def _tile_worker(address, authkey):
+    """Calculates a tile of the universe in a worker process, as the coordinator asks for it.
+    The worker listens for the connections of its west and north neighbors, and it connects
+    to its east and south neighbors, so there is a socket for each side that has a neighbor.
+    """
+    coordinator = Client(address, authkey=authkey)
+    server = socket.create_server((HOST, 0))
+    coordinator.send(('port', server.getsockname()[1]))
+    tile = None
+    try:
+        while True:
+            message = coordinator.recv()
+            command = message[0]
+            if command == 'tile':
+                _, limits, size, toroidal, neighbor_ports, sides_accepted = message
+                tile = _Tile(*limits, size, toroidal)
+                for side, port in neighbor_ports.items():
+                    sock = socket.create_connection((HOST, port))
+                    sock.sendall(SIDE_WEST if side == 'east' else SIDE_NORTH)
+                    tile.links[side] = sock
+                for _ in range(sides_accepted):
+                    sock, _ = server.accept()
+                    tile.links['west' if _receive_exactly(sock, 1) == SIDE_WEST else 'north'] = sock
+                for sock in tile.links.values():
+                    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                    sock.setblocking(False)
+                coordinator.send(('ready',))
+            elif command == 'load':
+                tile.load(unpack(message[1], tile.w))
+                coordinator.send(('population', tile.population()))
+            elif command == 'step':
+                for _ in range(message[1]):
+                    tile.calculate_generation()
+                coordinator.send(('population', tile.population()))
+            elif command == 'view':
+                coordinator.send(('view', tile.view(message[1])))
+            elif command == 'cells':
+                coordinator.send(('cells', tile.cells()))
+            elif command == 'close':
+                break
+    finally:
+        for sock in tile.links.values() if tile else ():
+            sock.close()
+        server.close()
+        coordinator.close()
+
+
+class TileCluster:
+    """Calculates generations of a universe split in rectangular tiles,
+    each one owned by a worker process. The coordinator and the workers
+    talk over TCP on localhost, so the workers could run on other hosts.
+    Each generation, the workers exchange the edges of their tiles
+    with their neighbors, packed in bits, straight through their sockets,
+    and they calculate their tiles with the same logic of full adders as the bit
+    packed engine. The coordinator only sends commands and gets back
+    the population of each tile, and the cells of a view of the universe,
+    downsampled by a factor, when they are asked for.
+    It uses the rule B3/S23 and the toroidal or the flat topology. In a flat universe,
+    the cells on the border do not change, the same way as the non toroidal fast calculation does.
+    """
+
+    def __init__(self, size, toroidal=False, workers=None):
+        self.size = size
+        self.toroidal = toroidal
+        self.generation = 1
+        self.tiles_shape = tile_grid(size, workers or Settings.workers or os.cpu_count() or 1)
+        rows, cols = tile_limits(size.h, self.tiles_shape[0]), tile_limits(size.w, self.tiles_shape[1])
+        self.tiles = [(y0, y1, x0, x1) for y0, y1 in rows for x0, x1 in cols]
+        self._populations = [0] * len(self.tiles)
+        authkey = os.urandom(16)
+        self._listener = Listener((HOST, 0), backlog=len(self.tiles), authkey=authkey)
+        self._connections = []
+        self._processes = []
+        ctx = mp.get_context('spawn')
+        for _ in self.tiles:
+            process = ctx.Process(target=_tile_worker, daemon=True,
+                                  args=(self._listener.address, authkey))
+            process.start()
+            self._processes.append(process)
+        try:
+            self._connect_workers()
+        except Exception:
+            self.close()
+            raise
+
+    def _connect_workers(self):
+        deadline = time.monotonic() + CONNECT_TIMEOUT
+        # The socket of the listener, to know when a worker is connecting without blocking on accept
+        listener_socket = self._listener._listener._socket
+        ports = []
+        for _ in self.tiles:
+            self._wait_workers(lambda: wait([listener_socket], POLL_TIMEOUT), deadline)
+            connection = self._listener.accept()
+            self._connections.append(connection)
+            self._wait_workers(lambda: connection.poll(POLL_TIMEOUT), deadline)
+            ports.append(connection.recv()[1])
+        tiles_y, tiles_x = self.tiles_shape
+        for i, connection in enumerate(self._connections):
+            tile_y, tile_x = divmod(i, tiles_x)
+            neighbor_ports = {}
+            if self.toroidal or tile_x < tiles_x - 1:
+                neighbor_ports['east'] = ports[tile_y * tiles_x + (tile_x + 1) % tiles_x]
+            if self.toroidal or tile_y < tiles_y - 1:
+                neighbor_ports['south'] = ports[(tile_y + 1) % tiles_y * tiles_x + tile_x]
+            sides_accepted = (self.toroidal or tile_x > 0) + (self.toroidal or tile_y > 0)
+            connection.send(('tile', self.tiles[i], self.size, self.toroidal, neighbor_ports, int(sides_accepted)))
+        for connection in self._connections:
+            self._wait_workers(lambda: connection.poll(POLL_TIMEOUT), deadline)
+            connection.recv()
+
+    def _wait_workers(self, ready, deadline):
+        """Waits until ready() is true, polling it, so a worker that stops or hangs
+        while connecting raises an exception instead of blocking the coordinator forever.
+        """
+        while not ready():
+            stopped = [process for process in self._processes if not process.is_alive()]
+            if stopped:
+                raise ClusterException(f"A worker stopped with exit code {stopped[0].exitcode} while connecting")
+            if time.monotonic() > deadline:
+                raise ClusterException(f"The workers did not connect in {CONNECT_TIMEOUT} seconds")
+
+    def close(self):
+        """Stops the workers. The cluster cannot be used after that."""
+        for connection in self._connections:
+            try:
+                connection.send(('close',))
+            except OSError:
+                pass
+        for process in self._processes:
+            process.join(JOIN_TIMEOUT)
+            process.is_alive() and process.terminate()
+        for connection in self._connections:
+            connection.close()
+        self._connections, self._processes = [], []
+        self._listener.close()
+
+    def _ask_all(self, messages):
+        """Sends a message to each worker and returns their answers, so all the workers work at once."""
+        for connection, message in zip(self._connections, messages):
+            connection.send(message)
+        return [connection.recv()[1] for connection in self._connections]
+
+    def load(self, cells):
+        """Loads the cells of the whole universe from a matrix."""
+        self._populations = self._ask_all([('load', pack(cells[y0:y1, x0:x1])) for y0, y1, x0, x1 in self.tiles])
+
+    def load_random(self, density=0.5, seed=None):
+        """Loads cells alive with a given probability on the whole universe."""
+        rng = np.random.default_rng(seed)
+        self.load((rng.random((self.size.h, self.size.w)) < density).astype(np.uint8))
+
+    def population(self):
+        """Returns the number of cells alive, as reported by the workers."""
+        return sum(self._populations)
+
+    def extinct(self):
+        """Checks if there are no cells alive."""
+        return self.population() == 0
+
+    def view(self, factor=1, out=None):
+        """Returns the cells of the universe downsampled by a factor: each cell
+        of the view is alive if any cell of its block of factor x factor cells is.
+        """
+        view_shape = (-(-self.size.h // factor), -(-self.size.w // factor))
+        res = out if out is not None else np.zeros(view_shape, dtype=np.uint8)
+        res.fill(0)
+        for block_y0, block_x0, (h, w), blocks in self._ask_all([('view', factor)] * len(self.tiles)):
+            res[block_y0:block_y0 + h, block_x0:block_x0 + w] |= np.unpackbits(blocks, axis=1, count=w)
+        return res
+
+    def gather(self, cells):
+        """Writes on a matrix of the whole universe the cells of the tiles that have changed
+        since the last time they were gathered or loaded, so only those tiles are sent by the workers.
+        The matrix must keep the cells of the last gather, or the ones loaded.
+        """
+        for (y0, y1, x0, x1), words in zip(self.tiles, self._ask_all([('cells',)] * len(self.tiles))):
+            if words is not None:
+                cells[y0:y1, x0:x1] = unpack(words, x1 - x0 + 2)[:, 1:-1]
+
+    def stats(self):
+        """Returns statistics of the universe and its population."""
+        res = OrderedDict()
+        res['generation'] = self.generation
+        res['size'] = f'{self.size.w}x{self.size.h}'
+        res['tiles'] = f'{self.tiles_shape[1]}x{self.tiles_shape[0]}'
+        res['cells alive'] = self.population()
+        return res
+
+    def calculate_generation(self):
+        self.calculate_generations(1)
+
+    def calculate_generations(self, n):
+        self._populations = self._ask_all([('step', n)] * len(self.tiles))
+        self.generation += n
+
+
+class ClusterEngine(EngineBase):
+    """Calculates generations with a cluster of worker processes,
+    each one owning a tile of the universe, which exchange the edges
+    of their tiles over TCP on localhost. The cells of the universe
+    are only gathered from the workers when the board is rendered,
+    which is once per step of several generations when the universe renders
+    every some generations, and only the tiles that changed are sent.
+    It uses the toroidal or the flat topology according to settings.
+    In a flat universe, the cells on the border do not change, the same way
+    as the non toroidal fast calculation does.
+    """
+    name = 'cluster'
+
+    def __init__(self, universe, workers=None):
+        super().__init__(universe)
+        self.cluster = TileCluster(universe.size_u, toroidal=Settings.toroidal_universe, workers=workers)
+
+    def load(self, cells):
+        self.cluster.load(cells)
+
+    def close(self):
+        self.cluster.close()
+
+    def population(self):
+        return self.cluster.population()
+
+    def stats(self):
+        res = super().stats()
+        res['tiles'] = f'{self.cluster.tiles_shape[1]}x{self.cluster.tiles_shape[0]}'
+        return res
+
+    def calculate_generation(self, cells_old):
+        self.calculate_generations(cells_old, 1)
+
+    def calculate_generations(self, cells_old, n):
+        self.cluster.calculate_generations(n)
+        self.cluster.gather(self.universe.cells)
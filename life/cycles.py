@@ -0,0 +1,98 @@
+"""Module cycles."""
+__author__ = 'Joan A. Pinol  (japinol)'
+
+from collections import OrderedDict
+
+import numpy as np
+
+CYCLE_HISTORY_DEFAULT = 4096
+
+
+class CycleDetector:
+    """Detects when a universe dies out, becomes a still life or repeats
+    a cycle of generations.
+    Each state of the universe has a hash, which is the xor of a random key
+    for each cell alive, so it is updated from the cells born and dead only.
+    The hashes of the last generations are kept in a bounded history,
+    and a cycle is found when the hash of a generation is already in it.
+    Once a cycle is found, the universe cannot leave it, so it is not
+    updated anymore until the detector is reset.
+    The ages of the cells can still grow during the first generations of the cycle,
+    so the universe keeps the board of a generation of the cycle in the detector
+    to find when the ages repeat too.
+    """
+
+    def __init__(self, universe, history_size=CYCLE_HISTORY_DEFAULT):
+        self.universe = universe
+        self.history_size = history_size
+        rng = np.random.default_rng()
+        self._keys = rng.integers(1, 2 ** 64, size=universe.cells.shape, dtype=np.uint64, endpoint=False)
+        self._history = OrderedDict()
+        self.hash = 0
+        self.period = 0
+        self.generation_found = 0
+        self.population = 0
+        self.generations_skipped = 0
+        # Generation, ages and total ages of the cells on the board, and statistics
+        # of the universe at a generation of the cycle
+        self.board = None
+
+    def reset(self, cells, generation):
+        """Starts to detect cycles from a new state of the universe."""
+        self.hash = int(np.bitwise_xor.reduce(self._keys[cells != 0]))
+        self._history.clear()
+        self._history[self.hash] = generation
+        self.period = 0
+        self.generation_found = 0
+        self.board = None
+
+    def update(self, cells_old, cells, generation, changed=None):
+        """Updates the hash with the cells born and dead from the old generation
+        and checks if the new one is already in the history.
+        The cells that changed can be given, so they are not searched for.
+        """
+        if self.period:
+            return
+        if changed is None:
+            changed = cells_old != cells
+        keys = self._keys[changed]
+        if keys.size:
+            self.hash ^= int(np.bitwise_xor.reduce(keys))
+
+        generation_seen = self._history.get(self.hash)
+        if generation_seen is not None:
+            self.period = generation - generation_seen
+            self.generation_found = generation
+            self.population = int(np.count_nonzero(cells))
+            return
+        self._history[self.hash] = generation
+        if len(self._history) > self.history_size:
+            self._history.popitem(last=False)
+
+    def generations_to_skip(self, generation, target, generations_repeated=None):
+        """Returns the number of generations that can be skipped to get
+        from a generation to a target one, since they repeat the cycle.
+        They are skipped in whole repetitions of a number of generations, by default the period.
+        """
+        generations_repeated = generations_repeated or self.period
+        if not self.period or generation >= target:
+            return 0
+        return (target - generation) // generations_repeated * generations_repeated
+
+    def description(self):
+        if not self.period:
+            return ''
+        generation = self.generation_found - self.period
+        if not self.population:
+            return f'extinction from generation {generation}'
+        if self.period == 1:
+            return f'still life from generation {generation}'
+        return f'period {self.period} from generation {generation}'
+
+    def stats(self):
+        """Returns statistics of the cycle found, if any."""
+        res = OrderedDict()
+        if self.period:
+            res['cycle'] = self.description()
+            res['generations skipped'] = self.generations_skipped
+        return res
@@ -31,6 +31,7 @@ class DebugInfo(OutputFile):
                     ('screen size', self.game.size),
                     ('speed', Settings.fps),
                     ('toroidal universe', Settings.toroidal_universe),
+                    ('rule', str(Settings.rule)),
                     ('one color', Settings.cell_one_color),
                     ('cell size', Settings.cell_size),
                     ('dimensions', self.game.universe.size_u),
@@ -49,11 +50,14 @@ class DebugInfo(OutputFile):
                     ('screen size', self.game.size),
                     ('speed', Settings.fps),
                     ('toroidal universe', Settings.toroidal_universe),
+                    ('rule', str(Settings.rule)),
                     ('one color', Settings.cell_one_color),
                     ('cells_sprites', self.game.cells),
                     ('cells', self.game.universe.stats['cells_total']),
                     ('cell size', Settings.cell_size),
                     ('dimensions', self.game.universe.size_u),
+                    ('engine', self.game.universe.engine.info() if self.game.universe.engine
+                               else Settings.universe_calculation.name.lower()),
                     ('-----' * 3, ''),
                     ('universe', ''.join(['\n', self.game.universe.pprint_to_string()])),
                     ('generation', self.game.universe.generation),
@@ -0,0 +1,182 @@
+"""Module dimensions."""
+__author__ = 'Joan A. Pinol  (japinol)'
+
+import re
+
+import numpy as np
+
+from life.rules import RULES, RuleException
+
+# Default rules by number of dimensions
+DIMENSIONAL_RULES_DEFAULT = {
+    2: 'B3/S23',
+    3: '4555',
+    }
+# Cells of the universe whose next state is looked up at once, which bounds the memory of the indexes
+LOOKUP_SLAB_CELLS = 2 ** 20
+
+_RULE_BS_PATTERN = re.compile(r'^B([0-9,]*)/S([0-9,]*)$', re.IGNORECASE)
+# Bays notation: the lowest and highest number of neighbors to survive and to be born
+_RULE_BAYS_PATTERN = re.compile(r'^([0-9])([0-9])([0-9])([0-9])$')
+
+
+class DimensionalRule:
+    """Represents a rule of a life-like cellular automaton of any number of dimensions.
+    A dead cell is born if its number of neighbors is in born,
+    and a cell alive survives if its number of neighbors is in survive.
+    """
+
+    def __init__(self, born, survive):
+        self.born = frozenset(born)
+        self.survive = frozenset(survive)
+
+    @classmethod
+    def from_string(cls, rule):
+        """Returns the rule in Bays notation, such as 4555, where a cell survives
+        with 4 to 5 neighbors and it is born with 5 to 5, or in B/S notation,
+        such as B5/S45. The numbers of neighbors of the B/S notation can
+        be separated by commas, such as B5/S4,5,10.
+        The names of the rules of two dimensions are also accepted.
+        """
+        rule = str(rule).strip()
+        rule = RULES.get(rule.lower(), rule)
+        match = _RULE_BAYS_PATTERN.match(rule)
+        if match:
+            survive_min, survive_max, born_min, born_max = (int(n) for n in match.groups())
+            return cls(range(born_min, born_max + 1), range(survive_min, survive_max + 1))
+        match = _RULE_BS_PATTERN.match(rule)
+        if not match:
+            raise RuleException(f"Rule not valid: {rule}. Example: 4555 or B5/S4,5")
+        born, survive = (part.split(',') if ',' in part else list(part) for part in match.groups())
+        return cls((int(n) for n in born if n), (int(n) for n in survive if n))
+
+    def sums_table(self, n_dims):
+        """Returns the next state of the cells indexed by the sum of their neighborhood
+        plus the number of neighbors if they are alive, for a number of dimensions.
+        """
+        neighborhood_size = 3 ** n_dims
+        dead = np.zeros(neighborhood_size, dtype=np.uint8)
+        alive = np.zeros(neighborhood_size, dtype=np.uint8)
+        dead[[n for n in self.born if n < neighborhood_size]] = 1
+        alive[[n for n in self.survive if n < neighborhood_size]] = 1
+        return np.concatenate((dead, alive))
+
+    def __str__(self):
+        return 'B%s/S%s' % (','.join(str(n) for n in sorted(self.born)),
+                            ','.join(str(n) for n in sorted(self.survive)))
+
+
+def refresh_halo_toroidal_n_dims(padded):
+    """The universe wraps around in all the dimensions.
+    Each axis is copied on the full extent of the others, so the corners are also refreshed.
+    """
+    for axis in range(padded.ndim):
+        head, tail = [slice(None)] * padded.ndim, [slice(None)] * padded.ndim
+        head[axis], tail[axis] = 0, -2
+        padded[tuple(head)] = padded[tuple(tail)]
+        head[axis], tail[axis] = -1, 1
+        padded[tuple(head)] = padded[tuple(tail)]
+
+
+class DimensionalEngine:
+    """Calculates generations of a universe of any number of dimensions.
+    The sums of the 3x3x...x3 neighborhoods are separable, so they are calculated
+    adding three shifted views along each axis, one axis after another.
+    That is two additions per axis instead of one for each of the 3^n cells
+    of a neighborhood. It does not need pygame, so it is suited
+    for studies of universes of three or more dimensions.
+    It uses the toroidal or the flat topology. In a flat universe, the cells
+    on the border do not change, the same way as the non toroidal fast calculation does.
+    """
+
+    def __init__(self, cells, toroidal=False, rule=None):
+        self.toroidal = toroidal
+        self.n_dims = cells.ndim
+        if rule is None:
+            if self.n_dims not in DIMENSIONAL_RULES_DEFAULT:
+                raise RuleException(f"There is not a default rule for {self.n_dims} dimensions")
+            rule = DIMENSIONAL_RULES_DEFAULT[self.n_dims]
+        self.rule = rule if isinstance(rule, DimensionalRule) else DimensionalRule.from_string(rule)
+        self.generation = 1
+        self.shape = cells.shape
+        self._buffers = np.zeros((2,) + tuple(n + 2 for n in self.shape), dtype=np.uint8)
+        self._current = 0
+        self.load(cells)
+
+        neighborhood_size = 3 ** self.n_dims
+        self._sums_dtype = np.uint8 if 2 * neighborhood_size <= 256 else np.uint16
+        self._sums_table = self.rule.sums_table(self.n_dims)
+        self._alive_offset = neighborhood_size - 1
+        # Sums of each cell with its neighbors along the axes already added; each axis is two cells shorter
+        shape = [n if toroidal else n - 2 for n in self.shape]
+        self._axis_sums = []
+        for axis in range(self.n_dims):
+            sums_shape = shape[:axis + 1] + [n + 2 for n in shape[axis + 1:]]
+            self._axis_sums.append(np.zeros(sums_shape, dtype=self._sums_dtype))
+        # Offsets of the cells alive in a slab of the lookup of the rule
+        self._slab = max(1, LOOKUP_SLAB_CELLS // max(int(np.prod(shape[1:])), 1))
+        self._alive_offsets = np.zeros([min(self._slab, shape[0])] + shape[1:], dtype=self._sums_dtype)
+
+    @classmethod
+    def from_random(cls, shape, density=0.5, seed=None, toroidal=False, rule=None):
+        """Creates a universe of a given shape where each cell is alive with a given probability."""
+        rng = np.random.default_rng(seed)
+        return cls((rng.random(shape) < density).astype(np.uint8), toroidal=toroidal, rule=rule)
+
+    def load(self, cells):
+        """Loads the cells of the universe from an array of any number of dimensions."""
+        # The cells on the border of a flat universe never change, so they are copied to both buffers
+        self._buffers[(slice(None),) + self._inner(1)] = cells
+
+    def _inner(self, margin):
+        return (slice(margin, -margin),) * self.n_dims
+
+    @property
+    def cells(self):
+        """The cells of the universe. It must not be changed directly; use load instead."""
+        return self._buffers[(self._current,) + self._inner(1)]
+
+    def population(self):
+        """Returns the number of cells alive."""
+        return int(np.count_nonzero(self.cells))
+
+    def extinct(self):
+        """Checks if there are no cells alive."""
+        return not self.cells.any()
+
+    def calculate_generation(self):
+        padded, padded_new = self._buffers[self._current], self._buffers[1 - self._current]
+        if self.toroidal:
+            refresh_halo_toroidal_n_dims(padded)
+            cells, cells_new = padded, padded_new[self._inner(1)]
+        else:
+            cells, cells_new = padded[self._inner(1)], padded_new[self._inner(2)]
+
+        # Add the three cells along each axis, so after the last one each cell has its neighborhood sum
+        sums = cells
+        for axis, axis_sums in enumerate(self._axis_sums):
+            views = []
+            for start in range(3):
+                view = [slice(None)] * self.n_dims
+                view[axis] = slice(start, sums.shape[axis] - 2 + start)
+                views.append(sums[tuple(view)])
+            np.add(views[0], views[1], out=axis_sums, dtype=self._sums_dtype)
+            np.add(axis_sums, views[2], out=axis_sums)
+            sums = axis_sums
+
+        # The table of the rule is indexed by the sum of the neighborhood plus the number of neighbors if it is alive.
+        # It is looked up by slabs of the first axis, since a lookup creates an array of indexes
+        cells_old = cells[self._inner(1)]
+        for start in range(0, len(sums), self._slab):
+            sums_slab = sums[start:start + self._slab]
+            alive_offsets = self._alive_offsets[:len(sums_slab)]
+            np.multiply(cells_old[start:start + self._slab], self._alive_offset, out=alive_offsets)
+            np.add(sums_slab, alive_offsets, out=sums_slab)
+            np.take(self._sums_table, sums_slab, out=cells_new[start:start + self._slab], mode='clip')
+
+        self._current = 1 - self._current
+        self.generation += 1
+
+    def calculate_generations(self, n):
+        for _ in range(n):
+            self.calculate_generation()
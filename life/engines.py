@@ -0,0 +1,100 @@
+"""Module engines."""
+__author__ = 'Joan A. Pinol  (japinol)'
+
+from collections import OrderedDict
+
+import numpy as np
+
+
+class EngineBase:
+    """Represents a generation calculation engine of a universe.
+    It is not intended to be instantiated directly.
+    An engine calculates the next generation of the universe and writes it
+    to the matrix of cells of the universe, so the graphic representation
+    and the output of the universe keep working whatever the engine is.
+    """
+    name = None
+    # Generations calculated on each step of the universe
+    generations_per_step = 1
+    # Engines that swap the matrix of cells of the universe with their own buffers
+    # keep the old generation untouched, so the universe does not need to copy it
+    swaps_cells = False
+    # Engines of unbounded universes, whose state is not only the matrix of cells
+    unbounded = False
+    # Engines of cells of more than two states, such as continuous ones,
+    # whose matrix of cells only tells the cells alive
+    multi_state = False
+    # Engines that calculate each step in slices spread over several frames
+    time_sliced = False
+
+    def __init__(self, universe):
+        self.universe = universe
+
+    def load(self, cells):
+        """Loads the state of the engine from a matrix of cells.
+        It must be called when the matrix of cells of the universe has been
+        changed outside the engine. Engines without state do not need it.
+        """
+        pass
+
+    def set_cell(self, y, x, alive):
+        """Sets the state of a cell that has been changed in the matrix of cells
+        of the universe, such as by the user. By default, the whole matrix is loaded again,
+        so the engines whose state is not only the matrix must set the cell by themselves.
+        """
+        self.load(self.universe.cells)
+
+    def close(self):
+        """Frees the resources of the engine that are not freed by themselves,
+        such as processes or shared memory. The engine cannot be used after that.
+        """
+        pass
+
+    def population(self):
+        """Returns the number of cells alive."""
+        return int(np.count_nonzero(self.universe.cells))
+
+    def changed_cells(self):
+        """Returns the cells that changed in the last step of the universe
+        as a tuple of arrays of rows and columns, such as the one of np.nonzero,
+        or None if the engine does not keep a list of them.
+        """
+        return None
+
+    def cell_ages(self, ages_max):
+        """Returns the age shown for each cell of a multi-state engine,
+        from 0 for the dead cells up to ages_max.
+        """
+        raise NotImplementedError
+
+    def stats(self):
+        """Returns statistics of the engine to show with the ones of the universe."""
+        return OrderedDict()
+
+    def info(self):
+        """Returns information about the engine for debug purposes."""
+        res = OrderedDict([('name', self.name)])
+        res.update(self.stats())
+        return res
+
+    def calculate_slice(self, generations, seconds):
+        """Calculates part of the generations of the next step of a time sliced engine,
+        spending about a number of seconds. Returns True when the step is complete,
+        so the next call to calculate_generations only writes it to the universe.
+        """
+        raise NotImplementedError
+
+    def calculate_generation(self, cells_old):
+        """Calculates the next generation from the old matrix of cells
+        and writes it to the matrix of cells of the universe.
+        """
+        raise NotImplementedError
+
+    def calculate_generations(self, cells_old, n):
+        """Calculates n generations ahead from the old matrix of cells
+        and writes the last one to the matrix of cells of the universe.
+        """
+        cells = cells_old.copy()
+        for i in range(n):
+            i > 0 and np.copyto(cells, self.universe.cells)
+            self.calculate_generation(cells)
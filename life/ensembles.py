@@ -0,0 +1,119 @@
+"""Module ensembles."""
+__author__ = 'Joan A. Pinol  (japinol)'
+
+import numpy as np
+
+from life.halos import refresh_halo_toroidal
+from life.rules import Rule, RULE_DEFAULT
+from life.seeds import seeds
+from life.settings import Settings, STARTING_SEEDS_DEFAULT, UNIVERSE_SIZE_DEFAULT
+
+
+class EnsembleEngine:
+    """Calculates generations of many independent universes of the same size at once.
+    The universes are held in an array of shape (N, H, W), so each generation
+    is a single vectorized calculation of the neighborhoods for all of them,
+    with the same shifted views of the 3x3 neighborhoods that the fast engine uses
+    on the two last axes. It does not need pygame, so it is suited
+    for studies of many starting seeds.
+    It uses the toroidal or the flat topology. In a flat universe, the cells
+    on the border do not change, the same way as the non toroidal fast calculation does.
+    """
+
+    def __init__(self, cells, toroidal=False, rule=None):
+        self.toroidal = toroidal
+        self.rule = rule or Settings.rule or Rule.from_string(RULE_DEFAULT)
+        self.generation = 1
+        n, h, w = cells.shape
+        self._buffers = np.zeros((2, n, h + 2, w + 2), dtype=np.uint8)
+        self._current = 0
+        self.load(cells)
+        if not toroidal:
+            h, w = h - 2, w - 2
+        # Sums of each cell with its left and right neighbors, including the halo rows
+        self._row_sums = np.zeros((n, h + 2, w), dtype=np.uint8)
+        # Sums of the 3x3 neighborhood of each cell, including the cell itself
+        self._neighborhood_sums = np.zeros((n, h, w), dtype=np.uint8)
+        self._rule_indexes = np.zeros((n, h, w), dtype=np.uint8)
+        self._rule_shifted = np.zeros((n, h, w), dtype=np.uint32)
+
+    @classmethod
+    def from_starting_seeds(cls, starting_seeds_list, universe_size=None, toroidal=False, rule=None):
+        """Creates an ensemble with a universe for each string of starting seeds
+        in a list, such as: gosper_glider_gun 7 20, clock 75 100.
+        The universes with an empty string start with the default seeds.
+        """
+        universe_size = universe_size or Settings.universe_size or UNIVERSE_SIZE_DEFAULT
+        cells = np.zeros((len(starting_seeds_list), universe_size.h, universe_size.w), dtype=np.uint8)
+        for universe_cells, starting_seeds in zip(cells, starting_seeds_list):
+            if starting_seeds and starting_seeds.strip():
+                starting_seeds = Settings.validate_starting_seeds(starting_seeds, universe_size)
+            else:
+                starting_seeds = STARTING_SEEDS_DEFAULT
+            for seed, (x, y) in starting_seeds:
+                seed_array = np.array(seeds[seed])
+                universe_cells[x:x + seed_array.shape[0], y:y + seed_array.shape[1]] = seed_array
+        return cls(cells, toroidal=toroidal, rule=rule)
+
+    def load(self, cells):
+        """Loads the cells of all the universes from an array of shape (N, H, W)."""
+        # The cells on the border of a flat universe never change, so they are copied to both buffers
+        self._buffers[:, :, 1:-1, 1:-1] = cells
+        self._calculated = False
+
+    @property
+    def cells(self):
+        """The cells of all the universes, as an array of shape (N, H, W).
+        It must not be changed directly; use load instead.
+        """
+        return self._buffers[self._current, :, 1:-1, 1:-1]
+
+    def universe_cells(self, index):
+        """Returns a copy of the matrix of cells of a universe, as the one of Universe.cells."""
+        return self.cells[index].copy()
+
+    def population(self):
+        """Returns the number of cells alive of each universe."""
+        return np.count_nonzero(self.cells, axis=(1, 2))
+
+    def extinct(self):
+        """Returns which universes have no cells alive."""
+        return ~self.cells.any(axis=(1, 2))
+
+    def stabilized(self):
+        """Returns which universes did not change in the last generation, such as the still lifes
+        and the extinct ones. None of them did before a generation is calculated from the cells loaded.
+        """
+        if not self._calculated:
+            return np.zeros(len(self.cells), dtype=bool)
+        return (self.cells == self._buffers[1 - self._current, :, 1:-1, 1:-1]).all(axis=(1, 2))
+
+    def calculate_generation(self):
+        padded, padded_new = self._buffers[self._current], self._buffers[1 - self._current]
+        if self.toroidal:
+            refresh_halo_toroidal(padded)
+            cells, cells_new = padded, padded_new[:, 1:-1, 1:-1]
+        else:
+            cells, cells_new = padded[:, 1:-1, 1:-1], padded_new[:, 2:-2, 2:-2]
+
+        # The 3x3 sums are separable: first sum each row, then each column
+        row_sums = self._row_sums
+        np.add(cells[:, :, :-2], cells[:, :, 1:-1], out=row_sums)
+        np.add(row_sums, cells[:, :, 2:], out=row_sums)
+        sums = self._neighborhood_sums
+        np.add(row_sums[:, :-2], row_sums[:, 1:-1], out=sums)
+        np.add(sums, row_sums[:, 2:], out=sums)
+
+        # The table of the rule is indexed by the sum of the neighborhood plus 8 if the cell is alive
+        rule_indexes = self._rule_indexes
+        np.multiply(cells[:, 1:-1, 1:-1], 8, out=rule_indexes)
+        np.add(rule_indexes, sums, out=rule_indexes)
+        self.rule.apply_sums(rule_indexes, self._rule_shifted, out=cells_new)
+
+        self._current = 1 - self._current
+        self.generation += 1
+        self._calculated = True
+
+    def calculate_generations(self, n):
+        for _ in range(n):
+            self.calculate_generation()
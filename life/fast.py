@@ -0,0 +1,63 @@
+"""Module fast."""
+__author__ = 'Joan A. Pinol  (japinol)'
+
+import numpy as np
+
+from life.engines import EngineBase
+from life.settings import Settings
+
+
+class FastEngine(EngineBase):
+    """Calculates generations in a non-toroidal universe with two buffers
+    of cells: the current generation and the next one, which are swapped
+    by reference each generation. The matrix of cells of the universe is
+    always the buffer of the current generation, so the old generation
+    does not need to be copied.
+    The neighbors are counted in preallocated uint8 buffers, so no array
+    is created per generation.
+    The cells on the border do not change.
+    """
+    name = 'non_toroidal_fast'
+    swaps_cells = True
+
+    def __init__(self, universe):
+        super().__init__(universe)
+        self.rule = Settings.rule
+        h, w = universe.size_u.h, universe.size_u.w
+        self._buffers = np.zeros((2, h, w), dtype=np.uint8)
+        self._current = 0
+        # Sums of each cell with its left and right neighbors, including the border rows
+        self._row_sums = np.zeros((h, w - 2), dtype=np.uint8)
+        # Sums of the 3x3 neighborhood of each cell, including the cell itself
+        self._neighborhood_sums = np.zeros((h - 2, w - 2), dtype=np.uint8)
+        self._rule_indexes = np.zeros((h - 2, w - 2), dtype=np.uint8)
+        self._rule_shifted = np.zeros((h - 2, w - 2), dtype=np.uint32)
+
+    def load(self, cells):
+        # The border never changes, so it is copied to both buffers
+        self._buffers[:] = cells
+        self.universe.cells = self._buffers[self._current]
+
+    def calculate_generation(self, _):
+        cells, cells_new = self._buffers[self._current], self._buffers[1 - self._current]
+
+        # The 3x3 sums are separable: first sum each row, then each column
+        row_sums = self._row_sums
+        np.add(cells[:, :-2], cells[:, 1:-1], out=row_sums)
+        np.add(row_sums, cells[:, 2:], out=row_sums)
+        sums = self._neighborhood_sums
+        np.add(row_sums[:-2], row_sums[1:-1], out=sums)
+        np.add(sums, row_sums[2:], out=sums)
+
+        # The table of the rule is indexed by the sum of the neighborhood plus 8 if the cell is alive
+        rule_indexes = self._rule_indexes
+        np.multiply(cells[1:-1, 1:-1], 8, out=rule_indexes)
+        np.add(rule_indexes, sums, out=rule_indexes)
+        self.rule.apply_sums(rule_indexes, self._rule_shifted, out=cells_new[1:-1, 1:-1])
+
+        self._current = 1 - self._current
+        self.universe.cells = cells_new
+
+    def calculate_generations(self, cells_old, n):
+        for _ in range(n):
+            self.calculate_generation(cells_old)
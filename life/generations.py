@@ -0,0 +1,95 @@
+"""Module generations."""
+__author__ = 'Joan A. Pinol  (japinol)'
+
+import numpy as np
+
+from life.engines import EngineBase
+from life.halos import refresh_halo_toroidal
+from life.rules import GenerationsRule, NEIGHBORS_MAX
+from life.settings import Settings
+
+
+class GenerationsEngine(EngineBase):
+    """Calculates generations of the rules of the Generations family,
+    such as Brian's Brain or Star Wars, whose cells have dying states.
+    The states of the cells are kept in a uint8 matrix, which is updated
+    in place with a single gather from the table of the rule, indexed
+    by the state times 9 plus the number of neighbors alive. The dying
+    states advance with the same gather as the cells alive and dead.
+    The matrix of cells of the universe tells the cells alive, and the states
+    are shown with the colors of the ages of the cells.
+    The life-like rules are calculated as Generations rules of 2 states.
+    It uses the toroidal or the flat topology according to settings.
+    In a flat universe, the cells on the border do not change, the same way
+    as the non toroidal fast calculation does.
+    """
+    name = 'generations'
+    multi_state = True
+
+    def __init__(self, universe):
+        super().__init__(universe)
+        self.rule = GenerationsRule.from_rule(Settings.rule)
+        self.toroidal = Settings.toroidal_universe
+        h, w = universe.size_u.h, universe.size_u.w
+        self.state = np.zeros((h, w), dtype=np.uint8)
+        if self.toroidal:
+            self._padded = np.zeros((h + 2, w + 2), dtype=np.uint8)
+            self._padded_inner = self._padded[1:-1, 1:-1]
+        else:
+            h, w = h - 2, w - 2
+        # Sums of each cell with its left and right neighbors, including the halo rows
+        self._row_sums = np.zeros((h + 2, w), dtype=np.uint8)
+        self._sums = np.zeros((h, w), dtype=np.uint8)
+        self._indexes = np.zeros((h, w), dtype=np.uint16)
+        # Ages shown for each state by the largest age, which only change with the rule
+        self._ages_tables = {}
+
+    def load(self, cells):
+        # The cells that are still dying keep their state
+        self.state[cells != 0] = 1
+        self.state[(cells == 0) & (self.state == 1)] = 0
+
+    def cell_ages(self, ages_max):
+        """Returns the age shown for each cell: 1 for the cells alive and
+        the next ones for the dying states, or 0 if it is dead. If there
+        are more dying states than ages, they are spread over them.
+        """
+        ages_table = self._ages_tables.get(ages_max)
+        if ages_table is None:
+            states = np.arange(self.rule.states)
+            if self.rule.states - 1 > ages_max:
+                states[2:] = 1 + np.ceil((states[2:] - 1) * (ages_max - 1) / (self.rule.states - 2))
+            ages_table = self._ages_tables[ages_max] = states.astype(np.uint8)
+        return np.take(ages_table, self.state)
+
+    def stats(self):
+        res = super().stats()
+        res['rule'] = str(self.rule)
+        res['cells dying'] = int(np.count_nonzero(self.state > 1))
+        return res
+
+    def calculate_generation(self, cells_old):
+        if self.toroidal:
+            padded = self._padded
+            np.copyto(self._padded_inner, cells_old)
+            refresh_halo_toroidal(padded)
+            state, cells_new = self.state, self.universe.cells
+        else:
+            padded = cells_old
+            state, cells_new = self.state[1:-1, 1:-1], self.universe.cells[1:-1, 1:-1]
+
+        # The 3x3 sums are separable: first sum each row, then each column.
+        # Only the cells alive are in the matrix of cells, so only they are counted
+        row_sums, sums = self._row_sums, self._sums
+        np.add(padded[:, :-2], padded[:, 1:-1], out=row_sums)
+        np.add(row_sums, padded[:, 2:], out=row_sums)
+        np.add(row_sums[:-2], row_sums[1:-1], out=sums)
+        np.add(sums, row_sums[2:], out=sums)
+        np.subtract(sums, padded[1:-1, 1:-1], out=sums)
+
+        # The table of the rule is indexed by the state times 9 plus the number of neighbors alive
+        indexes = self._indexes
+        np.multiply(state, NEIGHBORS_MAX + 1, out=indexes, dtype=np.uint16)
+        np.add(indexes, sums, out=indexes)
+        np.take(self.rule.table, indexes, out=state, mode='clip')
+        np.equal(state, 1, out=cells_new, casting='unsafe')
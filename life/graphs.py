@@ -0,0 +1,275 @@
+"""Module graphs."""
+__author__ = 'Joan A. Pinol  (japinol)'
+
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+from life.dimensions import DimensionalRule
+from life.rules import Rule, RULE_DEFAULT
+from life.settings import Settings
+
+# Offsets of the neighbors of a cell of a hexagonal grid with odd rows shifted to the right, by row parity
+HEX_NEIGHBOR_OFFSETS = (
+    ((-1, -1), (-1, 0), (0, -1), (0, 1), (1, -1), (1, 0)),
+    ((-1, 0), (-1, 1), (0, -1), (0, 1), (1, 0), (1, 1)),
+    )
+MOORE_NEIGHBOR_OFFSETS = ((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1))
+GOLDEN_RATIO = (1 + math.sqrt(5)) / 2
+# Decimals of the coordinates of the vertices of a Penrose tiling that are compared to find shared ones
+PENROSE_DECIMALS = 6
+
+
+class GraphException(Exception):
+    pass
+
+
+class Graph:
+    """Represents an undirected graph whose nodes are the cells of a universe.
+    The adjacency is stored in compressed sparse row form: the neighbors of
+    the node i are indices[indptr[i]:indptr[i + 1]].
+    The nodes can have positions, which are only used to draw them.
+    """
+
+    def __init__(self, indptr, indices, positions=None):
+        self.indptr = indptr
+        self.indices = indices
+        self.positions = positions
+
+    @property
+    def nodes_no(self):
+        return len(self.indptr) - 1
+
+    @property
+    def edges_no(self):
+        return len(self.indices) // 2
+
+    def degrees(self):
+        """Returns the number of neighbors of each node."""
+        return np.diff(self.indptr)
+
+    @classmethod
+    def from_edges(cls, edges, nodes_no=None, positions=None):
+        """Creates a graph from pairs of nodes numbered from 0.
+        The edges are undirected, and the loops and repeated edges are left out.
+        """
+        edges = np.asarray(edges, dtype=np.intp).reshape(-1, 2)
+        if len(edges) and edges.min() < 0:
+            raise GraphException("The nodes of the edges must be numbered from 0")
+        nodes_no = nodes_no if nodes_no is not None else (int(edges.max()) + 1 if len(edges) else 0)
+        if len(edges) and edges.max() >= nodes_no:
+            raise GraphException(f"The nodes of the edges must be less than {nodes_no}")
+        edges = edges[edges[:, 0] != edges[:, 1]]
+        # Both directions of each edge, sorted by node and without repetitions
+        pairs = np.unique(np.concatenate((edges, edges[:, ::-1])), axis=0)
+        indptr = np.zeros(nodes_no + 1, dtype=np.intp)
+        np.cumsum(np.bincount(pairs[:, 0], minlength=nodes_no), out=indptr[1:])
+        return cls(indptr, np.ascontiguousarray(pairs[:, 1]), positions=positions)
+
+    @classmethod
+    def from_edge_list_file(cls, file_name):
+        """Creates a graph from a text file with an edge on each line,
+        as two numbers of nodes separated by blanks or a comma.
+        The empty lines and the ones that start with # are skipped.
+        """
+        edges = []
+        with open(file_name, 'r', encoding='utf-8') as file_in:
+            for line_no, line in enumerate(file_in, start=1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                try:
+                    node_from, node_to = (int(node) for node in line.replace(',', ' ').split()[:2])
+                except ValueError:
+                    raise GraphException(f"Edge not valid in line {line_no} of {file_name}: {line}")
+                edges.append((node_from, node_to))
+        return cls.from_edges(edges)
+
+    @classmethod
+    def _grid(cls, size, neighbor_offsets, toroidal):
+        """Creates a graph of a grid given the offsets of the neighbors of its cells by row parity.
+        The node of the cell in the row y and the column x is y * size.w + x.
+        """
+        ys, xs = np.divmod(np.arange(size.w * size.h), size.w)
+        edges = []
+        for parity in (0, 1):
+            rows = ys % 2 == parity
+            for dy, dx in neighbor_offsets[parity]:
+                ys_to, xs_to = ys[rows] + dy, xs[rows] + dx
+                if toroidal:
+                    ys_to, xs_to, inside = ys_to % size.h, xs_to % size.w, slice(None)
+                else:
+                    inside = (ys_to >= 0) & (ys_to < size.h) & (xs_to >= 0) & (xs_to < size.w)
+                nodes_from = (ys[rows] * size.w + xs[rows])[inside]
+                edges.append(np.stack((nodes_from, (ys_to * size.w + xs_to)[inside]), axis=1))
+        return cls.from_edges(np.concatenate(edges), nodes_no=size.w * size.h)
+
+    @classmethod
+    def square_grid(cls, size, toroidal=False):
+        """Creates a graph of a rectangular grid where each cell has the 8 neighbors
+        of the Moore neighborhood, as the universes of the GUI.
+        """
+        graph = cls._grid(size, (MOORE_NEIGHBOR_OFFSETS,) * 2, toroidal)
+        ys, xs = np.divmod(np.arange(size.w * size.h), size.w)
+        graph.positions = np.stack((xs, ys), axis=1).astype(float)
+        return graph
+
+    @classmethod
+    def hex_grid(cls, size, toroidal=False):
+        """Creates a graph of a hexagonal grid where each cell has 6 neighbors.
+        The odd rows are shifted half a cell to the right. A toroidal grid
+        needs an even number of rows, so the rows keep alternating when they wrap around.
+        """
+        if toroidal and size.h % 2:
+            raise GraphException("A toroidal hexagonal grid needs an even number of rows")
+        graph = cls._grid(size, HEX_NEIGHBOR_OFFSETS, toroidal)
+        ys, xs = np.divmod(np.arange(size.w * size.h), size.w)
+        graph.positions = np.stack((xs + (ys % 2) / 2, ys * math.sqrt(3) / 2), axis=1)
+        return graph
+
+    @classmethod
+    def penrose(cls, subdivisions=5):
+        """Creates a graph of a Penrose tiling of rhombs, where the neighbors
+        of a rhomb are the ones that share a side or a vertex with it.
+        The tiling starts as a wheel of 10 Robinson triangles, which are
+        subdivided a number of times; then each pair of triangles that share
+        their base is a rhomb.
+        """
+        triangles = []
+        for i in range(10):
+            b = complex(math.cos((2 * i - 1) * math.pi / 10), math.sin((2 * i - 1) * math.pi / 10))
+            c = complex(math.cos((2 * i + 1) * math.pi / 10), math.sin((2 * i + 1) * math.pi / 10))
+            if i % 2 == 0:
+                b, c = c, b
+            triangles.append((0, 0j, b, c))
+        for _ in range(subdivisions):
+            triangles = cls._subdivide_penrose_triangles(triangles)
+
+        # The triangles that share their base are the two halves of a rhomb
+        tiles = OrderedDict()
+        for color, a, b, c in triangles:
+            base = tuple(sorted(((round(p.real, PENROSE_DECIMALS), round(p.imag, PENROSE_DECIMALS)) for p in (b, c))))
+            tiles.setdefault((color, base), []).extend((a, b, c))
+
+        # The rhombs that share a vertex are neighbors
+        tiles_by_vertex = {}
+        positions = []
+        for tile, (_, vertices) in enumerate(tiles.items()):
+            positions.append((np.mean([v.real for v in vertices]), np.mean([v.imag for v in vertices])))
+            for vertex in {(round(v.real, PENROSE_DECIMALS), round(v.imag, PENROSE_DECIMALS)) for v in vertices}:
+                tiles_by_vertex.setdefault(vertex, []).append(tile)
+        edges = [(tile_from, tile_to) for vertex_tiles in tiles_by_vertex.values()
+                 for tile_from in vertex_tiles for tile_to in vertex_tiles if tile_from < tile_to]
+        return cls.from_edges(edges, nodes_no=len(tiles), positions=np.array(positions))
+
+    @staticmethod
+    def _subdivide_penrose_triangles(triangles):
+        res = []
+        for color, a, b, c in triangles:
+            if color == 0:
+                p = a + (b - a) / GOLDEN_RATIO
+                res += [(0, c, p, b), (1, p, c, a)]
+            else:
+                q = b + (a - b) / GOLDEN_RATIO
+                r = b + (c - b) / GOLDEN_RATIO
+                res += [(1, r, c, a), (1, q, r, b), (0, r, q, a)]
+        return res
+
+
+class GraphEngine:
+    """Calculates generations of a life-like rule on the nodes of a graph,
+    such as a hexagonal grid, a Penrose tiling or a network.
+    The neighbors alive of all the nodes are counted at once with a product
+    of the sparse adjacency matrix of the graph by the vector of cells:
+    the cells of the neighbors are gathered and added by node.
+    The rule is given by its numbers of neighbors to be born and to survive,
+    as a rule or a string, so the rules of more than 8 neighbors can be used
+    with the notation with commas of the dimensional rules, such as B3/S2,3,10.
+    It does not need pygame, so it is suited for studies of irregular topologies.
+    """
+
+    def __init__(self, graph, rule=None, cells=None):
+        self.graph = graph
+        if isinstance(rule, str):
+            rule = DimensionalRule.from_string(rule) if ',' in rule else Rule.from_string(rule)
+        self.rule = rule or Settings.rule or Rule.from_string(RULE_DEFAULT)
+        self.generation = 1
+        nodes_no = graph.nodes_no
+        degree_max = int(graph.degrees().max()) if nodes_no else 0
+        # Next state indexed by the number of neighbors plus degree_max + 1 if the cell is alive
+        self._alive_offset = degree_max + 1
+        dead = np.zeros(self._alive_offset, dtype=np.uint8)
+        alive = np.zeros(self._alive_offset, dtype=np.uint8)
+        dead[[n for n in self.rule.born if n <= degree_max]] = 1
+        alive[[n for n in self.rule.survive if n <= degree_max]] = 1
+        self._sums_table = np.concatenate((dead, alive))
+
+        self._buffers = np.zeros((2, nodes_no), dtype=np.uint8)
+        self._current = 0
+        # Cells of the neighbors of each node, with a last 0 for the nodes without neighbors at the end
+        self._gathered = np.zeros(len(graph.indices) + 1, dtype=np.uint8)
+        self._row_starts = graph.indptr[:-1]
+        self._isolated = np.flatnonzero(graph.degrees() == 0)
+        self._counts = np.zeros(nodes_no, dtype=np.intp)
+        self._alive_offsets = np.zeros(nodes_no, dtype=np.intp)
+        cells is not None and self.load(cells)
+
+    def load(self, cells):
+        """Loads the cells of all the nodes from a vector."""
+        self._buffers[self._current] = cells
+
+    @property
+    def cells(self):
+        """The cells of the nodes. It must not be changed directly; use load instead."""
+        return self._buffers[self._current]
+
+    def load_random(self, density=0.5, seed=None):
+        """Loads cells alive with a given probability on all the nodes."""
+        rng = np.random.default_rng(seed)
+        self.load(rng.random(self.graph.nodes_no) < density)
+
+    def population(self):
+        """Returns the number of cells alive."""
+        return int(np.count_nonzero(self.cells))
+
+    def extinct(self):
+        """Checks if there are no cells alive."""
+        return not self.cells.any()
+
+    def stats(self):
+        """Returns statistics of the graph and its population."""
+        res = OrderedDict()
+        res['generation'] = self.generation
+        res['nodes'] = self.graph.nodes_no
+        res['edges'] = self.graph.edges_no
+        res['rule'] = str(self.rule)
+        res['cells alive'] = self.population()
+        res['density'] = round(self.population() / max(self.graph.nodes_no, 1), 4)
+        return res
+
+    def neighbors_alive(self):
+        """Returns the number of neighbors alive of each node, which is the product
+        of the adjacency matrix by the vector of cells.
+        """
+        counts = self._counts
+        if not len(counts):
+            return counts
+        np.take(self.cells, self.graph.indices, out=self._gathered[:-1])
+        np.add.reduceat(self._gathered, self._row_starts, out=counts, dtype=np.intp)
+        # The sum of a node without neighbors is the first cell of the next one
+        counts[self._isolated] = 0
+        return counts
+
+    def calculate_generation(self):
+        counts = self.neighbors_alive()
+        cells, cells_new = self._buffers[self._current], self._buffers[1 - self._current]
+        np.multiply(cells, self._alive_offset, out=self._alive_offsets, dtype=np.intp)
+        np.add(counts, self._alive_offsets, out=counts)
+        np.take(self._sums_table, counts, out=cells_new, mode='clip')
+        self._current = 1 - self._current
+        self.generation += 1
+
+    def calculate_generations(self, n):
+        for _ in range(n):
+            self.calculate_generation()
@@ -0,0 +1,105 @@
+"""Module halos."""
+__author__ = 'Joan A. Pinol  (japinol)'
+
+import numpy as np
+
+from life.engines import EngineBase
+from life.settings import Settings, UniverseCalculationType
+
+
+def refresh_halo_dead(padded):
+    """The cells outside the universe are always dead.
+    The halo is zeroed when the buffer is allocated and never written again.
+    """
+    pass
+
+
+def refresh_halo_toroidal(padded):
+    """The universe wraps around in both directions.
+    The halo functions work on the two last axes, so they also refresh
+    a stack of padded universes at once.
+    """
+    padded[..., 0, 1:-1] = padded[..., -2, 1:-1]
+    padded[..., -1, 1:-1] = padded[..., 1, 1:-1]
+    # Columns are copied on the full height, so the corners are also refreshed
+    padded[..., 0] = padded[..., -2]
+    padded[..., -1] = padded[..., 1]
+
+
+def refresh_wide_halo_toroidal(padded, width):
+    """Refreshes a halo of a given width around a toroidal universe."""
+    padded[:width, width:-width] = padded[-2 * width:-width, width:-width]
+    padded[-width:, width:-width] = padded[width:2 * width, width:-width]
+    # Columns are copied on the full height, so the corners are also refreshed
+    padded[:, :width] = padded[:, -2 * width:-width]
+    padded[:, -width:] = padded[:, width:2 * width]
+
+
+def refresh_halo_reflective(padded):
+    """The cells on the edges of the universe are mirrored outside of it."""
+    padded[..., 0, 1:-1] = padded[..., 1, 1:-1]
+    padded[..., -1, 1:-1] = padded[..., -2, 1:-1]
+    padded[..., 0] = padded[..., 1]
+    padded[..., -1] = padded[..., -2]
+
+
+def refresh_halo_klein_bottle(padded):
+    """The universe wraps around horizontally as a toroidal one,
+    but it wraps around vertically flipping the rows from left to right.
+    """
+    padded[..., 0, 1:-1] = padded[..., -2, -2:0:-1]
+    padded[..., -1, 1:-1] = padded[..., 1, -2:0:-1]
+    padded[..., 0] = padded[..., -2]
+    padded[..., -1] = padded[..., 1]
+
+
+HALO_REFRESH_FUNCTIONS = {
+    UniverseCalculationType.TOROIDAL_FAST: refresh_halo_toroidal,
+    UniverseCalculationType.DEAD_BORDER_FAST: refresh_halo_dead,
+    UniverseCalculationType.REFLECTIVE_FAST: refresh_halo_reflective,
+    UniverseCalculationType.KLEIN_BOTTLE_FAST: refresh_halo_klein_bottle,
+}
+
+
+class HaloEngine(EngineBase):
+    """Calculates generations on a padded buffer with a halo of ghost cells.
+    The halo rows and columns are refreshed each generation according to
+    the topology of the universe, so the neighbors of every cell can be
+    counted with a few vectorized additions over shifted views.
+    The rule is applied with a lookup by the sum of each neighborhood.
+    All the buffers are preallocated, so no array is created per generation.
+    """
+
+    def __init__(self, universe, universe_calculation):
+        super().__init__(universe)
+        self.name = universe_calculation.name.lower()
+        self._refresh_halo = HALO_REFRESH_FUNCTIONS[universe_calculation]
+        self.rule = Settings.rule
+        h, w = universe.size_u.h, universe.size_u.w
+        self._padded = np.zeros((h + 2, w + 2), dtype=np.uint8)
+        self._padded_inner = self._padded[1:-1, 1:-1]
+        # Sums of each cell with its left and right neighbors, including the halo rows
+        self._row_sums = np.zeros((h + 2, w), dtype=np.uint8)
+        # Sums of the 3x3 neighborhood of each cell, including the cell itself
+        self._neighborhood_sums = np.zeros((h, w), dtype=np.uint8)
+        self._rule_indexes = np.zeros((h, w), dtype=np.uint8)
+        self._rule_shifted = np.zeros((h, w), dtype=np.uint32)
+
+    def calculate_generation(self, cells_old):
+        padded = self._padded
+        np.copyto(self._padded_inner, cells_old)
+        self._refresh_halo(padded)
+
+        # The 3x3 sums are separable: first sum each row, then each column
+        row_sums = self._row_sums
+        np.add(padded[:, :-2], padded[:, 1:-1], out=row_sums)
+        np.add(row_sums, padded[:, 2:], out=row_sums)
+        sums = self._neighborhood_sums
+        np.add(row_sums[:-2], row_sums[1:-1], out=sums)
+        np.add(sums, row_sums[2:], out=sums)
+
+        # The table of the rule is indexed by the sum of the neighborhood plus 8 if the cell is alive
+        rule_indexes = self._rule_indexes
+        np.multiply(cells_old, 8, out=rule_indexes)
+        np.add(rule_indexes, sums, out=rule_indexes)
+        self.rule.apply_sums(rule_indexes, self._rule_shifted, out=self.universe.cells)
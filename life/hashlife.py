@@ -0,0 +1,285 @@
+"""Module hashlife."""
+__author__ = 'Joan A. Pinol  (japinol)'
+
+from collections import OrderedDict
+import sys
+
+import numpy as np
+
+from life.engines import EngineBase
+from life.settings import Settings
+
+
+class Node:
+    """Represents a node of a quadtree of cells.
+    A node of level k represents a square of 2**k x 2**k cells.
+    The nodes are canonical: they are only created by HashLifeEngine.join,
+    so two nodes with the same children are always the same object.
+    """
+    __slots__ = ('nw', 'ne', 'sw', 'se', 'level', 'population')
+
+    def __init__(self, nw, ne, sw, se, level, population):
+        self.nw = nw
+        self.ne = ne
+        self.sw = sw
+        self.se = se
+        self.level = level
+        self.population = population
+
+
+DEAD = Node(None, None, None, None, level=0, population=0)
+ALIVE = Node(None, None, None, None, level=0, population=1)
+
+
+class HashLifeEngine(EngineBase):
+    """Calculates generations with the HashLife algorithm.
+    The universe is a memoized quadtree of canonical nodes, so repeated
+    patterns in space and time are only calculated once, and it can jump
+    2**k generations in a single step.
+    This universe is unbounded. The matrix of cells of the universe is
+    a window on it with its top left corner at the origin, so the cells
+    alive outside the window keep evolving even if they are not shown.
+    """
+    name = 'hashlife'
+    unbounded = True
+
+    def __init__(self, universe):
+        super().__init__(universe)
+        self.generations_per_step = 2 ** Settings.hashlife_jump
+        self.cache_size = Settings.hashlife_cache_size
+        self.root = None
+        # Coordinates of the center of the root node, which never moves
+        self._center = 0
+        self._nodes = {}
+        self._results = OrderedDict()
+        self._zeros = [DEAD]
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_evictions = 0
+
+    def join(self, nw, ne, sw, se):
+        """Returns the canonical node with these four children."""
+        key = nw, ne, sw, se
+        node = self._nodes.get(key)
+        if node is None:
+            node = Node(nw, ne, sw, se, level=nw.level + 1,
+                        population=nw.population + ne.population + sw.population + se.population)
+            self._nodes[key] = node
+        return node
+
+    def zero(self, level):
+        """Returns the canonical empty node of a given level."""
+        while len(self._zeros) <= level:
+            z = self._zeros[-1]
+            self._zeros.append(self.join(z, z, z, z))
+        return self._zeros[level]
+
+    def centre(self, node):
+        """Returns a node of the next level with the given node in its center."""
+        z = self.zero(node.level - 1)
+        return self.join(self.join(z, z, z, node.nw), self.join(z, z, node.ne, z),
+                         self.join(z, node.sw, z, z), self.join(node.se, z, z, z))
+
+    def _life_4x4(self, node):
+        """Returns the 2x2 center of a 4x4 node after one generation."""
+        cells = [[0] * 4 for _ in range(4)]
+        for y0, x0, quadrant in ((0, 0, node.nw), (0, 2, node.ne), (2, 0, node.sw), (2, 2, node.se)):
+            cells[y0][x0] = quadrant.nw.population
+            cells[y0][x0 + 1] = quadrant.ne.population
+            cells[y0 + 1][x0] = quadrant.sw.population
+            cells[y0 + 1][x0 + 1] = quadrant.se.population
+
+        res = []
+        for y, x in ((1, 1), (1, 2), (2, 1), (2, 2)):
+            neighbors_no = sum(cells[y + i][x + j] for i in (-1, 0, 1) for j in (-1, 0, 1)) - cells[y][x]
+            if neighbors_no == 3 or (neighbors_no == 2 and cells[y][x]):
+                res.append(ALIVE)
+            else:
+                res.append(DEAD)
+        return self.join(*res)
+
+    def successor(self, node, j):
+        """Returns the center of a node after 2**j generations.
+        The node must be of level j + 2 or higher, and the result is
+        a node of the previous level.
+        """
+        if node.population == 0:
+            return self.zero(node.level - 1)
+
+        key = node, j
+        res = self._results.get(key)
+        if res is not None:
+            self.cache_hits += 1
+            self._results.move_to_end(key)
+            return res
+        self.cache_misses += 1
+
+        if node.level == 2:
+            res = self._life_4x4(node)
+        else:
+            nw, ne, sw, se = node.nw, node.ne, node.sw, node.se
+            join = self.join
+            # The sub nodes can advance half of the generations at most
+            j_sub = min(j, node.level - 3)
+            # Nine overlapping sub nodes of the previous level, advanced in time
+            c1 = self.successor(nw, j_sub)
+            c2 = self.successor(join(nw.ne, ne.nw, nw.se, ne.sw), j_sub)
+            c3 = self.successor(ne, j_sub)
+            c4 = self.successor(join(nw.sw, nw.se, sw.nw, sw.ne), j_sub)
+            c5 = self.successor(join(nw.se, ne.sw, sw.ne, se.nw), j_sub)
+            c6 = self.successor(join(ne.sw, ne.se, se.nw, se.ne), j_sub)
+            c7 = self.successor(sw, j_sub)
+            c8 = self.successor(join(sw.ne, se.nw, sw.se, se.sw), j_sub)
+            c9 = self.successor(se, j_sub)
+
+            if j < node.level - 2:
+                # The generations are already calculated, so just take the centers
+                res = join(join(c1.se, c2.sw, c4.ne, c5.nw),
+                           join(c2.se, c3.sw, c5.ne, c6.nw),
+                           join(c4.se, c5.sw, c7.ne, c8.nw),
+                           join(c5.se, c6.sw, c8.ne, c9.nw))
+            else:
+                # Advance the generations for a second time
+                res = join(self.successor(join(c1, c2, c4, c5), j_sub),
+                           self.successor(join(c2, c3, c5, c6), j_sub),
+                           self.successor(join(c4, c5, c7, c8), j_sub),
+                           self.successor(join(c5, c6, c8, c9), j_sub))
+
+        self._results[key] = res
+        if len(self._results) > self.cache_size:
+            self._results.popitem(last=False)
+            self.cache_evictions += 1
+        return res
+
+    def _is_padded(self, node):
+        """Checks if all the cells alive are in the central quarter of the node."""
+        return node.population == (node.nw.se.se.population + node.ne.sw.sw.population
+                                   + node.sw.ne.ne.population + node.se.nw.nw.population)
+
+    def jump(self, k):
+        """Advances the universe 2**k generations."""
+        while self.root.level < k + 3 or not self._is_padded(self.root):
+            self.root = self.centre(self.root)
+        self.root = self.successor(self.root, k)
+        if len(self._nodes) > self.cache_size * 4:
+            self._collect()
+
+    def advance(self, generations):
+        """Advances the universe any number of generations, jumping by powers of two."""
+        k = 0
+        while generations:
+            if generations & 1:
+                self.jump(k)
+            generations >>= 1
+            k += 1
+
+    def _collect(self):
+        """Frees the nodes not used by the current universe.
+        The cached results refer to old nodes, so they are also freed.
+        """
+        self._results.clear()
+        nodes = {}
+        pending = [self.root] + self._zeros[1:]
+        while pending:
+            node = pending.pop()
+            key = node.nw, node.ne, node.sw, node.se
+            if node.level == 0 or key in nodes:
+                continue
+            nodes[key] = node
+            pending.extend(key)
+        self._nodes = nodes
+
+    def memory_info(self):
+        """Returns the size of the caches and an estimation of the memory they use."""
+        node_size = sys.getsizeof(DEAD) + sys.getsizeof((DEAD,) * 4)
+        memory = (sys.getsizeof(self._nodes) + sys.getsizeof(self._results)
+                  + len(self._nodes) * node_size + len(self._results) * sys.getsizeof((DEAD, 0)))
+        return OrderedDict([
+                    ('nodes', len(self._nodes)),
+                    ('results', len(self._results)),
+                    ('cache size', self.cache_size),
+                    ('cache hits', self.cache_hits),
+                    ('cache misses', self.cache_misses),
+                    ('cache evictions', self.cache_evictions),
+                    ('memory bytes', memory),
+        ])
+
+    def info(self):
+        res = super().info()
+        res['population'] = self.root.population if self.root else 0
+        res['root level'] = self.root.level if self.root else 0
+        res.update(self.memory_info())
+        return res
+
+    def _from_array(self, cells, level):
+        if level == 0:
+            return ALIVE if cells[0, 0] else DEAD
+        if not cells.any():
+            return self.zero(level)
+        half = 1 << (level - 1)
+        return self.join(self._from_array(cells[:half, :half], level - 1),
+                         self._from_array(cells[:half, half:], level - 1),
+                         self._from_array(cells[half:, :half], level - 1),
+                         self._from_array(cells[half:, half:], level - 1))
+
+    def _to_array(self, node, x, y, out):
+        """Writes the cells alive of a node with its top left corner at x, y
+        to the part of the matrix that overlaps with it.
+        """
+        size = 1 << node.level
+        if (node.population == 0 or x >= out.shape[1] or y >= out.shape[0]
+                or x + size <= 0 or y + size <= 0):
+            return
+        if node.level == 0:
+            out[y, x] = 1
+            return
+        half = size >> 1
+        self._to_array(node.nw, x, y, out)
+        self._to_array(node.ne, x + half, y, out)
+        self._to_array(node.sw, x, y + half, out)
+        self._to_array(node.se, x + half, y + half, out)
+
+    def load(self, cells):
+        """Loads the universe from a matrix of cells.
+        The cells alive outside the window of the matrix are discarded.
+        """
+        level = max(3, int(np.ceil(np.log2(max(cells.shape)))))
+        square = np.zeros((1 << level, 1 << level), dtype=np.uint8)
+        square[:cells.shape[0], :cells.shape[1]] = cells
+        self.root = self._from_array(square, level)
+        self._center = 1 << (level - 1)
+
+    def set_cell(self, y, x, alive):
+        """Sets a cell of the window, rebuilding only the nodes from the root to its leaf,
+        so the cells alive outside the window are kept.
+        """
+        while True:
+            corner = self._center - (1 << (self.root.level - 1))
+            size = 1 << self.root.level
+            if corner <= y < corner + size and corner <= x < corner + size:
+                break
+            self.root = self.centre(self.root)
+        self.root = self._set_cell(self.root, y - corner, x - corner, alive)
+
+    def _set_cell(self, node, y, x, alive):
+        """Returns a node with the cell at y, x from its top left corner set."""
+        if node.level == 0:
+            return ALIVE if alive else DEAD
+        half = 1 << (node.level - 1)
+        quadrants = [node.nw, node.ne, node.sw, node.se]
+        quadrant = 2 * (y >= half) + (x >= half)
+        quadrants[quadrant] = self._set_cell(quadrants[quadrant], y % half, x % half, alive)
+        return self.join(*quadrants)
+
+    def project(self, out):
+        """Writes the window of the universe to a matrix of cells."""
+        out[:] = 0
+        corner = self._center - (1 << (self.root.level - 1))
+        self._to_array(self.root, corner, corner, out)
+
+    def calculate_generations(self, cells_old, n):
+        self.advance(n)
+        self.project(self.universe.cells)
+
+    def calculate_generation(self, cells_old):
+        self.calculate_generations(cells_old, 1)
@@ -0,0 +1,75 @@
+"""Module larger."""
+__author__ = 'Joan A. Pinol  (japinol)'
+
+import numpy as np
+
+from life.engines import EngineBase
+from life.halos import refresh_wide_halo_toroidal
+from life.rules import LargerThanLifeRule
+from life.settings import Settings, SettingsException
+
+
+class LargerThanLifeEngine(EngineBase):
+    """Calculates generations of Larger than Life rules, whose neighborhoods
+    are squares of any radius, such as Bosco's Rule, of radius 5.
+    The count of each neighborhood comes from a summed-area table of the universe,
+    which is calculated once per generation. Then each count only needs
+    four of its values, whatever the radius is.
+    The life-like rules are calculated as Larger than Life rules of radius 1.
+    It uses the toroidal or the flat topology according to settings.
+    In a flat universe, the cells on the border do not change, the same way
+    as the non toroidal fast calculation does, and the cells out of it are dead.
+    """
+    name = 'larger_than_life'
+
+    def __init__(self, universe):
+        super().__init__(universe)
+        self.rule = Settings.rule
+        self.ltl_rule = LargerThanLifeRule.from_rule(self.rule)
+        self.toroidal = Settings.toroidal_universe
+        h, w = universe.size_u.h, universe.size_u.w
+        r = self.radius = self.ltl_rule.radius
+        if self.toroidal and (r > h or r > w):
+            raise SettingsException(f"The radius of the rule {self.rule} must not be greater than "
+                                    f"the size of a toroidal universe")
+        # The universe with a halo as wide as the radius
+        self._padded = np.zeros((h + 2 * r, w + 2 * r), dtype=np.uint8)
+        self._padded_inner = self._padded[r:r + h, r:r + w]
+        # Summed-area table of the padded universe, with a first row and column of zeros
+        self._sums = np.zeros((h + 2 * r + 1, w + 2 * r + 1), dtype=np.intp)
+        # Counts of the neighborhoods, which become the indexes of the table of the rule
+        self._counts = np.zeros((h, w), dtype=np.intp)
+        self._alive_offsets = np.zeros((h, w), dtype=np.intp)
+        self._cells_new = np.zeros((h, w), dtype=np.uint8)
+
+    def stats(self):
+        res = super().stats()
+        res['rule'] = str(self.rule)
+        return res
+
+    def calculate_generation(self, cells_old):
+        np.copyto(self._padded_inner, cells_old)
+        self.toroidal and refresh_wide_halo_toroidal(self._padded, self.radius)
+
+        # Each value of the summed-area table is the sum of the cells above and to the left of it
+        sums = self._sums[1:, 1:]
+        np.cumsum(self._padded, axis=0, out=sums)
+        np.cumsum(sums, axis=1, out=sums)
+
+        # The count of a square is the sum of its bottom right corner and its top left one
+        # minus the other two corners
+        size = 2 * self.radius + 1
+        sums, counts = self._sums, self._counts
+        np.subtract(sums[size:, size:], sums[:-size, size:], out=counts)
+        np.subtract(counts, sums[size:, :-size], out=counts)
+        np.add(counts, sums[:-size, :-size], out=counts)
+        self.ltl_rule.middle or np.subtract(counts, cells_old, out=counts)
+
+        # The table of the rule is indexed by the count plus count_max + 1 if the cell is alive
+        np.multiply(cells_old, self.ltl_rule.count_max + 1, out=self._alive_offsets, dtype=np.intp)
+        np.add(counts, self._alive_offsets, out=counts)
+        np.take(self.ltl_rule.sums_table, counts, out=self._cells_new, mode='clip')
+        if self.toroidal:
+            np.copyto(self.universe.cells, self._cells_new)
+        else:
+            self.universe.cells[1:-1, 1:-1] = self._cells_new[1:-1, 1:-1]
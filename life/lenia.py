@@ -0,0 +1,106 @@
+"""Module lenia."""
+__author__ = 'Joan A. Pinol  (japinol)'
+
+from collections import OrderedDict
+
+import numpy as np
+
+from life.engines import EngineBase
+from life.rules import LeniaRule
+from life.settings import Settings, SettingsException
+
+# The cells whose state is below this value are shown as dead
+STATE_ALIVE_MIN = 0.05
+
+KERNEL_SPECTRA_CACHE_SIZE = 16
+# Spectra of the kernels by rule and shape of the universe, so they are only calculated once
+_kernel_spectra = OrderedDict()
+
+
+def kernel_spectrum(rule, shape):
+    """Returns the Fourier transform of the kernel of a rule, centered
+    on the first cell of an array of a given shape, so multiplying it by
+    the transform of the universe convolves the universe with the kernel.
+    """
+    key = (rule, shape)
+    spectrum = _kernel_spectra.get(key)
+    if spectrum is None:
+        kernel = rule.kernel()
+        radius_y, radius_x = kernel.shape[0] // 2, kernel.shape[1] // 2
+        kernel_padded = np.zeros(shape, dtype=np.float32)
+        kernel_padded[:kernel.shape[0], :kernel.shape[1]] = kernel
+        kernel_padded = np.roll(kernel_padded, (-radius_y, -radius_x), axis=(0, 1))
+        spectrum = np.fft.rfft2(kernel_padded)
+        _kernel_spectra[key] = spectrum
+        if len(_kernel_spectra) > KERNEL_SPECTRA_CACHE_SIZE:
+            _kernel_spectra.popitem(last=False)
+    return spectrum
+
+
+class LeniaEngine(EngineBase):
+    """Calculates generations of Lenia, a continuous cellular automaton.
+    The state of each cell is a float32 value between 0 and 1.
+    The weighted sums of the neighborhoods are the convolution of the universe
+    with the kernel of the rule, which is calculated as a product of their
+    Fourier transforms, so it does not depend on the size of the kernel.
+    The transform of the kernel is cached for each shape of the universe.
+    The matrix of cells of the universe tells the cells alive, and the states
+    are shown with the colors of the ages of the cells.
+    It uses the toroidal or the flat topology according to settings.
+    In a flat universe, the cells out of it are always 0.
+    """
+    name = 'lenia'
+    multi_state = True
+
+    def __init__(self, universe):
+        super().__init__(universe)
+        self.rule = Settings.rule if isinstance(Settings.rule, LeniaRule) else LeniaRule()
+        self.toroidal = Settings.toroidal_universe
+        self.h, self.w = universe.size_u.h, universe.size_u.w
+        kernel_h, kernel_w = self.rule.kernel().shape
+        if self.toroidal and (kernel_h > self.h or kernel_w > self.w):
+            raise SettingsException(f"The kernel of the rule {self.rule} must not be greater than "
+                                    f"the size of a toroidal universe")
+        # A flat universe is padded with zeros, so the convolution does not wrap around it
+        self._margin = (0, 0) if self.toroidal else (kernel_h // 2, kernel_w // 2)
+        self.shape = (self.h + 2 * self._margin[0], self.w + 2 * self._margin[1])
+        self._spectrum = kernel_spectrum(self.rule, self.shape)
+        self._state_padded = np.zeros(self.shape, dtype=np.float32)
+        self.state = self._state_padded[self._margin[0]:self._margin[0] + self.h,
+                                        self._margin[1]:self._margin[1] + self.w]
+        self._state_spectrum = np.zeros(self._spectrum.shape, dtype=self._spectrum.dtype)
+        self._potential = np.zeros(self.shape, dtype=np.float32)
+
+    def load(self, cells):
+        # The cells that are still alive keep their state, and the new ones are fully alive
+        self.state[cells == 0] = 0
+        self.state[(cells != 0) & (self.state < STATE_ALIVE_MIN)] = 1
+
+    def population(self):
+        return int(np.count_nonzero(self.state >= STATE_ALIVE_MIN))
+
+    def cell_ages(self, ages_max):
+        """Returns the age shown for each cell, which maps its state
+        onto the ages from 1 to ages_max, or 0 if it is dead.
+        """
+        ages = np.ceil(self.state * ages_max).astype(np.uint8)
+        ages[self.state < STATE_ALIVE_MIN] = 0
+        return ages
+
+    def stats(self):
+        res = super().stats()
+        res['rule'] = str(self.rule)
+        res['mass'] = round(float(self.state.sum(dtype=np.float64)), 4)
+        return res
+
+    def calculate_generation(self, _):
+        np.fft.rfft2(self._state_padded, out=self._state_spectrum)
+        np.multiply(self._state_spectrum, self._spectrum, out=self._state_spectrum)
+        # The inverse transform is done one axis after the other, since irfft2 does not write to out correctly
+        np.fft.ifft(self._state_spectrum, axis=0, out=self._state_spectrum)
+        np.fft.irfft(self._state_spectrum, n=self.shape[1], axis=1, out=self._potential)
+        potential = self._potential[self._margin[0]:self._margin[0] + self.h,
+                                    self._margin[1]:self._margin[1] + self.w]
+        self.state += np.float32(self.rule.dt) * self.rule.growth(potential)
+        np.clip(self.state, 0, 1, out=self.state)
+        np.greater_equal(self.state, STATE_ALIVE_MIN, out=self.universe.cells, casting='unsafe')
@@ -14,7 +14,12 @@ from life.debug_info import DebugInfo
 from life.help_info import HelpInfo
 from life import lib_graphics_jp as libg_jp
 from life.output_info import OutputInfo
-from life.settings import Settings, NextGenerationType, UniverseCalculationType
+from life.settings import (
+    Settings,
+    NextGenerationType,
+    UniverseCalculationType,
+    UNIVERSE_CALCULATION_TOROIDAL,
+    )
 from life.resources import Resource
 from life import screens
 from life.universes import Universe
@@ -40,9 +45,13 @@ class Game:
 
     def __init__(self, screen_width=None, screen_height=None,
                  full_screen=None, cell_size=None,
-                 toroidal_universe=False, empty_universe=None,
+                 toroidal_universe=False, universe_calculation=None, rule=None,
+                 hashlife_jump=None, hashlife_cache_size=None,
+                 workers=None, block_tile_size=None, block_generations=None,
+                 render_every=None, frame_budget=None, cycle_detection=False,
+                 empty_universe=None,
                  cell_one_color=False, edit_not_allowed=False,
-                 start_immediately=False, starting_seeds=None,
+                 start_immediately=False, starting_seeds=None, starting_cells=None,
                  stop_after_generation=None,
                  save_to_out_file=False,
                  out_file=None, log_file=None,
@@ -94,10 +103,21 @@ class Game:
                                         cell_size=cell_size,
                                         empty_universe=empty_universe,
                                         toroidal_universe=toroidal_universe,
+                                        universe_calculation=universe_calculation,
+                                        rule=rule,
+                                        hashlife_jump=hashlife_jump,
+                                        hashlife_cache_size=hashlife_cache_size,
+                                        workers=workers,
+                                        block_tile_size=block_tile_size,
+                                        block_generations=block_generations,
+                                        render_every=render_every,
+                                        frame_budget=frame_budget,
+                                        cycle_detection=cycle_detection,
                                         cell_one_color=cell_one_color,
                                         edit_not_allowed=edit_not_allowed,
                                         start_immediately=start_immediately,
                                         starting_seeds=starting_seeds,
+                                        starting_cells=starting_cells,
                                         stop_after_generation=stop_after_generation,
                                         out_file=out_file,
                                         save_to_out_file=save_to_out_file,
@@ -312,12 +332,12 @@ class Game:
                             self.done = True
                     elif event.key == pg.K_t:
                         if not Settings.auto_play:
-                            if Settings.toroidal_universe:
-                                Settings.toroidal_universe = False
-                                Settings.universe_calculation = UniverseCalculationType.TOROIDAL_LOOP
-                            else:
-                                Settings.toroidal_universe = True
-                                Settings.universe_calculation = UniverseCalculationType.NON_TOROIDAL_FAST
+                            Settings.toroidal_universe = not Settings.toroidal_universe
+                            # Calculation types with their own topology are switched to the fast ones
+                            if Settings.universe_calculation in UNIVERSE_CALCULATION_TOROIDAL:
+                                Settings.universe_calculation = (
+                                    UniverseCalculationType.TOROIDAL_FAST if Settings.toroidal_universe
+                                    else UniverseCalculationType.NON_TOROIDAL_FAST)
                             self.universe.set_universe_calculate_generation()
                     elif event.key == pg.K_j:
                         if not Settings.auto_play:
@@ -365,3 +385,4 @@ class Game:
         # Actions to take immediately before exiting the game
         self.debug_info.write_buffer_before_exit()
         self.output_info.write_buffer_before_exit()
+        self.universe.engine and self.universe.engine.close()
@@ -0,0 +1,220 @@
+"""Module out_of_core."""
+__author__ = 'Joan A. Pinol  (japinol)'
+
+import os
+from collections import OrderedDict
+
+import numpy as np
+
+from life.bit_packed import WORD_BITS, WORD_DTYPE, next_generation_words, pack, population, unpack, words_per_row
+
+# Files of the two generations of a universe, the current one and the next one, which swap their roles
+GENERATION_FILE_NAMES = ('generation_0.life', 'generation_1.life')
+FILE_MAGIC = b'LIFEBITS'
+# Header of each file, which is followed by the packed rows of its generation
+HEADER_DTYPE = np.dtype([('magic', 'S8'), ('width', '<u8'), ('height', '<u8'), ('toroidal', '<u8'),
+                         ('generation', '<u8'), ('population', '<u8')])
+HEADER_BYTES = 64
+# Bytes of the packed rows of a band, which bound the memory used besides the page cache of the files
+BAND_BYTES = 2 ** 24
+# Bytes of the random numbers used at once to fill the universe with random cells
+RANDOM_BYTES = 2 ** 26
+
+
+class OutOfCoreException(Exception):
+    pass
+
+
+class OutOfCoreUniverse:
+    """Calculates generations of universes larger than the memory, such as
+    one of 200000x200000 cells, which takes 5 GB per generation packed in bits.
+    The current and the next generations are kept in two files mapped
+    in memory with numpy.memmap, as rows packed into uint64 words.
+    Each generation is calculated by bands of rows, each one with a halo row
+    above and below, with the same logic of full adders as the bit packed engine.
+    The bands are read and written in order, so the page cache of the operating
+    system streams the files from and to disk, and only a band is in memory at once.
+    The population is counted while the bands are written, so the statistics
+    do not read the whole universe again.
+    Each file has a header with the size of the universe, its generation and
+    its population, so the files are also checkpoints: a universe opened again
+    goes on from the last generation that was fully written.
+    It uses the rule B3/S23 and the toroidal or the flat topology. In a flat universe,
+    the cells on the border do not change, the same way as the non toroidal fast calculation does.
+    It does not need pygame, so it is suited for studies of huge universes.
+    """
+
+    def __init__(self, path, band_rows=None):
+        self.path = path = os.path.expanduser(path)
+        headers = [self._open_header(os.path.join(path, file_name)) for file_name in GENERATION_FILE_NAMES]
+        # The current generation is the last one that was fully written
+        self._current = int(headers[1]['generation'][0] > headers[0]['generation'][0])
+        header = headers[self._current][0]
+        self.width, self.height = int(header['width']), int(header['height'])
+        self.toroidal = bool(header['toroidal'])
+        self.generation = int(header['generation'])
+        self._population = int(header['population'])
+        self.n_words = words_per_row(self.width)
+        self._headers = headers
+        self._words = [np.memmap(os.path.join(path, file_name), dtype=WORD_DTYPE, mode='r+',
+                                 offset=HEADER_BYTES, shape=(self.height, self.n_words))
+                       for file_name in GENERATION_FILE_NAMES]
+        self.band_rows = min(band_rows or max(1, BAND_BYTES // (self.n_words * WORD_DTYPE.itemsize)), self.height)
+        # Rows of a band with a halo row above and below
+        self._padded = np.zeros((self.band_rows + 2, self.n_words), dtype=WORD_DTYPE)
+        self._column_mask = None
+        if not self.toroidal:
+            border = np.zeros((1, self.width), dtype=np.uint8)
+            border[0, [0, -1]] = 1
+            self._column_mask = pack(border)
+
+    @staticmethod
+    def _open_header(file_name):
+        if not os.path.isfile(file_name):
+            raise OutOfCoreException(f"File of a generation not found: {file_name}")
+        header = np.memmap(file_name, dtype=HEADER_DTYPE, mode='r+', shape=(1,))
+        if header['magic'][0] != FILE_MAGIC:
+            raise OutOfCoreException(f"File of a generation not valid: {file_name}")
+        return header
+
+    @classmethod
+    def create(cls, path, size, toroidal=False, band_rows=None):
+        """Creates the files of an empty universe of a given size in a folder.
+        The files are sparse where the file system allows it, so they are created at once.
+        """
+        if size.w < 1 or size.h < 1:
+            raise OutOfCoreException(f"The size of the universe must be at least 1x1: {size.w}x{size.h}")
+        path = os.path.expanduser(path)
+        os.makedirs(path, exist_ok=True)
+        for generation, file_name in enumerate(reversed(GENERATION_FILE_NAMES)):
+            file_name = os.path.join(path, file_name)
+            with open(file_name, 'wb') as file_out:
+                file_out.truncate(HEADER_BYTES + size.h * words_per_row(size.w) * WORD_DTYPE.itemsize)
+            header = np.memmap(file_name, dtype=HEADER_DTYPE, mode='r+', shape=(1,))
+            header[0] = (FILE_MAGIC, size.w, size.h, toroidal, generation, 0)
+            header.flush()
+        return cls(path, band_rows=band_rows)
+
+    @classmethod
+    def from_random(cls, path, size, density=0.5, seed=None, toroidal=False, band_rows=None):
+        """Creates a universe of a given size where each cell is alive with a given probability."""
+        universe = cls.create(path, size, toroidal=toroidal, band_rows=band_rows)
+        rng = np.random.default_rng(seed)
+        rows = max(1, RANDOM_BYTES // (size.w * np.dtype(np.float32).itemsize))
+        words = universe._words[universe._current]
+        for y in range(0, size.h, rows):
+            cells = rng.random((min(rows, size.h - y), size.w), dtype=np.float32) < density
+            words[y:y + len(cells)] = pack(cells)
+            universe._population += population(words[y:y + len(cells)])
+        universe._write_checkpoint(universe._current)
+        return universe
+
+    def close(self):
+        """Writes the current generation to its file and closes the files."""
+        if self._words:
+            self._write_checkpoint(self._current)
+            self._words, self._headers = None, None
+
+    def _write_checkpoint(self, index):
+        """Writes the rows of the generation of a file and then its header,
+        so the header only tells a generation when all its rows are on disk.
+        """
+        self._words[index].flush()
+        header = self._headers[index]
+        header['generation'], header['population'] = self.generation, self._population
+        header.flush()
+
+    def load(self, cells, y=0, x=0):
+        """Loads a matrix of cells on the current generation with its top left cell
+        on the row y and the column x. The other cells do not change.
+        """
+        h, w = cells.shape
+        if y < 0 or x < 0 or y + h > self.height or x + w > self.width:
+            raise OutOfCoreException(f"The cells do not fit in the universe of {self.width}x{self.height} "
+                                     f"on the row {y} and the column {x}")
+        # The words of the columns of the cells are unpacked, so the cells can start on any bit
+        word_from, word_to = x // WORD_BITS, words_per_row(x + w)
+        words = self._words[self._current][y:y + h, word_from:word_to]
+        block = unpack(words, (word_to - word_from) * WORD_BITS)
+        x_in_block = x - word_from * WORD_BITS
+        block[:, x_in_block:x_in_block + w] = cells
+        population_old = population(words)
+        words[:] = pack(block)
+        self._population += population(words) - population_old
+        self._write_checkpoint(self._current)
+
+    def cells(self, y_from=0, y_to=None, x_from=0, x_to=None):
+        """Returns a matrix with the cells of a rectangle of the current generation,
+        by default the whole universe, which must fit in memory.
+        """
+        y_to = self.height if y_to is None else y_to
+        x_to = self.width if x_to is None else x_to
+        if not 0 <= y_from < y_to <= self.height or not 0 <= x_from < x_to <= self.width:
+            raise OutOfCoreException(f"The rectangle from the row {y_from} and the column {x_from} "
+                                     f"to the row {y_to} and the column {x_to} "
+                                     f"is not in the universe of {self.width}x{self.height}")
+        word_from = x_from // WORD_BITS
+        words = self._words[self._current][y_from:y_to, word_from:words_per_row(x_to)]
+        x_in_block = x_from - word_from * WORD_BITS
+        return unpack(words, x_to - word_from * WORD_BITS)[:, x_in_block:]
+
+    def population(self):
+        """Returns the number of cells alive."""
+        return self._population
+
+    def extinct(self):
+        """Checks if there are no cells alive."""
+        return self._population == 0
+
+    def stats(self):
+        """Returns statistics of the universe and its population."""
+        res = OrderedDict()
+        res['generation'] = self.generation
+        res['size'] = f'{self.width}x{self.height}'
+        res['topology'] = 'toroidal' if self.toroidal else 'flat'
+        res['cells alive'] = self._population
+        res['density'] = round(self._population / (self.width * self.height), 4)
+        res['bytes per generation'] = self.height * self.n_words * WORD_DTYPE.itemsize
+        res['band rows'] = self.band_rows
+        return res
+
+    def _read_band(self, words, y_from, y_to):
+        """Reads the rows of a band with its halo rows, which wrap around in a toroidal universe
+        and are dead out of a flat one.
+        """
+        rows = self._padded[:y_to - y_from + 2]
+        rows[1:-1] = words[y_from:y_to]
+        if y_from > 0 or self.toroidal:
+            rows[0] = words[y_from - 1]
+        else:
+            rows[0] = 0
+        if y_to < self.height or self.toroidal:
+            rows[-1] = words[y_to % self.height]
+        else:
+            rows[-1] = 0
+        return rows
+
+    def calculate_generation(self):
+        words, words_new = self._words[self._current], self._words[1 - self._current]
+        population_new = 0
+        for y_from in range(0, self.height, self.band_rows):
+            y_to = min(y_from + self.band_rows, self.height)
+            rows = self._read_band(words, y_from, y_to)
+            rows_new = next_generation_words(rows, self.width, self.toroidal)
+            if not self.toroidal:
+                # The cells on the border of a flat universe do not change
+                rows_new &= ~self._column_mask
+                rows_new |= rows[1:-1] & self._column_mask
+                y_from == 0 and np.copyto(rows_new[0], rows[1])
+                y_to == self.height and np.copyto(rows_new[-1], rows[-2])
+            words_new[y_from:y_to] = rows_new
+            population_new += population(rows_new)
+        self._current = 1 - self._current
+        self.generation += 1
+        self._population = population_new
+        self._write_checkpoint(self._current)
+
+    def calculate_generations(self, n):
+        for _ in range(n):
+            self.calculate_generation()
+
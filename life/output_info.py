@@ -79,6 +79,12 @@ class OutputInfo(OutputFile):
                     f"{' ' * 8} Total cells alive: {self.game.universe.stats['cells_total']:12}",
                     f"{' ' * 3} {'-' * 37}",
                     ]
+        if self.game.universe.engine:
+            for key, value in self.game.universe.engine.stats().items():
+                out_info.insert(-1, f"{' ' * 8} {key.capitalize()}: {value}")
+        if self.game.universe.cycles:
+            for key, value in self.game.universe.cycles.stats().items():
+                out_info.insert(-1, f"{' ' * 8} {key.capitalize()}: {value}")
         self.write_line('\n'.join(out_info))
 
     def write_buffer_before_exit(self):
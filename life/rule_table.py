@@ -0,0 +1,65 @@
+"""Module rule_table."""
+__author__ = 'Joan A. Pinol  (japinol)'
+
+import numpy as np
+
+from life.engines import EngineBase
+from life.halos import refresh_halo_toroidal
+from life.settings import Settings
+
+
+class RuleTableEngine(EngineBase):
+    """Calculates generations of any life-like rule with its lookup table.
+    The 3x3 neighborhood of each cell is encoded as a 9 bit pattern,
+    which indexes the table of the rule, so the rule is applied
+    with a single gather whatever it is.
+    It uses the toroidal or the flat topology according to settings.
+    In a flat universe, the cells on the border do not change, the same way
+    as the non toroidal fast calculation does.
+    """
+    name = 'rule_table'
+
+    def __init__(self, universe):
+        super().__init__(universe)
+        self.rule = Settings.rule
+        self.toroidal = Settings.toroidal_universe
+        h, w = universe.size_u.h, universe.size_u.w
+        if self.toroidal:
+            self._padded = np.zeros((h + 2, w + 2), dtype=np.uint8)
+            self._padded_inner = self._padded[1:-1, 1:-1]
+        else:
+            h, w = h - 2, w - 2
+        # Patterns of 3 bits of each cell with its left and right neighbors, including the halo rows
+        self._row_patterns = np.zeros((h + 2, w), dtype=np.uint16)
+        self._patterns = np.zeros((h, w), dtype=np.uint16)
+        self._shifted = np.zeros((h + 2, w), dtype=np.uint16)
+
+    def stats(self):
+        res = super().stats()
+        res['rule'] = str(self.rule)
+        return res
+
+    def calculate_generation(self, cells_old):
+        if self.toroidal:
+            padded = self._padded
+            np.copyto(self._padded_inner, cells_old)
+            refresh_halo_toroidal(padded)
+            cells_new = self.universe.cells
+        else:
+            padded = cells_old
+            cells_new = self.universe.cells[1:-1, 1:-1]
+
+        # The patterns are separable: first encode each row, then join the rows
+        row_patterns, shifted = self._row_patterns, self._shifted
+        np.left_shift(padded[:, :-2], 2, out=row_patterns, dtype=np.uint16)
+        np.left_shift(padded[:, 1:-1], 1, out=shifted, dtype=np.uint16)
+        np.bitwise_or(row_patterns, shifted, out=row_patterns)
+        np.bitwise_or(row_patterns, padded[:, 2:], out=row_patterns)
+        patterns, shifted = self._patterns, self._shifted[1:-1]
+        np.left_shift(row_patterns[:-2], 6, out=patterns)
+        np.left_shift(row_patterns[1:-1], 3, out=shifted)
+        np.bitwise_or(patterns, shifted, out=patterns)
+        np.bitwise_or(patterns, row_patterns[2:], out=patterns)
+
+        # The patterns are always valid indexes, so they do not need to be checked
+        np.take(self.rule.table, patterns, out=cells_new, mode='clip')
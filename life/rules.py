@@ -0,0 +1,346 @@
+"""Module rules."""
+__author__ = 'Joan A. Pinol  (japinol)'
+
+import re
+
+import numpy as np
+
+RULE_DEFAULT = 'B3/S23'
+
+# Some well known life-like rules by name
+RULES = {
+    'life': 'B3/S23',
+    'highlife': 'B36/S23',
+    'day_and_night': 'B3678/S34678',
+    'seeds': 'B2/S',
+    'life_without_death': 'B3/S012345678',
+    'replicator': 'B1357/S1357',
+    'morley': 'B368/S245',
+    'two_by_two': 'B36/S125',
+    'diamoeba': 'B35678/S5678',
+    'maze': 'B3/S12345',
+    'anneal': 'B4678/S35678',
+    }
+
+# Some well known Larger than Life rules by name
+LARGER_THAN_LIFE_RULES = {
+    'bosco': 'R5,C0,M1,S34..58,B34..45,NM',
+    'majority': 'R4,C0,M1,S41..81,B41..81,NM',
+    'waffle': 'R7,C0,M1,S100..200,B75..170,NM',
+    'globe': 'R8,C0,M1,S163..223,B74..252,NM',
+    'bugsmovie': 'R10,C0,M1,S123..212,B123..170,NM',
+    }
+
+# Some well known Generations rules by name
+GENERATIONS_RULES = {
+    'brians_brain': '/2/3',
+    'star_wars': '345/2/4',
+    'frogs': '12/34/3',
+    'bloomerang': '234/34678/24',
+    'sticks': '3456/2/6',
+    'lava': '12345/45678/8',
+    'fireworks': '2/13/21',
+    }
+
+# Some well known Lenia rules by name
+LENIA_RULES = {
+    'orbium': 'LENIA,R13,M0.15,S0.015,T0.1,Ggaussian',
+    }
+
+NEIGHBORS_MAX = 8
+# Bit of the cell itself in the 3x3 neighborhood patterns, from the top left bit (8) to the bottom right one (0)
+CENTER_BIT = 4
+
+_RULE_BS_PATTERN = re.compile(r'^B([0-8]*)/S([0-8]*)$', re.IGNORECASE)
+_RULE_SB_PATTERN = re.compile(r'^([0-8]*)/([0-8]*)$')
+_RULE_GENERATIONS_PATTERN = re.compile(r'^([0-8]*)/([0-8]*)/([0-9]+)$')
+_RULE_GENERATIONS_BSC_PATTERN = re.compile(r'^B([0-8]*)/S([0-8]*)/C([0-9]+)$', re.IGNORECASE)
+_RULE_LENIA_PATTERN = re.compile(r'^LENIA(?:,R([0-9]+))?(?:,M([0-9.]+))?(?:,S([0-9.]+))?(?:,T([0-9.]+))?'
+                                 r'(?:,G([a-z]+))?$', re.IGNORECASE)
+# Start of the notation of Larger than Life, which tells it from the names of the rules starting with R
+_RULE_LTL_START_PATTERN = re.compile(r'^R[0-9]+,', re.IGNORECASE)
+_RULE_LTL_PATTERN = re.compile(r'^R([0-9]+),C([0-9]+),M([01]),S([0-9]+)\.\.([0-9]+),B([0-9]+)\.\.([0-9]+)(,NM)?$',
+                               re.IGNORECASE)
+
+
+class RuleException(Exception):
+    pass
+
+
+class Rule:
+    """Represents a rule of a life-like cellular automaton.
+    A dead cell is born if its number of neighbors is in born,
+    and a cell alive survives if its number of neighbors is in survive.
+    The rule is compiled once into lookup tables, so applying it
+    to a generation costs a single gather.
+    """
+
+    def __init__(self, born, survive):
+        self.born = frozenset(born)
+        self.survive = frozenset(survive)
+        # Next state of the dead and alive cells, indexed by the number of neighbors
+        self.dead = np.zeros(NEIGHBORS_MAX + 1, dtype=np.uint8)
+        self.alive = np.zeros(NEIGHBORS_MAX + 1, dtype=np.uint8)
+        self.dead[list(self.born)] = 1
+        self.alive[list(self.survive)] = 1
+        # Next state indexed by the sum of the 3x3 neighborhood plus 8 if the cell is alive:
+        # dead cells go from 0 to 8 and cells alive from 9 to 17
+        self.sums_table = np.concatenate((self.dead, self.alive))
+        # The same table as a bit mask, where the bit n is the next state for the index n
+        self.sums_mask = np.uint32(sum(1 << int(n) for n in np.flatnonzero(self.sums_table)))
+        self.table = self._compile_table()
+
+    def _compile_table(self):
+        """Returns the next state of a cell indexed by the 512 bit patterns of its 3x3 neighborhood."""
+        patterns = np.arange(512, dtype=np.uint16)
+        bits = (patterns[:, np.newaxis] >> np.arange(9, dtype=np.uint16)) & 1
+        is_alive = bits[:, CENTER_BIT].astype(bool)
+        neighbors_no = bits.sum(axis=1) - is_alive
+        return np.where(is_alive, self.alive[neighbors_no], self.dead[neighbors_no]).astype(np.uint8)
+
+    @property
+    def is_life(self):
+        """Checks if this is the rule of Conway's Game of Life."""
+        return self.born == {3} and self.survive == {2, 3}
+
+    @classmethod
+    def from_string(cls, rule):
+        """Returns the rule with a given name or in B/S notation, such as B36/S23.
+        The S/B notation, such as 23/36, is also accepted.
+        """
+        rule = str(rule).strip()
+        rule = RULES.get(rule.lower(), rule)
+        match = _RULE_BS_PATTERN.match(rule)
+        if match:
+            born, survive = match.groups()
+        else:
+            match = _RULE_SB_PATTERN.match(rule)
+            if not match:
+                raise RuleException(f"Rule not valid: {rule}. Example: B36/S23")
+            survive, born = match.groups()
+        return cls((int(n) for n in born), (int(n) for n in survive))
+
+    def apply_sums(self, rule_indexes, shifted, out):
+        """Writes the next state of the cells indexed by the sum of their neighborhood
+        plus 8 if they are alive. It shifts the bit mask of the rule instead of
+        gathering from its table, since a gather creates an array of indexes,
+        so it does not allocate memory given a uint32 buffer for the shifted masks.
+        """
+        np.right_shift(self.sums_mask, rule_indexes, out=shifted)
+        np.bitwise_and(shifted, 1, out=out, casting='unsafe')
+
+    def __str__(self):
+        return 'B%s/S%s' % (''.join(str(n) for n in sorted(self.born)),
+                            ''.join(str(n) for n in sorted(self.survive)))
+
+
+class LargerThanLifeRule:
+    """Represents a Larger than Life rule, whose neighborhood is the square
+    of cells at a given radius or less. The middle cell can be counted too.
+    A dead cell is born if its count is in the range of born,
+    and a cell alive survives if its count is in the range of survive.
+    """
+    is_life = False
+
+    def __init__(self, radius, born, survive, middle=False):
+        self.radius = radius
+        self.born = born
+        self.survive = survive
+        self.middle = middle
+        # The largest count of the neighborhood, including the middle cell
+        self.count_max = (2 * radius + 1) ** 2
+        # Next state indexed by the count plus count_max + 1 if the cell is alive
+        self.dead = np.zeros(self.count_max + 1, dtype=np.uint8)
+        self.alive = np.zeros(self.count_max + 1, dtype=np.uint8)
+        self.dead[born[0]:born[1] + 1] = 1
+        self.alive[survive[0]:survive[1] + 1] = 1
+        self.sums_table = np.concatenate((self.dead, self.alive))
+
+    @classmethod
+    def from_rule(cls, rule):
+        """Returns the Larger than Life rule of radius 1 of a life-like rule."""
+        if isinstance(rule, cls):
+            return rule
+        res = cls(1, (0, -1), (0, -1))
+        res.dead[:len(rule.dead)] = rule.dead
+        res.alive[:len(rule.alive)] = rule.alive
+        res.sums_table = np.concatenate((res.dead, res.alive))
+        return res
+
+    @classmethod
+    def from_string(cls, rule):
+        """Returns the rule with a given name or in the notation of Larger than Life,
+        such as R5,C0,M1,S34..58,B34..45,NM for Bosco's Rule.
+        R is the radius, C the number of states, which must be 0 or 2, M is 1 if
+        the middle cell is counted, and S and B are the ranges of counts to survive
+        and to be born. Only the Moore neighborhood, NM, is supported.
+        """
+        rule = str(rule).strip()
+        rule = LARGER_THAN_LIFE_RULES.get(rule.lower(), rule)
+        match = _RULE_LTL_PATTERN.match(rule)
+        if not match:
+            raise RuleException(f"Rule not valid: {rule}. Example: R5,C0,M1,S34..58,B34..45,NM")
+        radius, states, middle, *ranges, _ = match.groups()
+        radius, states, survive_min, survive_max, born_min, born_max = (
+            int(n) for n in (radius, states, *ranges))
+        if states not in (0, 2):
+            raise RuleException(f"Rule not valid: {rule}. Only rules of 2 states are supported: C0 or C2")
+        if radius < 1:
+            raise RuleException(f"Rule not valid: {rule}. The radius must be at least 1")
+        return cls(radius, (born_min, born_max), (survive_min, survive_max), middle=middle == '1')
+
+    def __str__(self):
+        return (f'R{self.radius},C0,M{int(self.middle)},S{self.survive[0]}..{self.survive[1]},'
+                f'B{self.born[0]}..{self.born[1]},NM')
+
+
+class GenerationsRule:
+    """Represents a rule of the Generations family, such as Brian's Brain.
+    The cells have a number of states: 0 is dead, 1 is alive and the rest
+    are dying states. A dead cell is born if its number of neighbors alive
+    is in born, and a cell alive survives if it is in survive. Otherwise,
+    a cell alive starts dying, and it goes through the dying states
+    one generation each until it is dead. Only the cells alive are neighbors.
+    """
+    is_life = False
+
+    def __init__(self, born, survive, states):
+        if states < 2:
+            raise RuleException(f"The number of states of a Generations rule must be at least 2: {states}")
+        self.born = frozenset(born)
+        self.survive = frozenset(survive)
+        self.states = states
+        # Next state indexed by the state times 9 plus the number of neighbors alive
+        self.table = np.zeros((states, NEIGHBORS_MAX + 1), dtype=np.uint8)
+        self.table[0, list(self.born)] = 1
+        self.table[1] = 2 if states > 2 else 0
+        self.table[1, list(self.survive)] = 1
+        self.table[2:] = (np.arange(3, states + 1) % states)[:, np.newaxis]
+        self.table = self.table.ravel()
+
+    @classmethod
+    def from_rule(cls, rule):
+        """Returns the Generations rule of 2 states of a life-like rule."""
+        if isinstance(rule, cls):
+            return rule
+        return cls(rule.born, rule.survive, 2)
+
+    @classmethod
+    def from_string(cls, rule):
+        """Returns the rule with a given name or in S/B/C notation, such as 345/2/4 for Star Wars,
+        where C is the number of states, including the dead and the alive ones.
+        The B/S/C notation, such as B2/S345/C4, is also accepted.
+        """
+        rule = str(rule).strip()
+        rule = GENERATIONS_RULES.get(rule.lower(), rule)
+        match = _RULE_GENERATIONS_BSC_PATTERN.match(rule)
+        if match:
+            born, survive, states = match.groups()
+        else:
+            match = _RULE_GENERATIONS_PATTERN.match(rule)
+            if not match:
+                raise RuleException(f"Rule not valid: {rule}. Example: 345/2/4")
+            survive, born, states = match.groups()
+        return cls((int(n) for n in born), (int(n) for n in survive), int(states))
+
+    def __str__(self):
+        return '%s/%s/%s' % (''.join(str(n) for n in sorted(self.survive)),
+                             ''.join(str(n) for n in sorted(self.born)), self.states)
+
+
+def _growth_gaussian(u, mu, sigma):
+    return 2 * np.exp(-(u - mu) ** 2 / (2 * sigma ** 2)) - 1
+
+
+def _growth_polynomial(u, mu, sigma):
+    return 2 * np.maximum(0, 1 - (u - mu) ** 2 / (9 * sigma ** 2)) ** 4 - 1
+
+
+def _growth_step(u, mu, sigma):
+    return np.where(np.abs(u - mu) <= sigma, 1, -1)
+
+
+# Growth functions of the Lenia rules by name
+GROWTH_FUNCTIONS = {
+    'gaussian': _growth_gaussian,
+    'polynomial': _growth_polynomial,
+    'step': _growth_step,
+    }
+
+
+class LeniaRule:
+    """Represents a rule of Lenia, a continuous cellular automaton.
+    The state of each cell is a value between 0 and 1. Each generation, the
+    neighborhood of each cell is weighted by a kernel, and the state grows
+    by dt times the growth function of that weighted sum, which is positive
+    near mu, with a width of sigma, and negative far from it.
+    The default kernel is a smooth ring of the given radius, but any kernel
+    can be given, such as a weighted neighborhood.
+    """
+    is_life = False
+
+    def __init__(self, radius=13, mu=0.15, sigma=0.015, dt=0.1, growth='gaussian', kernel=None):
+        if growth not in GROWTH_FUNCTIONS:
+            raise RuleException(f"Growth function not found: {growth}. Example: {', '.join(GROWTH_FUNCTIONS)}")
+        self.radius = radius
+        self.mu = mu
+        self.sigma = sigma
+        self.dt = dt
+        self.growth_name = growth
+        self._kernel = kernel
+
+    def kernel(self):
+        """Returns the kernel of the neighborhoods, normalized so its weights add up to 1."""
+        if self._kernel is not None:
+            kernel = np.asarray(self._kernel, dtype=np.float32)
+        else:
+            # A ring that is zero on the center and on the radius, and 1 halfway
+            y, x = np.ogrid[-self.radius:self.radius + 1, -self.radius:self.radius + 1]
+            distances = np.sqrt(x ** 2 + y ** 2) / self.radius
+            inside = (distances > 0) & (distances < 1)
+            kernel = np.zeros(distances.shape, dtype=np.float32)
+            kernel[inside] = np.exp(4 - 1 / (distances[inside] * (1 - distances[inside])))
+        return kernel / kernel.sum()
+
+    def growth(self, u):
+        """Returns the growth of the cells given the weighted sums of their neighborhoods."""
+        return GROWTH_FUNCTIONS[self.growth_name](u, np.float32(self.mu), np.float32(self.sigma))
+
+    @classmethod
+    def from_string(cls, rule):
+        """Returns the rule with a given name or in the notation LENIA,R13,M0.15,S0.015,T0.1,Ggaussian,
+        where R is the radius, M is mu, S is sigma, T is dt and G is the growth function.
+        The parameters not given take the values of the Orbium.
+        """
+        rule = str(rule).strip()
+        rule = LENIA_RULES.get(rule.lower(), rule)
+        match = _RULE_LENIA_PATTERN.match(rule)
+        if not match:
+            raise RuleException(f"Rule not valid: {rule}. Example: LENIA,R13,M0.15,S0.015,T0.1,Ggaussian")
+        radius, mu, sigma, dt, growth = match.groups()
+        try:
+            params = {name: converter(value) for name, converter, value in (
+                ('radius', int, radius), ('mu', float, mu), ('sigma', float, sigma), ('dt', float, dt))
+                if value is not None}
+        except ValueError:
+            raise RuleException(f"Rule not valid: {rule}. Example: LENIA,R13,M0.15,S0.015,T0.1,Ggaussian")
+        if params.get('radius', 1) < 1:
+            raise RuleException(f"Rule not valid: {rule}. The radius must be at least 1")
+        return cls(growth=(growth or 'gaussian').lower(), **params)
+
+    def __str__(self):
+        return f'LENIA,R{self.radius},M{self.mu},S{self.sigma},T{self.dt},G{self.growth_name}'
+
+
+def rule_from_string(rule):
+    """Returns a life-like rule, a Generations one, a Larger than Life one or a Lenia one from a string."""
+    rule = str(rule).strip()
+    if rule.lower() in RULES:
+        return Rule.from_string(rule)
+    if rule.lower() in GENERATIONS_RULES or rule.count('/') == 2:
+        return GenerationsRule.from_string(rule)
+    if rule.lower() in LENIA_RULES or rule.upper().startswith('LENIA'):
+        return LeniaRule.from_string(rule)
+    if rule.lower() in LARGER_THAN_LIFE_RULES or _RULE_LTL_START_PATTERN.match(rule):
+        return LargerThanLifeRule.from_string(rule)
+    return Rule.from_string(rule)
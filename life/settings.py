@@ -5,6 +5,7 @@ from enum import Enum, auto
 import os
 
 from life import lib_jp
+from life.rules import GenerationsRule, LargerThanLifeRule, LeniaRule, Rule, RuleException, RULE_DEFAULT, rule_from_string
 from life.seeds import seeds as seeds_seeds
 
 SCREEN_MAX_WIDTH = 1920
@@ -17,10 +18,28 @@ CELL_MAX_SIZE = 10
 CELL_MIN_SIZE = 4
 CELL_ZOOM_DEFAULT_SIZE = 19
 
+UNIVERSE_SIZE_DEFAULT = lib_jp.Size(w=137, h=90)
+
 FPS_DEFAULT = 400
 FPS_MIN = 15
 FPS_MAX = 500
 
+HASHLIFE_JUMP_MAX = 60
+HASHLIFE_CACHE_SIZE_DEFAULT = 2 ** 20
+HASHLIFE_CACHE_SIZE_MIN = 2 ** 12
+
+WORKERS_MAX = 64
+
+RENDER_EVERY_MAX = 10000
+
+# Milliseconds of each frame that the time_sliced engine spends calculating
+FRAME_BUDGET_DEFAULT = 10
+FRAME_BUDGET_MAX = 1000
+
+BLOCK_TILE_SIZE_MIN = 16
+BLOCK_TILE_SIZE_MAX = 4096
+BLOCK_GENERATIONS_MAX = 64
+
 OUT_FILE_DEFAULT = os.path.join('output', 'output.txt')
 LOG_FILE_DEFAULT = os.path.join('files', 'log.txt')
 
@@ -52,6 +71,57 @@ class UniverseCalculationType(Enum):
     NON_TOROIDAL_FAST = auto()
     TOROIDAL_LOOP = auto()
     NON_TOROIDAL_LOOP = auto()
+    TOROIDAL_FAST = auto()
+    DEAD_BORDER_FAST = auto()
+    REFLECTIVE_FAST = auto()
+    KLEIN_BOTTLE_FAST = auto()
+    BIT_PACKED = auto()
+    HASHLIFE = auto()
+    CHUNK_MAP = auto()
+    TILED = auto()
+    MULTI_PROCESS = auto()
+    THREAD_POOL = auto()
+    RULE_TABLE = auto()
+    CHANGE_LIST = auto()
+    TEMPORAL_BLOCKING = auto()
+    LARGER_THAN_LIFE = auto()
+    GENERATIONS = auto()
+    SYMMETRY = auto()
+    LENIA = auto()
+    ADAPTIVE = auto()
+    CLUSTER = auto()
+    TIME_SLICED = auto()
+
+
+# Generation calculation types that define by themselves if the universe is toroidal
+UNIVERSE_CALCULATION_TOROIDAL = {
+    UniverseCalculationType.NON_TOROIDAL_FAST: False,
+    UniverseCalculationType.TOROIDAL_LOOP: True,
+    UniverseCalculationType.NON_TOROIDAL_LOOP: False,
+    UniverseCalculationType.TOROIDAL_FAST: True,
+    UniverseCalculationType.DEAD_BORDER_FAST: False,
+    UniverseCalculationType.REFLECTIVE_FAST: False,
+    UniverseCalculationType.KLEIN_BOTTLE_FAST: False,
+}
+
+# Generation calculation types that only calculate the rule of Conway's Game of Life
+UNIVERSE_CALCULATION_LIFE_ONLY = {
+    UniverseCalculationType.BIT_PACKED,
+    UniverseCalculationType.HASHLIFE,
+    UniverseCalculationType.CHUNK_MAP,
+    UniverseCalculationType.TILED,
+    UniverseCalculationType.MULTI_PROCESS,
+    UniverseCalculationType.THREAD_POOL,
+    UniverseCalculationType.CLUSTER,
+}
+
+
+# Generation calculation types of the rules that are not life-like, which are chosen for them by default
+UNIVERSE_CALCULATION_BY_RULE = {
+    LargerThanLifeRule: UniverseCalculationType.LARGER_THAN_LIFE,
+    GenerationsRule: UniverseCalculationType.GENERATIONS,
+    LeniaRule: UniverseCalculationType.LENIA,
+}
 
 
 class NextGenerationType(Enum):
@@ -80,6 +150,15 @@ class Settings:
     universe_size = None
     universe_calculation = None
     toroidal_universe = None
+    rule = None
+    hashlife_jump = None
+    hashlife_cache_size = None
+    workers = None
+    block_tile_size = None
+    block_generations = None
+    render_every = None
+    frame_budget = None
+    cycle_detection = False
     empty_universe = None
     cell_one_color = None
     cell_selector_hide = False
@@ -96,6 +175,7 @@ class Settings:
     start_immediately_initial_value = False
     exit_auto_when_auto_play = False
     starting_seeds = None
+    starting_cells = None
     stop_after_generation = None
     stats_activated = True
     stats_middle_calc_gui = True
@@ -122,9 +202,18 @@ class Settings:
         cls.screen_height_adjusted = None
         cls.screen_width_adjusted = None
         cls.universe_pos = lib_jp.Point(x=320, y=55)
-        cls.universe_size = lib_jp.Size(w=137, h=90)
+        cls.universe_size = UNIVERSE_SIZE_DEFAULT
         cls.universe_calculation = UniverseCalculationType.NON_TOROIDAL_FAST
         cls.toroidal_universe = False
+        cls.rule = Rule.from_string(RULE_DEFAULT)
+        cls.hashlife_jump = 0
+        cls.hashlife_cache_size = HASHLIFE_CACHE_SIZE_DEFAULT
+        cls.workers = min(os.cpu_count() or 1, WORKERS_MAX)
+        cls.block_tile_size = 0
+        cls.block_generations = 0
+        cls.render_every = 1
+        cls.frame_budget = FRAME_BUDGET_DEFAULT
+        cls.cycle_detection = False
         cls.empty_universe = False
         cls.cell_one_color = False
         cls.cell_selector_hide = False
@@ -144,6 +233,7 @@ class Settings:
         cls.start_immediately_initial_value = False
         cls.exit_auto_when_auto_play = False
         cls.starting_seeds = None
+        cls.starting_cells = None
         cls.stop_after_generation = 0
         cls.stats_activated = True
         cls.stats_middle_calc_gui = True
@@ -164,12 +254,55 @@ class Settings:
         cls.logo_jp_std_size = lib_jp.Size(w=244, h=55)
         cls.help_key_size = lib_jp.Size(w=218, h=57)
 
+    @classmethod
+    def validate_starting_seeds(cls, starting_seeds, universe_size=None):
+        """Returns a list of seeds with their positions from a string of seeds
+        such as: gosper_glider_gun 7 20, clock 75 100.
+        The seeds must fit in the universe, which is the one of the settings by default.
+        """
+        universe_size = universe_size or cls.universe_size
+        res = []
+        seeds_with_pos = starting_seeds.strip().split(',')
+        for seed_with_pos in seeds_with_pos:
+            seeds = seed_with_pos.strip().split()
+            if not seeds_seeds.get(seeds[0]):
+                raise SettingsException(f"Starting seed not found: {seeds[0]}")
+            try:
+                pos_y = int(seeds[1])
+                pos_x = int(seeds[2])
+            except Exception as _:
+                raise SettingsException(f'coordinates for seed {seeds[0]} '
+                                        'must be integers. Example: {seeds[0]} 10 20')
+
+            seed_h = len(seeds_seeds[seeds[0]])
+            seed_w = len(seeds_seeds[seeds[0]][0])
+            pos_h = pos_y + seed_h
+            pos_w = pos_x + seed_w
+            if pos_y < 0 or pos_h > universe_size.h:
+                raise SettingsException(f'y coordinate for seed {seeds[0]} must be '
+                                        f'between 0 and {universe_size.h-seed_h}. Example: {seeds[0]} 10 20')
+            if pos_x < 0 or pos_w > universe_size.w:
+                raise SettingsException(f'y coordinate for seed {seeds[0]} must be '
+                                        f'between 0 and {universe_size.w-seed_w}. Example: {seeds[0]} 10 20')
+            res += [[seeds[0], (pos_y, pos_x)]]
+        return res
+
     @classmethod
     def calculate_settings(cls, screen_width=None,
                            screen_height=None,
                            full_screen=None,
                            cell_size=None,
                            toroidal_universe=False,
+                           universe_calculation=None,
+                           rule=None,
+                           hashlife_jump=None,
+                           hashlife_cache_size=None,
+                           workers=None,
+                           block_tile_size=None,
+                           block_generations=None,
+                           render_every=None,
+                           frame_budget=None,
+                           cycle_detection=False,
                            empty_universe=False,
                            cell_one_color=False,
                            edit_not_allowed=False,
@@ -180,6 +313,7 @@ class Settings:
                            log_file=None,
                            start_immediately=False,
                            starting_seeds=None,
+                           starting_cells=None,
                            stop_after_generation=None,
                            stats_deactivated=False,
                            stats_no_middle_calc_gui=False,
@@ -209,33 +343,6 @@ class Settings:
                 if not screen_width or not screen_width.isdigit():
                     cls.screen_width = int(cls.screen_height * cls.screen_aspect_ratio)
 
-        def validate_starting_seeds(starting_seeds):
-            res = []
-            seeds_with_pos = starting_seeds.strip().split(',')
-            for seed_with_pos in seeds_with_pos:
-                seeds = seed_with_pos.strip().split()
-                if not seeds_seeds.get(seeds[0]):
-                    raise SettingsException(f"Starting seed not found: {seeds[0]}")
-                try:
-                    pos_y = int(seeds[1])
-                    pos_x = int(seeds[2])
-                except Exception as _:
-                    raise SettingsException(f'coordinates for seed {seeds[0]} '
-                                            'must be integers. Example: {seeds[0]} 10 20')
-
-                seed_h = len(seeds_seeds[seeds[0]])
-                seed_w = len(seeds_seeds[seeds[0]][0])
-                pos_h = pos_y + seed_h
-                pos_w = pos_x + seed_w
-                if pos_y < 0 or pos_h > cls.universe_size.h:
-                    raise SettingsException(f'y coordinate for seed {seeds[0]} must be '
-                                            f'between 0 and {cls.universe_size.h-seed_h}. Example: {seeds[0]} 10 20')
-                if pos_x < 0 or pos_w > cls.universe_size.w:
-                    raise SettingsException(f'y coordinate for seed {seeds[0]} must be '
-                                            f'between 0 and {cls.universe_size.w-seed_w}. Example: {seeds[0]} 10 20')
-                res += [[seeds[0], (pos_y, pos_x)]]
-            return res
-
         cls.clean()
         # Define screen values to resize the screen and images if necessary
         _calculate_max_screen_size(screen_width, screen_height)
@@ -265,8 +372,62 @@ class Settings:
 
         cls.toroidal_universe = toroidal_universe
         if cls.toroidal_universe:
-            cls.universe_calculation = UniverseCalculationType.TOROIDAL_LOOP
-
+            cls.universe_calculation = UniverseCalculationType.TOROIDAL_FAST
+
+        if universe_calculation and str(universe_calculation).strip():
+            try:
+                cls.universe_calculation = UniverseCalculationType[str(universe_calculation).strip().upper()]
+            except KeyError:
+                raise SettingsException(f"Universe calculation type not found: {universe_calculation}")
+            cls.toroidal_universe = UNIVERSE_CALCULATION_TOROIDAL.get(cls.universe_calculation,
+                                                                      cls.toroidal_universe)
+
+        if rule and str(rule).strip():
+            try:
+                cls.rule = rule_from_string(rule)
+            except RuleException as e:
+                raise SettingsException(str(e))
+            rule_calculation = UNIVERSE_CALCULATION_BY_RULE.get(type(cls.rule))
+            if rule_calculation:
+                # The rules that are not life-like use their own engine, which is chosen if there is not another one
+                if not (universe_calculation and str(universe_calculation).strip()):
+                    cls.universe_calculation = rule_calculation
+                elif cls.universe_calculation != rule_calculation:
+                    raise SettingsException(f"Universe calculation type {cls.universe_calculation.name.lower()} "
+                                            f"does not calculate the rule {cls.rule}. "
+                                            f"Example: {rule_calculation.name.lower()}")
+            elif cls.universe_calculation == UniverseCalculationType.LENIA:
+                raise SettingsException(f"Universe calculation type {cls.universe_calculation.name.lower()} "
+                                        f"only calculates Lenia rules. Example: orbium")
+            if not cls.rule.is_life and cls.universe_calculation in UNIVERSE_CALCULATION_LIFE_ONLY:
+                raise SettingsException(f"Universe calculation type {cls.universe_calculation.name.lower()} "
+                                        f"only calculates the rule {RULE_DEFAULT}. Example: rule_table")
+            if cls.universe_calculation == UniverseCalculationType.CHANGE_LIST and cls.rule.dead[0]:
+                raise SettingsException(f"Universe calculation type {cls.universe_calculation.name.lower()} "
+                                        f"does not calculate rules with B0. Example: rule_table")
+
+        if hashlife_jump and hashlife_jump.isdigit():
+            cls.hashlife_jump = min(int(hashlife_jump), HASHLIFE_JUMP_MAX)
+
+        if hashlife_cache_size and hashlife_cache_size.isdigit():
+            cls.hashlife_cache_size = max(int(hashlife_cache_size), HASHLIFE_CACHE_SIZE_MIN)
+
+        if workers and workers.isdigit():
+            cls.workers = max(1, min(int(workers), WORKERS_MAX))
+
+        if block_tile_size and block_tile_size.isdigit():
+            cls.block_tile_size = max(BLOCK_TILE_SIZE_MIN, min(int(block_tile_size), BLOCK_TILE_SIZE_MAX))
+
+        if block_generations and block_generations.isdigit():
+            cls.block_generations = max(1, min(int(block_generations), BLOCK_GENERATIONS_MAX))
+
+        if render_every and render_every.isdigit():
+            cls.render_every = max(1, min(int(render_every), RENDER_EVERY_MAX))
+
+        if frame_budget and frame_budget.isdigit():
+            cls.frame_budget = max(1, min(int(frame_budget), FRAME_BUDGET_MAX))
+
+        cls.cycle_detection = cycle_detection
         cls.empty_universe = empty_universe
         cls.edit_allowed = not edit_not_allowed
         cls.start_immediately = start_immediately
@@ -282,10 +443,18 @@ class Settings:
             cls.exit_auto_when_auto_play = exit_auto_when_auto_play
 
         if starting_seeds:
-            cls.starting_seeds = validate_starting_seeds(starting_seeds)
+            cls.starting_seeds = cls.validate_starting_seeds(starting_seeds)
+            cls.empty_universe = False
+
+        if starting_cells is not None:
+            if tuple(starting_cells.shape) != (cls.universe_size.h, cls.universe_size.w):
+                raise SettingsException(f'starting cells must have the shape of the universe: '
+                                        f'{(cls.universe_size.h, cls.universe_size.w)}')
+            cls.starting_cells = starting_cells
+            cls.starting_seeds = None
             cls.empty_universe = False
 
-        if not cls.empty_universe and not cls.starting_seeds:
+        if not cls.empty_universe and not cls.starting_seeds and cls.starting_cells is None:
             cls.starting_seeds = STARTING_SEEDS_DEFAULT
 
         if out_file and str(out_file).strip():
@@ -0,0 +1,145 @@
+"""Module slices."""
+__author__ = 'Joan A. Pinol  (japinol)'
+
+import time
+
+import numpy as np
+
+from life.engines import EngineBase
+from life.halos import refresh_halo_toroidal
+from life.settings import Settings
+
+# Rows of the first band, before the time per row is measured
+BAND_ROWS_START = 16
+# Bands that should fit in the time budget of a frame, so the last one does not go much beyond it
+BANDS_PER_SLICE = 4
+
+
+class TimeSlicedEngine(EngineBase):
+    """Calculates each step of the universe in bands of rows spread over several frames,
+    so a step that takes longer than a frame does not stall the game loop:
+    the events are handled and the board is drawn each frame whatever the size of the universe.
+    Each frame, it calculates bands of the next generation until the time budget
+    of the frame is spent. The number of rows of a band follows the time per row measured,
+    so a few bands fit in the budget. The universe only changes to the next generation
+    when all its bands are calculated, so the current one is shown meanwhile.
+    It keeps the cells that changed in the step, so only they are updated on the board
+    in the frame that completes the step.
+    It calculates any life-like rule.
+    It uses the toroidal or the flat topology according to settings.
+    In a flat universe, the cells on the border do not change, the same way
+    as the non toroidal fast calculation does.
+    """
+    name = 'time_sliced'
+    time_sliced = True
+
+    def __init__(self, universe):
+        super().__init__(universe)
+        self.rule = Settings.rule
+        self.toroidal = Settings.toroidal_universe
+        self.h, self.w = universe.size_u.h, universe.size_u.w
+        self._buffers = np.zeros((2, self.h + 2, self.w + 2), dtype=np.uint8)
+        self._current = 0
+        self.band_rows = min(BAND_ROWS_START, self.h)
+        # Generations of the step that are still to be calculated, or None if no step has been started,
+        # and the next row of the generation being calculated
+        self._generations_left = None
+        self._row = 1
+        # Frames that the last step was spread over, and frames of the step being calculated
+        self.slices = 0
+        self._slices = 0
+        self._changed = None
+        # Sums of each cell with its left and right neighbors, including the halo rows, for the largest band
+        self._row_sums = np.zeros((self.h + 2, self.w), dtype=np.uint8)
+        self._sums = np.zeros((self.h, self.w), dtype=np.uint8)
+        self._rule_indexes = np.zeros((self.h, self.w), dtype=np.uint8)
+        self._rule_shifted = np.zeros((self.h, self.w), dtype=np.uint32)
+
+    def load(self, cells):
+        # The step being calculated is started again from the new cells
+        self._buffers[self._current, 1:-1, 1:-1] = cells
+        self._generations_left = None
+        self._row = 1
+
+    def changed_cells(self):
+        return self._changed
+
+    def stats(self):
+        res = super().stats()
+        res['rule'] = str(self.rule)
+        res['band rows'] = self.band_rows
+        res['frames per step'] = self.slices
+        return res
+
+    def _calculate_band(self, y0, y1):
+        """Calculates the rows from y0 to y1 of the next generation, counting from 1,
+        since the row 0 of the padded universe is its halo.
+        """
+        padded, padded_new = self._buffers[self._current], self._buffers[1 - self._current]
+        rows = padded[y0 - 1:y1 + 1]
+        band_rows = y1 - y0
+
+        # The 3x3 sums are separable: first sum each row, then each column
+        row_sums = self._row_sums[:band_rows + 2]
+        np.add(rows[:, :-2], rows[:, 1:-1], out=row_sums)
+        np.add(row_sums, rows[:, 2:], out=row_sums)
+        sums = self._sums[:band_rows]
+        np.add(row_sums[:-2], row_sums[1:-1], out=sums)
+        np.add(sums, row_sums[2:], out=sums)
+
+        # The table of the rule is indexed by the sum of the neighborhood plus 8 if the cell is alive
+        cells, cells_new = rows[1:-1, 1:-1], padded_new[y0:y1, 1:-1]
+        rule_indexes = self._rule_indexes[:band_rows]
+        np.multiply(cells, 8, out=rule_indexes)
+        np.add(rule_indexes, sums, out=rule_indexes)
+        self.rule.apply_sums(rule_indexes, self._rule_shifted[:band_rows], out=cells_new)
+        if not self.toroidal:
+            cells_new[:, 0] = cells[:, 0]
+            cells_new[:, -1] = cells[:, -1]
+            y0 == 1 and np.copyto(cells_new[0], cells[0])
+            y1 == self.h + 1 and np.copyto(cells_new[-1], cells[-1])
+
+    def calculate_slice(self, generations, seconds):
+        """Calculates bands of the generations of a step until a number of seconds is spent,
+        going on from where the last slice stopped. A step starts when the universe
+        has taken the last one. Without a number of seconds, the rest of the step
+        is calculated at once. Returns True if all the generations of the step have been calculated.
+        """
+        start = time.perf_counter()
+        if self._generations_left is None:
+            self._generations_left = generations
+            self._slices = 0
+        # The slice that finds the step complete is not counted
+        self._slices += bool(self._generations_left)
+        while self._generations_left:
+            if self._row == 1 and self.toroidal:
+                refresh_halo_toroidal(self._buffers[self._current])
+            y0 = self._row
+            y1 = min(y0 + self.band_rows, self.h + 1) if seconds is not None else self.h + 1
+            band_start = time.perf_counter()
+            self._calculate_band(y0, y1)
+            band_seconds = time.perf_counter() - band_start
+            if seconds is not None and y1 - y0 == self.band_rows and band_seconds > 0:
+                band_rows = self.band_rows * seconds / (BANDS_PER_SLICE * band_seconds)
+                self.band_rows = max(1, min(int(band_rows), self.h))
+            self._row = y1
+            if self._row > self.h:
+                self._current = 1 - self._current
+                self._row = 1
+                self._generations_left -= 1
+            if seconds is not None and time.perf_counter() - start >= seconds:
+                break
+        return not self._generations_left
+
+    def calculate_generation(self, cells_old):
+        self.calculate_generations(cells_old, 1)
+
+    def calculate_generations(self, cells_old, n):
+        # The bands of the step that have not been calculated in previous frames are calculated now
+        self.calculate_slice(n, None)
+        self._generations_left = None
+        self.slices = self._slices
+        # The universe still has the cells of the last step
+        cells = self._buffers[self._current, 1:-1, 1:-1]
+        self._changed = np.nonzero(cells != self.universe.cells)
+        np.copyto(self.universe.cells, cells)
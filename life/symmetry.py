@@ -0,0 +1,178 @@
+"""Module symmetry."""
+__author__ = 'Joan A. Pinol  (japinol)'
+
+from collections import OrderedDict
+
+import numpy as np
+
+from life.engines import EngineBase
+from life.settings import Settings
+
+# Transformations of the coordinates of the cells of a universe of height h and width w.
+# The rotations and the transpositions only keep the cells inside of square universes
+TRANSFORMATIONS = {
+    'identity': lambda ys, xs, h, w: (ys, xs),
+    'mirror_x': lambda ys, xs, h, w: (ys, w - 1 - xs),
+    'mirror_y': lambda ys, xs, h, w: (h - 1 - ys, xs),
+    'rotate_90': lambda ys, xs, h, w: (xs, w - 1 - ys),
+    'rotate_180': lambda ys, xs, h, w: (h - 1 - ys, w - 1 - xs),
+    'rotate_270': lambda ys, xs, h, w: (h - 1 - xs, ys),
+    'transpose': lambda ys, xs, h, w: (xs, ys),
+    'transpose_anti': lambda ys, xs, h, w: (w - 1 - xs, h - 1 - ys),
+    }
+
+# Symmetries by name, from the largest group to the smallest one. Each one has the transformations
+# of its group, besides the identity, and if the height and the width of the domain calculated are halved
+SYMMETRIES = OrderedDict([
+    ('D8', (('mirror_x', 'mirror_y', 'rotate_90', 'rotate_180', 'rotate_270', 'transpose', 'transpose_anti'),
+            (True, True))),
+    ('D4', (('mirror_x', 'mirror_y', 'rotate_180'), (True, True))),
+    ('C4', (('rotate_90', 'rotate_180', 'rotate_270'), (True, True))),
+    ('D2_x', (('mirror_x',), (False, True))),
+    ('D2_y', (('mirror_y',), (True, False))),
+    ('C2', (('rotate_180',), (True, False))),
+    ])
+SQUARE_TRANSFORMATIONS = {'rotate_90', 'rotate_270', 'transpose', 'transpose_anti'}
+
+
+def detect_symmetry(cells):
+    """Returns the name of the largest symmetry of a matrix of cells
+    about its center, or None if it is not symmetric.
+    """
+    h, w = cells.shape
+    ys, xs = np.indices(cells.shape)
+    for name, (transformations, _) in SYMMETRIES.items():
+        if h != w and SQUARE_TRANSFORMATIONS.intersection(transformations):
+            continue
+        if all(np.array_equal(cells[TRANSFORMATIONS[transformation](ys, xs, h, w)], cells)
+               for transformation in transformations):
+            return name
+    return None
+
+
+class SymmetryEngine(EngineBase):
+    """Calculates generations of symmetric universes only on a fundamental domain of them,
+    such as a quarter of a universe with D4 symmetry, which is mirrored left to right
+    and upside down. The symmetries are the ones about the center of the universe,
+    so the seeds must be placed on its center, such as pulsar or circle_of_fire.
+    The halo of the domain is gathered from its own cells through the transformations
+    of the symmetry, and the whole universe is copied from the domain, mirrored
+    or rotated, only when the generations asked for have been calculated,
+    to be shown or written.
+    The rules keep the symmetry, so it only breaks when the cells are changed
+    out of the engine, such as by the user. Then the engine detects the symmetry
+    again, which falls back to the whole universe if there is none.
+    Domains are rectangles, so the D8 symmetry calculates a quarter of the universe,
+    as the D4 and C4 ones, and the D2 and C2 ones calculate half of it.
+    It uses the toroidal or the flat topology according to settings.
+    In a flat universe, the cells on the border do not change, the same way
+    as the non toroidal fast calculation does.
+    """
+    name = 'symmetry'
+
+    def __init__(self, universe):
+        super().__init__(universe)
+        self.rule = Settings.rule
+        self.toroidal = Settings.toroidal_universe
+        self.h, self.w = universe.size_u.h, universe.size_u.w
+        self.symmetry = None
+        # Maps of the symmetries by name, which are only calculated once
+        self._maps = {}
+        self._set_symmetry(None)
+
+    def _set_symmetry(self, symmetry):
+        """Sets the domain calculated and its maps for a symmetry, or the whole universe for None."""
+        self.symmetry = symmetry
+        if symmetry not in self._maps:
+            self._maps[symmetry] = self._calculate_maps(symmetry)
+        self.domain_h, self.domain_w, self._halo_positions, self._halo_sources, self._frozen = self._maps[symmetry]
+        h, w = self.domain_h, self.domain_w
+        self._buffers = np.zeros((2, h + 2, w + 2), dtype=np.uint8)
+        self._current = 0
+        # Sums of each cell with its left and right neighbors, including the halo rows
+        self._row_sums = np.zeros((h + 2, w), dtype=np.uint8)
+        # Sums of the 3x3 neighborhood of each cell, including the cell itself
+        self._neighborhood_sums = np.zeros((h, w), dtype=np.uint8)
+        self._rule_indexes = np.zeros((h, w), dtype=np.uint8)
+        self._rule_shifted = np.zeros((h, w), dtype=np.uint32)
+
+    def _calculate_maps(self, symmetry):
+        """Returns the size of the domain of a symmetry, the positions of the cells of its halo
+        and their sources on the padded domain, and the cells of the domain that do not change, if any.
+        """
+        transformations, (halve_h, halve_w) = SYMMETRIES[symmetry] if symmetry else ((), (False, False))
+        transformations = ('identity',) + transformations
+        h = (self.h + 1) // 2 if halve_h else self.h
+        w = (self.w + 1) // 2 if halve_w else self.w
+
+        # Each cell of the padded domain has the state of the first cell of the domain
+        # that it is transformed into, or it is dead if it is out of a flat universe
+        ys, xs = np.indices((h + 2, w + 2)) - 1
+        if self.toroidal:
+            ys, xs = ys % self.h, xs % self.w
+        inside = (ys >= 0) & (ys < self.h) & (xs >= 0) & (xs < self.w)
+        sources = np.full(ys.shape, -1, dtype=np.intp)
+        for transformation in transformations:
+            ys_to, xs_to = TRANSFORMATIONS[transformation](ys, xs, self.h, self.w)
+            found = inside & (sources < 0) & (ys_to < h) & (xs_to < w)
+            sources[found] = ((ys_to + 1) * (w + 2) + xs_to + 1)[found]
+        sources = sources.ravel()
+        halo_positions = np.flatnonzero((sources >= 0) & (sources != np.arange(sources.size)))
+        frozen = None
+        if not self.toroidal:
+            ys, xs = np.indices((h, w))
+            frozen = (ys == 0) | (ys == self.h - 1) | (xs == 0) | (xs == self.w - 1)
+        return h, w, halo_positions, sources[halo_positions], frozen
+
+    def load(self, cells):
+        self._set_symmetry(detect_symmetry(cells))
+        self._buffers[:, 1:self.domain_h + 1, 1:self.domain_w + 1] = cells[:self.domain_h, :self.domain_w]
+
+    def stats(self):
+        res = super().stats()
+        res['symmetry'] = self.symmetry or 'none'
+        res['domain'] = f'{self.domain_w}x{self.domain_h}'
+        return res
+
+    def _calculate_domain_generation(self):
+        padded, padded_new = self._buffers[self._current], self._buffers[1 - self._current]
+        padded_flat = padded.reshape(-1)
+        padded_flat[self._halo_positions] = padded_flat[self._halo_sources]
+
+        # The 3x3 sums are separable: first sum each row, then each column
+        row_sums = self._row_sums
+        np.add(padded[:, :-2], padded[:, 1:-1], out=row_sums)
+        np.add(row_sums, padded[:, 2:], out=row_sums)
+        sums = self._neighborhood_sums
+        np.add(row_sums[:-2], row_sums[1:-1], out=sums)
+        np.add(sums, row_sums[2:], out=sums)
+
+        # The table of the rule is indexed by the sum of the neighborhood plus 8 if the cell is alive
+        cells, cells_new = padded[1:-1, 1:-1], padded_new[1:-1, 1:-1]
+        rule_indexes = self._rule_indexes
+        np.multiply(cells, 8, out=rule_indexes)
+        np.add(rule_indexes, sums, out=rule_indexes)
+        self.rule.apply_sums(rule_indexes, self._rule_shifted, out=cells_new)
+        self._frozen is not None and np.copyto(cells_new, cells, where=self._frozen)
+        self._current = 1 - self._current
+
+    def _expand_domain(self):
+        """Writes the whole universe from the domain, copying it mirrored or rotated."""
+        cells, h, w = self.universe.cells, self.domain_h, self.domain_w
+        cells[:h, :w] = self._buffers[self._current, 1:h + 1, 1:w + 1]
+        if self.symmetry in ('C4', 'C2'):
+            # The top right quarter is the top left one rotated, and the bottom half is the top one rotated
+            self.symmetry == 'C4' and np.copyto(cells[:h, self.w - w:], cells[:h, :w][::-1].T)
+            np.copyto(cells[self.h - h:], cells[:h][::-1, ::-1])
+        elif self.symmetry:
+            _, (halve_h, halve_w) = SYMMETRIES[self.symmetry]
+            halve_w and np.copyto(cells[:h, self.w - w:], cells[:h, :w][:, ::-1])
+            halve_h and np.copyto(cells[self.h - h:], cells[:h][::-1])
+
+    def calculate_generation(self, cells_old):
+        self.calculate_generations(cells_old, 1)
+
+    def calculate_generations(self, cells_old, n):
+        for _ in range(n):
+            self._calculate_domain_generation()
+        self._expand_domain()
@@ -0,0 +1,105 @@
+"""Module tiles."""
+__author__ = 'Joan A. Pinol  (japinol)'
+
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+from life.engines import EngineBase
+from life.halos import refresh_halo_dead, refresh_halo_toroidal
+from life.settings import Settings
+
+TILE_SIZE = 16
+
+
+class TiledEngine(EngineBase):
+    """Calculates generations only on the tiles of the universe that can change.
+    It keeps a flag for each tile that tells if any of its cells changed in
+    the previous generation. Only these tiles and their neighbors are
+    calculated, so the regions that settled into still lifes are skipped.
+    It uses the toroidal or the flat topology according to settings.
+    In a flat universe, the cells on the border do not change, the same way
+    as the non toroidal fast calculation does.
+    """
+    name = 'tiled'
+
+    def __init__(self, universe, tile_size=TILE_SIZE):
+        super().__init__(universe)
+        self.toroidal = Settings.toroidal_universe
+        self.tile_size = tile_size
+        self.h, self.w = universe.size_u.h, universe.size_u.w
+        self.tiles_shape = (-(-self.h // tile_size), -(-self.w // tile_size))
+        self.active_tiles_ratio = 1.0
+        self.tiles_calculated = 0
+        self.tiles_total_calculated = 0
+        self.generations_calculated = 0
+
+        # The current generation with a halo; its size is rounded up to whole tiles
+        rows, cols = (n * tile_size for n in self.tiles_shape)
+        self._padded = np.zeros((rows + 2, cols + 2), dtype=np.uint8)
+        self._padded_real = self._padded[:self.h + 2, :self.w + 2]
+        self._refresh_halo = refresh_halo_toroidal if self.toroidal else refresh_halo_dead
+        s0, s1 = self._padded.strides
+        # Each tile with its halo. These views overlap, so they are only read
+        self._tiles_with_halo = as_strided(self._padded, shape=self.tiles_shape + (tile_size + 2,) * 2,
+                                           strides=(tile_size * s0, tile_size * s1, s0, s1))
+        # Each tile without its halo. These views do not overlap, so they can be written
+        self._tiles = as_strided(self._padded[1:, 1:], shape=self.tiles_shape + (tile_size,) * 2,
+                                 strides=(tile_size * s0, tile_size * s1, s0, s1))
+
+        # Cells that can change: the ones inside the universe,
+        # but not the ones on the border of a flat universe
+        can_change = np.zeros((rows, cols), dtype=bool)
+        if self.toroidal:
+            can_change[:self.h, :self.w] = True
+        else:
+            can_change[1:self.h - 1, 1:self.w - 1] = True
+        self._can_change = (can_change.reshape(self.tiles_shape[0], tile_size, self.tiles_shape[1], tile_size)
+                            .swapaxes(1, 2).copy())
+        self._changed = np.ones(self.tiles_shape, dtype=bool)
+
+    def load(self, cells):
+        self._padded[:] = 0
+        self._padded_real[1:-1, 1:-1] = cells
+        self._changed[:] = True
+
+    def stats(self):
+        res = super().stats()
+        res['active tiles ratio'] = round(self.active_tiles_ratio, 4)
+        res['active tiles ratio mean'] = round(
+            self.tiles_total_calculated / max(self.generations_calculated * self._changed.size, 1), 4)
+        return res
+
+    def _active_tiles(self):
+        """Returns the tiles that changed in the previous generation and their neighbors."""
+        changed = self._changed
+        if self.toroidal:
+            active = changed.copy()
+            for axis in (0, 1):
+                active |= np.roll(active, 1, axis) | np.roll(active, -1, axis)
+            return active
+        padded = np.pad(changed, 1)
+        rows = padded[:, :-2] | padded[:, 1:-1] | padded[:, 2:]
+        return rows[:-2] | rows[1:-1] | rows[2:]
+
+    def calculate_generation(self, _):
+        self._refresh_halo(self._padded_real)
+        active = self._active_tiles()
+        tiles_y, tiles_x = np.nonzero(active)
+
+        # Calculate all the active tiles at once with separable sums of the 3x3 neighborhoods
+        padded = self._tiles_with_halo[tiles_y, tiles_x]
+        row_sums = padded[:, :, :-2] + padded[:, :, 1:-1] + padded[:, :, 2:]
+        sums = row_sums[:, :-2] + row_sums[:, 1:-1] + row_sums[:, 2:]
+        tiles_old = padded[:, 1:-1, 1:-1]
+        tiles_new = ((sums == 3) | ((sums == 4) & (tiles_old == 1))).astype(np.uint8)
+        tiles_new = np.where(self._can_change[tiles_y, tiles_x], tiles_new, tiles_old)
+
+        self._changed[:] = False
+        self._changed[tiles_y, tiles_x] = (tiles_new != tiles_old).any(axis=(1, 2))
+        self._tiles[tiles_y, tiles_x] = tiles_new
+
+        self.tiles_calculated = len(tiles_y)
+        self.active_tiles_ratio = self.tiles_calculated / active.size
+        self.tiles_total_calculated += self.tiles_calculated
+        self.generations_calculated += 1
+        np.copyto(self.universe.cells, self._padded_real[1:-1, 1:-1])
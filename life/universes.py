@@ -5,19 +5,83 @@ import warnings
 from random import randint
 
 import numpy as np
-from numpy.lib.stride_tricks import as_strided
 
 import pygame as pg
 
+from life.adaptive import AdaptiveEngine
+from life.bands import MultiProcessEngine, ThreadPoolEngine
+from life.bit_packed import BitPackedEngine
+from life.blocking import TemporalBlockingEngine
 from life.cells import Cell
+from life.changes import ChangeListEngine
+from life.chunks import ChunkMapEngine
+from life.cluster import ClusterEngine
+from life.cycles import CycleDetector
+from life.fast import FastEngine
 from life import lib_jp
 from life import resources
 from life import seeds
+from life.tiles import TiledEngine
+from life.halos import HaloEngine, HALO_REFRESH_FUNCTIONS
+from life.hashlife import HashLifeEngine
+from life.generations import GenerationsEngine
+from life.lenia import LeniaEngine
+from life.larger import LargerThanLifeEngine
+from life.rule_table import RuleTableEngine
+from life.slices import TimeSlicedEngine
+from life.symmetry import SymmetryEngine
 from life.settings import Settings, UniverseCalculationType, NextGenerationType
 
 
 INVISIBLE_DEAD_CELLS_ALLOWED = 5
 
+# Characters of the output of the board for each age of a cell, and for each cell dead or alive
+BOARD_AGE_CHARS = np.array([ord('·')] + [ord(str(age)) for age in range(1, Cell.CELL_AGES_MAX)], dtype=np.uint32)
+BOARD_ONE_COLOR_CHARS = np.array([ord('·')] + [ord('1')] * (Cell.CELL_AGES_MAX - 1), dtype=np.uint32)
+
+
+def create_engine(universe, universe_calculation):
+    """Returns the engine of a universe for a generation calculation type,
+    or None if the calculation type does not use an engine.
+    """
+    if universe_calculation == UniverseCalculationType.NON_TOROIDAL_FAST:
+        return FastEngine(universe)
+    elif universe_calculation in HALO_REFRESH_FUNCTIONS:
+        return HaloEngine(universe, universe_calculation)
+    elif universe_calculation == UniverseCalculationType.BIT_PACKED:
+        return BitPackedEngine(universe)
+    elif universe_calculation == UniverseCalculationType.HASHLIFE:
+        return HashLifeEngine(universe)
+    elif universe_calculation == UniverseCalculationType.CHUNK_MAP:
+        return ChunkMapEngine(universe)
+    elif universe_calculation == UniverseCalculationType.TILED:
+        return TiledEngine(universe)
+    elif universe_calculation == UniverseCalculationType.MULTI_PROCESS:
+        return MultiProcessEngine(universe)
+    elif universe_calculation == UniverseCalculationType.THREAD_POOL:
+        return ThreadPoolEngine(universe)
+    elif universe_calculation == UniverseCalculationType.RULE_TABLE:
+        return RuleTableEngine(universe)
+    elif universe_calculation == UniverseCalculationType.CHANGE_LIST:
+        return ChangeListEngine(universe)
+    elif universe_calculation == UniverseCalculationType.TEMPORAL_BLOCKING:
+        return TemporalBlockingEngine(universe)
+    elif universe_calculation == UniverseCalculationType.LARGER_THAN_LIFE:
+        return LargerThanLifeEngine(universe)
+    elif universe_calculation == UniverseCalculationType.GENERATIONS:
+        return GenerationsEngine(universe)
+    elif universe_calculation == UniverseCalculationType.SYMMETRY:
+        return SymmetryEngine(universe)
+    elif universe_calculation == UniverseCalculationType.LENIA:
+        return LeniaEngine(universe)
+    elif universe_calculation == UniverseCalculationType.ADAPTIVE:
+        return AdaptiveEngine(universe, create_engine)
+    elif universe_calculation == UniverseCalculationType.CLUSTER:
+        return ClusterEngine(universe)
+    elif universe_calculation == UniverseCalculationType.TIME_SLICED:
+        return TimeSlicedEngine(universe)
+    return None
+
 
 class Universe(pg.sprite.Sprite):
     """Represents a universe."""
@@ -28,6 +92,8 @@ class Universe(pg.sprite.Sprite):
         super().__init__()
         self.id = game.current_game
         self.cells = None  # The matrix of cells
+        self.engine = None  # The engine that calculates the generations, if any
+        self.cycles = None  # The detector of cycles of generations, if activated
         # Dictionary of the cells used for their graphic representation on the board
         self.cells_board = {}
         self.size_u = lib_jp.Size(w=Settings.universe_size.w, h=Settings.universe_size.h)
@@ -81,6 +147,12 @@ class Universe(pg.sprite.Sprite):
         if not self.game.next_generation or self.game.next_generation == NextGenerationType.NONE:
             return
 
+        # A time sliced engine calculates the step in slices over several frames,
+        # and the current generation is shown until the step is complete
+        if self.engine and self.engine.time_sliced and not self.engine.calculate_slice(
+                self._generations_per_step(), Settings.frame_budget / 1000):
+            return
+
         self.next_generation()
 
         # Clean the graphic board of dead cells
@@ -99,15 +171,16 @@ class Universe(pg.sprite.Sprite):
     def clean(self):
         self.generation = 1
         self.cells = np.array([[0] * self.size_u.w for _ in range(self.size_u.h)], dtype=np.uint8)
-        nd_slice = (slice(1, -1),) * len(self.size_u)
-        self.cells_slice = self.cells[nd_slice]
-        self.n_dims = len(self.cells_slice.shape)
+        # Buffer for a copy of the old generation, so it is not allocated each generation
+        self._cells_old = np.zeros_like(self.cells)
         self.cells_board = {}
 
         cells_old = self.cells.copy()
 
         self.stats.update((k, 0) for k in self.stats)
         self._reset_population()
+        self.engine and self.engine.load(self.cells)
+        self._reset_cycles()
 
         self.start_time = pg.time.get_ticks()
         # Change the graphic cells on the board according to the matrix of cells
@@ -116,20 +189,42 @@ class Universe(pg.sprite.Sprite):
     def set_universe_calculate_generation(self):
         """Sets the calculation function of the universe a toroidal one
         or a flat one according to settings.
+        Some calculation types use an engine, which keeps its own buffers.
         """
-        if Settings.universe_calculation == UniverseCalculationType.NON_TOROIDAL_FAST:
-            self._calculate_generation = self._calculate_generation_fast
-        elif Settings.universe_calculation == UniverseCalculationType.TOROIDAL_LOOP:
+        self.engine and self.engine.close()
+        self.engine = None
+        if Settings.universe_calculation == UniverseCalculationType.TOROIDAL_LOOP:
             self._calculate_generation = self._calculate_generation_toroidal_with_loop
         elif Settings.universe_calculation == UniverseCalculationType.NON_TOROIDAL_LOOP:
             self._calculate_generation = self._calculate_generation_with_loop
+        else:
+            self.engine = create_engine(self, Settings.universe_calculation)
+
+        if self.engine:
+            self._calculate_generation = self.engine.calculate_generation
+            self.cells is not None and self.engine.load(self.cells)
+        self.cells is not None and self._reset_cycles()
+
+    def _reset_cycles(self):
+        """Starts to detect cycles from the current generation if it is activated.
+        The universes of unbounded and multi-state engines are not only their matrix of cells,
+        so their cycles are not detected.
+        """
+        if not Settings.cycle_detection or (self.engine and (self.engine.unbounded or self.engine.multi_state)):
+            self.cycles = None
+            return
+        if not self.cycles or self.cycles.universe is not self:
+            self.cycles = CycleDetector(self)
+        self.cycles.reset(self.cells, self.generation)
 
     def set_cells_board_update_calculation(self):
         """Sets the calculation function of cells on the board with and without statistics."""
         if Settings.stats_activated:
             self._cells_board_update = self._cells_board_update_with_stats
+            self._cells_board_update_changes = self._cells_board_update_changes_with_stats
         else:
             self._cells_board_update = self._cells_board_update_standard
+            self._cells_board_update_changes = self._cells_board_update_changes_standard
 
     def set_universe_colors(self, cell_one_color):
         """Sets the representation of the universe to one color for each age
@@ -147,17 +242,135 @@ class Universe(pg.sprite.Sprite):
             if Settings.save_to_out_file:
                 self.game.output_info.write_generation()
 
-        self.generation += 1
+        self.step(self._generations_per_step())
 
-        # Copy the old generation
-        cells_old = self.cells.copy()
-        # Calculate generation
-        self._calculate_generation(cells_old)
-        # Change the graphic cells on the board according to the array of cells
-        self._cells_board_update(cells_old)
+    def step(self, generations):
+        """Calculates a number of generations back to back.
+        The graphic cells on the board, the statistics and the output are only
+        updated each render stride of generations and for the last generation,
+        so the generations in between only cost their calculation.
+        """
+        stride = self._render_stride()
+        while generations > 0:
+            generations_to_render = min(stride, generations)
+            generations -= generations_to_render
+            self.generation += generations_to_render
+
+            # Keep the old generation
+            if self.engine and self.engine.swaps_cells and generations_to_render == 1:
+                cells_old = self.cells
+            else:
+                cells_old = self._cells_old
+                np.copyto(cells_old, self.cells)
+            # Calculate generations
+            detecting_cycles = self.cycles and not self.cycles.period
+            if detecting_cycles:
+                self._calculate_generations_detecting_cycles(cells_old, generations_to_render)
+            else:
+                self._calculate_generations(cells_old, generations_to_render)
+            # Change the graphic cells on the board according to the array of cells
+            # or only the ones that changed, if the engine keeps a list of them.
+            # The generations calculated one by one only leave the list of the last one
+            changed = None
+            if self.engine and (generations_to_render == 1 or not detecting_cycles):
+                changed = self.engine.changed_cells()
+            if self.engine and self.engine.multi_state:
+                self._cells_board_update_ages(self.engine.cell_ages(Cell.CELL_AGES_MAX - 1))
+            elif changed is not None:
+                self._cells_board_update_changes(changed)
+            else:
+                self._cells_board_update(cells_old)
+            if self.engine:
+                self.stats['cells_total'] = self.engine.population()
+            if self.cycles and self._update_cycles():
+                generations = min(generations, Settings.stop_after_generation - self.generation)
+
+            if Settings.save_to_out_file:
+                self.game.output_info.write_generation()
 
-        if Settings.save_to_out_file:
-            self.game.output_info.write_generation()
+    def _calculate_generations_detecting_cycles(self, cells_old, generations):
+        """Calculates generations one by one, updating the detection of cycles with each of them,
+        so the period is not measured between the rendered generations only.
+        Once the cycle is found, the rest of the generations are calculated at once.
+        """
+        generation = self.generation - generations
+        cells_previous = cells_old
+        while True:
+            self._calculate_generation(cells_previous)
+            generation += 1
+            generations -= 1
+            self.cycles.update(cells_previous, self.cells, generation, self.engine and self.engine.changed_cells())
+            if not generations or self.cycles.period:
+                break
+            cells_previous = self.cells.copy()
+        if self.cycles.period and Settings.save_to_out_file:
+            self.game.output_info.write_line(f"-**- Cycle found at generation {self.cycles.generation_found}: "
+                                             f"{self.cycles.description()} -**-\n")
+        generations > 0 and self._calculate_generations(self.cells.copy(), generations)
+
+    def _update_cycles(self):
+        """When a cycle has been found, skips the generations that repeat it till the one
+        where it has to stop, since they are the same as the current one.
+        The ages of the cells can grow during the first generations of the cycle, so they
+        are only skipped once the ages on the board repeat too. Then, the statistics
+        are advanced by what they changed in each repetition skipped.
+        Returns the number of generations skipped.
+        """
+        if not self.cycles.period:
+            return 0
+
+        ages = {pos: cell_board.age for pos, cell_board in self.cells_board.items()}
+        if self.cycles.board and (self.generation - self.cycles.board[0]) % self.cycles.period:
+            return 0
+        if not self.cycles.board or ages != self.cycles.board[1]:
+            age_totals = {pos: cell_board.age_total for pos, cell_board in self.cells_board.items()}
+            self.cycles.board = (self.generation, ages, age_totals, self.stats.copy())
+            return 0
+
+        generation_board, _, age_totals, stats = self.cycles.board
+        generations_repeated = self.generation - generation_board
+        generations = self.cycles.generations_to_skip(self.generation, Settings.stop_after_generation,
+                                                      generations_repeated)
+        repetitions = generations // generations_repeated
+        for key, value in stats.items():
+            self.stats[key] += (self.stats[key] - value) * repetitions
+        for pos, cell_board in self.cells_board.items():
+            cell_board.age_total += (cell_board.age_total - age_totals[pos]) * repetitions
+        self.generation += generations
+        self.cycles.generations_skipped += generations
+        return generations
+
+    def _calculate_generations(self, cells_old, generations):
+        if generations == 1:
+            self._calculate_generation(cells_old)
+        elif self.engine:
+            self.engine.calculate_generations(cells_old, generations)
+        else:
+            self._calculate_generation(cells_old)
+            for _ in range(generations - 1):
+                self._calculate_generation(self.cells.copy())
+
+    def _render_stride(self):
+        """Returns the number of generations calculated between two updates of the board.
+        Some engines can jump several generations at once, and when the universe
+        runs several generations, it can render only every some steps.
+        """
+        generations = self.engine.generations_per_step if self.engine else 1
+        # A time sliced engine cannot stop in the middle of a step to detect cycles,
+        # so it renders each generation till the cycle is found
+        if self.game.next_generation == NextGenerationType.SEVERAL and not (
+                self.engine and self.engine.time_sliced and self.cycles and not self.cycles.period):
+            generations *= Settings.render_every
+        return generations
+
+    def _generations_per_step(self):
+        """Returns the number of generations to calculate in the next step,
+        but never beyond the generation where it has to stop.
+        """
+        generations = self._render_stride()
+        if Settings.stop_after_generation and self.generation < Settings.stop_after_generation:
+            generations = min(generations, Settings.stop_after_generation - self.generation)
+        return generations
 
     def _cells_board_update_standard(self, cells_old):
         # Change the graphic cells on the board according to the array of cells
@@ -208,51 +421,98 @@ class Universe(pg.sprite.Sprite):
                     self.stats['cells_total'] += 1
                     self.stats[f'cells_age{cell}'] += 1
 
+    def _cells_board_update_changes_standard(self, changed):
+        """Change the graphic cells on the board according to the cells that changed.
+        The cells that did not change are the ones alive on the board,
+        so the rest of the matrix of cells is not visited.
+        """
+        ys, xs = changed
+        born = self.cells[changed] != 0
+        for i, j in zip(ys[~born].tolist(), xs[~born].tolist()):
+            cell_board = self.cells_board.get((j, i))
+            if cell_board:
+                cell_board.age = 0
+                self.stats['cells_total'] -= 1
+        for cell_board in self.cells_board.values():
+            if cell_board.age:
+                cell_board.age = min(cell_board.age + 1, Cell.CELL_AGES_MAX - 1)
+                cell_board.age_total += 1
+        for i, j in zip(ys[born].tolist(), xs[born].tolist()):
+            cell_board = self.cells_board.get((j, i))
+            if cell_board:
+                cell_board.age = 1
+            else:
+                self.add_cell_to_board(j, i, age=1)
+            self.stats['cells_total'] += 1
+
+    def _cells_board_update_changes_with_stats(self, changed):
+        """Change the graphic cells on the board according to the cells that changed.
+        Also calculates statistics for the total age of dead cells and cells
+        currently alive.
+        """
+        ys, xs = changed
+        born = self.cells[changed] != 0
+        for i, j in zip(ys[~born].tolist(), xs[~born].tolist()):
+            cell_board = self.cells_board.get((j, i))
+            if cell_board:
+                self.stats['cells_total'] -= 1
+                self.stats[f'deads_age{cell_board.age}'] += 1
+                self.stats[f'cells_age{cell_board.age}'] -= 1
+                cell_board.age = 0
+        for cell_board in self.cells_board.values():
+            if cell_board.age:
+                self.stats[f'cells_age{cell_board.age}'] -= 1
+                cell_board.age = min(cell_board.age + 1, Cell.CELL_AGES_MAX - 1)
+                cell_board.age_total += 1
+                self.stats[f'cells_age{cell_board.age}'] += 1
+        for i, j in zip(ys[born].tolist(), xs[born].tolist()):
+            cell_board = self.cells_board.get((j, i))
+            if cell_board:
+                cell_board.age = 1
+            else:
+                self.add_cell_to_board(j, i, age=1)
+            self.stats['cells_total'] += 1
+            self.stats['cells_age1'] += 1
+
+    def _cells_board_update_ages(self, ages):
+        """Change the graphic cells on the board to the ages given by a multi-state engine,
+        which show the states of the cells. The statistics of the cells alive
+        are the number of cells of each age.
+        """
+        for cell_board in self.cells_board.values():
+            cell_board.age = 0
+        ys, xs = np.nonzero(ages)
+        for i, j, age in zip(ys.tolist(), xs.tolist(), ages[ys, xs].tolist()):
+            cell_board = self.cells_board.get((j, i))
+            if cell_board:
+                cell_board.age = age
+            else:
+                self.add_cell_to_board(j, i, age=age)
+        if Settings.stats_activated:
+            ages_count = np.bincount(ages.ravel(), minlength=Cell.CELL_AGES_MAX)
+            for age in range(1, Cell.CELL_AGES_MAX):
+                self.stats[f'cells_age{age}'] = int(ages_count[age])
+
     def _clean_board_of_dead_cells(self):
         for key, cell_board in tuple(self.cells_board.items()):
             if cell_board.age == 0:
                 cell_board.kill()
                 del self.cells_board[key]
 
-    def _calculate_generation_fast(self, _):
-        """Calculates the next generation for each cell
-        in a non-toroidal universe.
-        This is a faster method that takes advantage of numpy.
-        """
-        # Calculate the number of neighbors in a non-toroidal universe
-        rule_of_life_alive = np.zeros(8 + 1, np.uint8)
-        rule_of_life_dead = np.zeros(8 + 1, np.uint8)
-        # If it is alive and has less than 2 neighbors, it dies by under-population.
-        # Also, if it has more than 3 neighbors, it dies by over-population.
-        # That is, only the cells alive with 2 or 3 neighbors survive
-        rule_of_life_alive[[2, 3]] = 1
-        # If the cell is dead but has exactly 3 neighbors, a new cell is born by reproduction.
-        rule_of_life_dead[3] = 1
-
-        # Calculate the neighborhoods and apply the rules
-        neighborhoods = Universe._grid_n_dims(self.cells)
-        sum_over = tuple(-(i+1) for i in range(self.n_dims))
-        neighbors_no = np.sum(neighborhoods, sum_over) - self.cells_slice
-        self.cells_slice[:] = np.where(self.cells_slice,
-                                       rule_of_life_alive[neighbors_no],
-                                       rule_of_life_dead[neighbors_no])
-
     def _calculate_generation_toroidal_with_loop(self, cells_old):
         """Calculates the next generation for each cell
         in a toroidal universe.
         """
+        rule = Settings.rule
         cells_ne = cells_old.copy()
         cells_ne = Universe._neighborhood(cells_ne)
         for x, rows in enumerate(cells_old):
             for y, _ in enumerate(rows):
-                if cells_old[x, y] and not 2 <= cells_ne[x, y] <= 3:
-                    # If it is alive and has less than 2 neighbors, it dies by under-population.
-                    # Also, if it has more than 3 neighbors, it dies by over-population.
-                    self.cells[x, y] = 0
-                elif cells_ne[x, y] == 3:
-                    # If it has exactly 3 neighbors, it lives.
-                    # Also, if it is dead, a new cell is born by reproduction.
-                    self.cells[x, y] = 1
+                # The rule has the next state of the cells alive and dead for each number of neighbors
+                if cells_old[x, y]:
+                    self.cells[x, y] = rule.alive[cells_ne[x, y]]
+                else:
+                    self.cells[x, y] = rule.dead[cells_ne[x, y]]
 
     def _calculate_generation_with_loop(self, cells_old):
         """Calculates the next generation for each cell
@@ -260,31 +520,16 @@ class Universe(pg.sprite.Sprite):
         This is a slower method than the one used.
         It can be used to test faster methods.
         """
+        rule = Settings.rule
         for x, rows in enumerate(cells_old):
             for y, _ in enumerate(rows):
                 # Calculate the number of neighbors in a non-toroidal universe
-                neighbors_no = np.sum(cells_old[x - 1: x + 2, y - 1: y + 2]) - cells_old[x, y]
-                if cells_old[x, y] and not 2 <= neighbors_no <= 3:
-                    # If it is alive and has less than 2 neighbors, it dies by under-population.
-                    # Also, if it has more than 3 neighbors, it dies by over-population.
-                    self.cells[x, y] = 0
-                elif neighbors_no == 3:
-                    # If it has exactly 3 neighbors, it lives.
-                    # Also, if it is dead, a new cell is born by reproduction.
-                    self.cells[x, y] = 1
-
-    @staticmethod
-    def _grid_n_dims(arr):
-        """Calculates a sub-array for a given array and return it with a customized shape,
-        so we can get the neighborhoods of a cell.
-        """
-        assert all(_len > 2 for _len in arr.shape)
-        n_dims = len(arr.shape)
-        new_shape = [_len - 2 for _len in arr.shape]
-        new_shape.extend([3] * n_dims)
-        new_strides = arr.strides + arr.strides
-        # Return the sub-array with our neighborhoods and a convenient way to move through them
-        return as_strided(arr, shape=new_shape, strides=new_strides)
+                neighbors_no = max(int(np.sum(cells_old[x - 1: x + 2, y - 1: y + 2])) - int(cells_old[x, y]), 0)
+                # The rule has the next state of the cells alive and dead for each number of neighbors
+                if cells_old[x, y]:
+                    self.cells[x, y] = rule.alive[neighbors_no]
+                else:
+                    self.cells[x, y] = rule.dead[neighbors_no]
 
     @staticmethod
     def _neighborhood(arr):
@@ -309,6 +554,8 @@ class Universe(pg.sprite.Sprite):
         self.cells[y, x] = 1 if not self.cells[y, x] else 0
         self.stats['cells_total'] += 1 if self.cells[y, x] else -1
         self.stats['cells_age1'] += 1 if self.cells[y, x] else -1
+        self.engine and self.engine.set_cell(y, x, self.cells[y, x])
+        self.cycles and self.cycles.reset(self.cells, self.generation)
 
         cell_board = self.cells_board.get((x, y))
         if cell_board:
@@ -360,33 +607,33 @@ class Universe(pg.sprite.Sprite):
         return ''.join(res)
 
     def pprint_to_string_board_age(self):
-        res = []
-        for i, rows in enumerate(self.cells):
-            for j, _ in enumerate(rows):
-                cell_board = self.cells_board.get((j, i))
-                if cell_board:
-                    res += [str(cell_board.age) if cell_board.age != 0 else '·']
-                else:
-                    res += ['·']
-            res += ['\n']
-        return ''.join(res)
+        return self._pprint_to_string_board(BOARD_AGE_CHARS)
 
     def pprint_to_string_board_one_color(self):
-        res = []
-        for i, rows in enumerate(self.cells):
-            for j, _ in enumerate(rows):
-                cell_board = self.cells_board.get((j, i))
-                if cell_board:
-                    res += ['1' if cell_board.age != 0 else '·']
-                else:
-                    res += ['·']
-            res += ['\n']
-        return ''.join(res)
+        return self._pprint_to_string_board(BOARD_ONE_COLOR_CHARS)
+
+    def _pprint_to_string_board(self, age_chars):
+        """Returns the board as a string with a character for the age of each cell.
+        The ages of the cells on the board are put on a matrix and the characters
+        are looked up for all of them at once, so the cells are not visited one by one.
+        """
+        ages = np.zeros(self.cells.shape, dtype=np.uint8)
+        if self.cells_board:
+            xs, ys = zip(*self.cells_board.keys())
+            ages[ys, xs] = [cell_board.age for cell_board in self.cells_board.values()]
+        h, w = self.cells.shape
+        chars = np.full((h, w + 1), ord('\n'), dtype=np.uint32)
+        chars[:, :-1] = age_chars[ages]
+        return chars.tobytes().decode('utf-32-le')
 
     def _reset_population(self):
         if Settings.empty_universe:
             return
 
+        if Settings.starting_cells is not None:
+            self.cells[:] = Settings.starting_cells
+            return
+
         if Settings.starting_seeds:
             for seed, pos in Settings.starting_seeds:
                 self.add_cells_seed(pos[0], pos[1], seed)